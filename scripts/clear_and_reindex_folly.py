@@ -23,6 +23,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.services.neo4j_service import Neo4jService
 from src.services.clang_analyzer_service import ClangAnalyzerService
 from src.services.compile_commands_service import CompileCommandsService
+from src.utils.compile_commands import HEADER_EXTENSIONS
 from src.models.call_graph import CallGraph
 
 def setup_logging(log_file=None):
@@ -167,7 +168,7 @@ def heuristic_include_path_detection(folder_path):
     # Check for large concentrations of header files
     header_concentrations = defaultdict(int)
     for root, _, files in os.walk(folder_path):
-        header_count = sum(1 for f in files if f.endswith(('.h', '.hpp', '.hxx')))
+        header_count = sum(1 for f in files if f.endswith(HEADER_EXTENSIONS))
         if header_count > 5:  # Threshold for considering a directory as an include path
             header_concentrations[root] = header_count
     
@@ -284,7 +285,7 @@ def process_cross_file_references(call_graph, mode="basic"):
     
     for func_name, func in call_graph.functions.items():
         # Create normalized name without namespace qualifiers for fuzzy matching
-        base_name = func_name.split("::")[-1]
+        base_name = func_name.rpartition("::")[2]
         
         # Store by fully qualified name
         function_map[func_name] = func
@@ -321,7 +322,7 @@ def process_cross_file_references(call_graph, mode="basic"):
             continue
             
         # Case 2: Try base name match (for both enhanced and full modes)
-        base_name = missing.split("::")[-1]
+        base_name = missing.rpartition("::")[2]
         if base_name in function_by_base_name:
             candidates = function_by_base_name[base_name]
             
@@ -373,7 +374,7 @@ def process_cross_file_references(call_graph, mode="basic"):
                 continue
                 
             # Extract information from missing function name and context
-            base_name = missing.split("::")[-1]
+            base_name = missing.rpartition("::")[2]
             
             # Collect signature information from callers
             param_count_candidates = []
@@ -413,7 +414,7 @@ def process_cross_file_references(call_graph, mode="basic"):
                     potential_matches.extend(function_by_signature[signature_key])
             
             # Filter to those matching the base name
-            name_matches = [f for f in potential_matches if f.name.split("::")[-1] == base_name]
+            name_matches = [f for f in potential_matches if f.name.rpartition("::")[2] == base_name]
             if name_matches:
                 potential_matches = name_matches
             
@@ -426,7 +427,7 @@ def process_cross_file_references(call_graph, mode="basic"):
                     score = 0
                     
                     # Base score: matching name is good
-                    if candidate.name.split("::")[-1] == base_name:
+                    if candidate.name.rpartition("::")[2] == base_name:
                         score += 5
                     
                     # Parameter count match
@@ -557,11 +558,11 @@ def main():
     logger.info(f"Will exclude files with patterns: {excluded_patterns}")
     
     # Find all C++ files to analyze
-    file_extensions = ['.cpp', '.cc', '.cxx', '.h', '.hpp']
+    file_extensions = ('.cpp', '.cc', '.cxx', '.h', '.hpp')
     files_to_analyze = []
     for root, _, files in os.walk(folly_path):
         for file in files:
-            if any(file.endswith(ext) for ext in file_extensions):
+            if file.endswith(file_extensions):
                 file_path = os.path.join(root, file)
                 # Skip files in test, benchmark, or example directories
                 if not any(pattern in file_path.lower() for pattern in excluded_patterns):
@@ -6,19 +6,36 @@ import os
 import re
 import sys
 import argparse
-from typing import List, Dict, Tuple, Any, Set, Optional
+import csv
+import functools
+import sqlite3
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Any, Set, Optional, FrozenSet
 try:
-    from py2neo import Graph, Node, Relationship
+    from py2neo import Graph
     HAS_NEO4J = True
 except ImportError:
     HAS_NEO4J = False
     # 定义一个替代类型用于类型注解
     class Graph:
         pass
-    class Node:
-        pass
-    class Relationship:
-        pass
+
+# 识别函数定义的正则表达式，所有查找共用，只编译一次
+_C_DEFINITION_PATTERN = re.compile(r'((?:[a-zA-Z0-9_*]+\s+)+)([a-zA-Z0-9_]+)\s*\([^)]*\)\s*(?:const)?\s*(?:noexcept)?\s*{')
+_C_DECLARATION_PATTERN = re.compile(r'((?:[a-zA-Z0-9_*]+\s+)+)([a-zA-Z0-9_]+)\s*\([^)]*\)\s*(?:const)?\s*(?:noexcept)?\s*;')
+_PYTHON_DEFINITION_PATTERN = re.compile(r'def\s+([a-zA-Z0-9_]+)\s*\([^)]*\)(?:\s*->.*?)?\s*:')
+_JS_DEFINITION_PATTERN = re.compile(r'(?:function|const|let|var)\s+([a-zA-Z0-9_]+)\s*(?:=\s*(?:async\s*)?\([^)]*\)|=>\s*{|\([^)]*\)\s*{)')
+
+# C/C++、Python和JavaScript/TypeScript风格的函数定义
+FUNCTION_DEFINITION_PATTERNS = [_C_DEFINITION_PATTERN, _PYTHON_DEFINITION_PATTERN, _JS_DEFINITION_PATTERN]
+# 构建图数据库时还需要C/C++函数声明
+DECLARATION_AND_DEFINITION_PATTERNS = [
+    _C_DEFINITION_PATTERN, _C_DECLARATION_PATTERN, _PYTHON_DEFINITION_PATTERN, _JS_DEFINITION_PATTERN
+]
+
+# 简单的函数调用模式：非标识符字符后的名称加左括号
+CALL_SITE_PATTERN = re.compile(r'[^a-zA-Z0-9_]([a-zA-Z0-9_]+)\s*\(')
 
 def extract_keywords(description: str) -> List[str]:
     """从功能描述中提取关键词"""
@@ -42,6 +59,10 @@ def extract_keywords(description: str) -> List[str]:
         
     return all_keywords
 
+def normalize_extensions(extensions: List[str]) -> FrozenSet[str]:
+    """将扩展名列表规范化为小写集合，便于按os.path.splitext的结果直接查找"""
+    return frozenset(ext.strip().lower() for ext in extensions if ext.strip())
+
 def search_code_files(directory: str, extensions: List[str], keywords: List[str], 
                      max_results: int = 10) -> List[Dict[str, Any]]:
     """
@@ -58,21 +79,13 @@ def search_code_files(directory: str, extensions: List[str], keywords: List[str]
     """
     results = []
     
-    # 编译正则表达式来识别函数定义
-    func_patterns = [
-        # C/C++风格函数
-        re.compile(r'((?:[a-zA-Z0-9_*]+\s+)+)([a-zA-Z0-9_]+)\s*\([^)]*\)\s*(?:const)?\s*(?:noexcept)?\s*{'),
-        # Python风格函数
-        re.compile(r'def\s+([a-zA-Z0-9_]+)\s*\([^)]*\)(?:\s*->.*?)?\s*:'),
-        # JavaScript/TypeScript风格函数
-        re.compile(r'(?:function|const|let|var)\s+([a-zA-Z0-9_]+)\s*(?:=\s*(?:async\s*)?\([^)]*\)|=>\s*{|\([^)]*\)\s*{)')
-    ]
     
     # 遍历目录
+    ext_set = normalize_extensions(extensions)
     for root, _, files in os.walk(directory):
         for file in files:
             # 检查文件扩展名
-            if not any(file.endswith(ext) for ext in extensions):
+            if os.path.splitext(file)[1].lower() not in ext_set:
                 continue
                 
             file_path = os.path.join(root, file)
@@ -87,7 +100,7 @@ def search_code_files(directory: str, extensions: List[str], keywords: List[str]
                     continue
                 
                 # 提取文件中的所有函数
-                functions = extract_functions(content, func_patterns, file_path)
+                functions = extract_functions(content, FUNCTION_DEFINITION_PATTERNS, file_path)
                 
                 # 为每个函数计算相关性分数
                 for func in functions:
@@ -106,28 +119,43 @@ def search_code_files(directory: str, extensions: List[str], keywords: List[str]
 def extract_functions(content: str, patterns: List[re.Pattern], file_path: str) -> List[Dict[str, Any]]:
     """从文件内容中提取函数"""
     functions = []
-    lines = content.split('\n')
     
     for pattern in patterns:
-        for match in pattern.finditer(content):
+        pos = 0
+        # 行号按上一个匹配的位置增量计算，不必每次从文件开头切片计数
+        line_no, line_pos = 1, 0
+        while True:
+            match = pattern.search(content, pos)
+            if not match:
+                break
+            pos = match.end()
+            text = match.group(0)
+            
             # 找到函数的起始位置
             start_pos = match.start()
-            line_no = content[:start_pos].count('\n') + 1
+            line_no += content.count('\n', line_pos, start_pos)
+            line_pos = start_pos
             
             # 提取函数名
-            if 'def ' in match.group(0):  # Python风格
+            is_c_style = False
+            if 'def ' in text:  # Python风格
                 func_name = match.group(1)
-            elif 'function ' in match.group(0) or '=' in match.group(0):  # JavaScript风格
+            elif 'function ' in text or '=' in text:  # JavaScript风格
                 func_name = match.group(1)
             else:  # C/C++风格
                 func_name = match.group(2)
+                is_c_style = True
             
             # 尝试提取函数体
             body = extract_function_body(content, start_pos, '{', '}')
             
             # 如果找不到C风格函数体，尝试Python风格缩进
             if not body:
-                body = extract_python_function_body(lines, line_no)
+                line_start = content.rfind('\n', 0, start_pos) + 1
+                body = extract_python_function_body(content, line_start)
+            elif is_c_style and text.endswith('{'):
+                # C/C++函数不能嵌套定义，直接从函数体之后继续查找（函数体内的if/while等不会被误认为函数）
+                pos = max(pos, content.rfind('\n', 0, start_pos) + 1 + len(body))
             
             # 如果成功提取了函数体
             if body:
@@ -141,63 +169,73 @@ def extract_functions(content: str, patterns: List[re.Pattern], file_path: str)
     
     return functions
 
+# 注释、字符串和字符字面量中的括号不参与计数，扫描时整体跳过
+_SKIPPED_TOKENS = r"//[^\n]*|/\*.*?\*/|\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'"
+
+# 函数体最多扫描的行数；括号不平衡（如宏技巧或行号错误）时不必一直扫描到文件末尾
+MAX_FUNCTION_LINES = 2000
+
+# 按(开括号, 闭括号)缓存的括号扫描正则，其余字符交给正则引擎在C层跳过
+_BRACKET_SCAN_RES: Dict[Tuple[str, str], re.Pattern] = {}
+
 def extract_function_body(content: str, start_pos: int, open_char: str, close_char: str) -> str:
     """提取使用括号界定的函数体（C/C++, JavaScript等）"""
     body_start = content.find(open_char, start_pos)
     
     if body_start == -1:
         return ""
+    
+    scan_re = _BRACKET_SCAN_RES.get((open_char, close_char))
+    if scan_re is None:
+        scan_re = re.compile(_SKIPPED_TOKENS + '|[' + re.escape(open_char + close_char) + r'\n]', re.DOTALL)
+        _BRACKET_SCAN_RES[(open_char, close_char)] = scan_re
         
-    # 跟踪嵌套括号
+    # 跟踪嵌套括号，只在MAX_FUNCTION_LINES行之内查找匹配的闭括号
     bracket_count = 1
-    body_end = body_start + 1
-    
-    while bracket_count > 0 and body_end < len(content):
-        if content[body_end] == open_char:
+    lines = 0
+    for match in scan_re.finditer(content, body_start + 1):
+        char = match.group()
+        if char == '\n':
+            lines += 1
+            if lines >= MAX_FUNCTION_LINES:
+                return ""
+        elif char == open_char:
             bracket_count += 1
-        elif content[body_end] == close_char:
+        elif char == close_char:
             bracket_count -= 1
-        body_end += 1
-    
-    if bracket_count == 0:
-        # 包括函数签名
-        signature_start = max(0, content.rfind('\n', 0, start_pos) + 1)
-        return content[signature_start:body_end]
+            if bracket_count == 0:
+                # 包括函数签名
+                signature_start = max(0, content.rfind('\n', 0, start_pos) + 1)
+                return content[signature_start:match.end()]
         
     return ""
 
-def extract_python_function_body(lines: List[str], start_line: int) -> str:
-    """提取基于缩进的函数体（Python）"""
-    if start_line > len(lines):
-        return ""
+# 按缩进级别缓存的函数体结束正则：下一个缩进不超过定义行的非空、非注释行
+_PYTHON_BODY_END_RES: Dict[int, re.Pattern] = {}
+
+def extract_python_function_body(content: str, start_pos: int) -> str:
+    """提取基于缩进的函数体（Python），start_pos为函数定义行的起始偏移"""
+    def_end = content.find('\n', start_pos)
+    if def_end == -1:
+        def_end = len(content)
         
     # 获取函数定义行的缩进级别
-    def_line = lines[start_line - 1]
+    def_line = content[start_pos:def_end]
     if not def_line.strip().startswith("def "):
         return ""
         
     indent_level = len(def_line) - len(def_line.lstrip())
     
-    # 收集函数体
-    body_lines = [def_line]
+    end_re = _PYTHON_BODY_END_RES.get(indent_level)
+    if end_re is None:
+        end_re = re.compile(r'\n[ \t]{0,%d}[^\s#]' % indent_level)
+        _PYTHON_BODY_END_RES[indent_level] = end_re
     
-    for i in range(start_line, len(lines)):
-        line = lines[i]
+    # 如果缩进减少，那么我们已经离开了函数
+    match = end_re.search(content, def_end)
+    end = match.start() if match else len(content)
         
-        # 空行或注释行
-        if not line.strip() or line.strip().startswith("#"):
-            body_lines.append(line)
-            continue
-            
-        current_indent = len(line) - len(line.lstrip())
-        
-        # 如果缩进减少，那么我们已经离开了函数
-        if current_indent <= indent_level:
-            break
-            
-        body_lines.append(line)
-        
-    return "\n".join(body_lines)
+    return content[start_pos:end]
 
 def calculate_relevance(function: Dict[str, Any], keywords: List[str]) -> int:
     """计算函数与关键词的相关性分数"""
@@ -232,24 +270,17 @@ def find_function_calls(directory: str, extensions: List[str], function_name: st
     """
     results = []
     
-    # 编译正则表达式来识别函数定义
-    func_patterns = [
-        # C/C++风格函数
-        re.compile(r'((?:[a-zA-Z0-9_*]+\s+)+)([a-zA-Z0-9_]+)\s*\([^)]*\)\s*(?:const)?\s*(?:noexcept)?\s*{'),
-        # Python风格函数
-        re.compile(r'def\s+([a-zA-Z0-9_]+)\s*\([^)]*\)(?:\s*->.*?)?\s*:'),
-        # JavaScript/TypeScript风格函数
-        re.compile(r'(?:function|const|let|var)\s+([a-zA-Z0-9_]+)\s*(?:=\s*(?:async\s*)?\([^)]*\)|=>\s*{|\([^)]*\)\s*{)')
-    ]
-    
     # 编译函数调用的正则表达式
     call_pattern = re.compile(r'[^a-zA-Z0-9_]' + re.escape(function_name) + r'\s*\(')
+    # 能匹配调用的最短文本：前导字符 + 函数名 + '('
+    min_len = len(function_name) + 2
     
     # 遍历目录
+    ext_set = normalize_extensions(extensions)
     for root, _, files in os.walk(directory):
         for file in files:
             # 检查文件扩展名
-            if not any(file.endswith(ext) for ext in extensions):
+            if os.path.splitext(file)[1].lower() not in ext_set:
                 continue
                 
             file_path = os.path.join(root, file)
@@ -258,18 +289,22 @@ def find_function_calls(directory: str, extensions: List[str], function_name: st
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                     content = f.read()
                 
-                # 检查文件内容是否包含函数调用
-                if not call_pattern.search(content):
+                # 检查文件内容是否包含函数调用（先用子串查找快速排除）
+                if function_name not in content or not call_pattern.search(content):
                     continue
                 
                 # 提取文件中的所有函数
-                functions = extract_functions(content, func_patterns, file_path)
+                functions = extract_functions(content, FUNCTION_DEFINITION_PATTERNS, file_path)
                 
                 # 检查每个函数是否调用了目标函数
                 for func in functions:
-                    if "body" in func and call_pattern.search(func["body"]):
-                        # 计算调用次数
-                        calls = len(call_pattern.findall(func["body"]))
+                    body = func.get("body")
+                    # 过短或不含函数名的函数体不可能包含调用，跳过正则匹配
+                    if not body or len(body) < min_len or function_name not in body:
+                        continue
+                    # 计算调用次数
+                    calls = len(call_pattern.findall(body))
+                    if calls:
                         func["relevance"] = calls * 10  # 根据调用次数设置相关性分数
                         func["calls"] = calls
                         results.append(func)
@@ -337,6 +372,11 @@ def get_function_call_chain_from_graph(graph: 'Graph', function_names: List[str]
     
     return result
 
+@functools.lru_cache(maxsize=256)
+def _function_name_pattern(function_name: str) -> re.Pattern:
+    """按函数名缓存编译好的整词匹配正则"""
+    return re.compile(r'\b' + re.escape(function_name) + r'\b')
+
 def find_function_in_codebase(directory: str, extensions: List[str], function_name: str) -> Optional[Dict[str, Any]]:
     """
     在代码库中查找指定函数的定义
@@ -349,20 +389,15 @@ def find_function_in_codebase(directory: str, extensions: List[str], function_na
     Returns:
         函数定义信息
     """
-    func_patterns = [
-        # C/C++风格函数
-        re.compile(r'((?:[a-zA-Z0-9_*]+\s+)+)([a-zA-Z0-9_]+)\s*\([^)]*\)\s*(?:const)?\s*(?:noexcept)?\s*{'),
-        # Python风格函数
-        re.compile(r'def\s+([a-zA-Z0-9_]+)\s*\([^)]*\)(?:\s*->.*?)?\s*:'),
-        # JavaScript/TypeScript风格函数
-        re.compile(r'(?:function|const|let|var)\s+([a-zA-Z0-9_]+)\s*(?:=\s*(?:async\s*)?\([^)]*\)|=>\s*{|\([^)]*\)\s*{)')
-    ]
+    
+    name_pattern = _function_name_pattern(function_name)
     
     # 遍历目录
+    ext_set = normalize_extensions(extensions)
     for root, _, files in os.walk(directory):
         for file in files:
             # 检查文件扩展名
-            if not any(file.endswith(ext) for ext in extensions):
+            if os.path.splitext(file)[1].lower() not in ext_set:
                 continue
                 
             file_path = os.path.join(root, file)
@@ -371,8 +406,12 @@ def find_function_in_codebase(directory: str, extensions: List[str], function_na
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                     content = f.read()
                 
+                # 文件中根本没有出现该函数名时，无需提取其中的函数
+                if function_name not in content or not name_pattern.search(content):
+                    continue
+                
                 # 提取文件中的所有函数
-                functions = extract_functions(content, func_patterns, file_path)
+                functions = extract_functions(content, FUNCTION_DEFINITION_PATTERNS, file_path)
                 
                 # 查找指定函数
                 for func in functions:
@@ -420,9 +459,7 @@ def find_function_call_chain(directory: str, extensions: List[str], function_nam
         if func_def and "body" in func_def:
             # 提取函数调用
             body = func_def["body"]
-            # 简单的函数调用模式匹配
-            call_pattern = re.compile(r'[^a-zA-Z0-9_]([a-zA-Z0-9_]+)\s*\(')
-            for match in call_pattern.finditer(body):
+            for match in CALL_SITE_PATTERN.finditer(body):
                 callee_name = match.group(1)
                 # 跳过内置函数
                 if callee_name in ["print", "len", "int", "str", "float", "list", "dict", "set", "tuple"]:
@@ -551,6 +588,14 @@ def main():
                       help="构建函数调用关系图数据库")
     parser.add_argument("--clear-graph", action="store_true", 
                       help="清除图数据库中的现有数据")
+    parser.add_argument("--bulk", action="store_true",
+                      help="与 --build-graph 一起使用：生成CSV并通过 neo4j-admin 离线批量导入（数据库需先停止，仅用于首次建库）")
+    parser.add_argument("--import-dir", default=".",
+                      help="批量导入时CSV文件的输出目录（默认：当前目录）")
+    parser.add_argument("--database", default="neo4j",
+                      help="批量导入的目标数据库名（默认：neo4j）")
+    parser.add_argument("--overwrite", action="store_true",
+                      help="批量导入时覆盖已存在的目标数据库（默认不覆盖，已有数据库时导入失败）")
     
     args = parser.parse_args()
     
@@ -558,6 +603,12 @@ def main():
     extensions = args.extensions.split(',')
 
     # 构建图数据库
+    if args.build_graph and args.bulk:
+        print(f"开始批量导入函数调用关系图数据库，分析目录: {args.dir}")
+        bulk_import_graph_database(args.dir, extensions, args.import_dir, args.database,
+                                   overwrite=args.overwrite)
+        return
+    
     if args.build_graph:
         if not HAS_NEO4J:
             print("错误: 请先安装py2neo库以使用图数据库功能")
@@ -758,11 +809,9 @@ def crawl_callees(directory: str, extensions: List[str], callees: List[Dict[str,
         # 提取函数调用
         body = func_def["body"]
         
-        # 简单的函数调用模式匹配
-        call_pattern = re.compile(r'[^a-zA-Z0-9_]([a-zA-Z0-9_]+)\s*\(')
         lower_callees = []
         
-        for match in call_pattern.finditer(body):
+        for match in CALL_SITE_PATTERN.finditer(body):
             lower_callee_name = match.group(1)
             # 跳过内置函数
             if lower_callee_name in ["print", "len", "int", "str", "float", "list", "dict", "set", "tuple"]:
@@ -852,55 +901,27 @@ def export_functions(functions: Dict[str, Dict[str, Any]], filename: str, format
                 f.write(body)
                 f.write("\n" + "-"*80 + "\n\n")
 
-def build_graph_database(directory: str, extensions: List[str], graph_uri: str, 
-                        graph_user: str, graph_password: str, clear_existing: bool = False) -> 'Graph':
+def collect_all_functions(directory: str, extensions: List[str]) -> Dict[str, Dict[str, Any]]:
     """
-    分析代码库并构建函数调用关系图数据库
+    遍历目录，提取所有函数定义(构建图数据库的第一遍遍历)
     
     Args:
         directory: 要分析的目录
         extensions: 文件扩展名列表
-        graph_uri: 图数据库连接URI
-        graph_user: 图数据库用户名
-        graph_password: 图数据库密码
-        clear_existing: 是否清除现有数据
         
     Returns:
-        图数据库连接
+        函数ID到函数信息的映射
     """
-    if not HAS_NEO4J:
-        raise ImportError("请先安装py2neo库: pip install py2neo")
-    
-    # 连接到图数据库
-    graph = connect_to_graph_db(graph_uri, graph_user, graph_password)
-    
-    # 清除现有数据
-    if clear_existing:
-        graph.run("MATCH (n) DETACH DELETE n")
-    
     # 编译正则表达式来识别函数定义
-    func_patterns = [
-        # C/C++风格函数定义
-        re.compile(r'((?:[a-zA-Z0-9_*]+\s+)+)([a-zA-Z0-9_]+)\s*\([^)]*\)\s*(?:const)?\s*(?:noexcept)?\s*{'),
-        # C/C++风格函数声明
-        re.compile(r'((?:[a-zA-Z0-9_*]+\s+)+)([a-zA-Z0-9_]+)\s*\([^)]*\)\s*(?:const)?\s*(?:noexcept)?\s*;'),
-        # Python风格函数
-        re.compile(r'def\s+([a-zA-Z0-9_]+)\s*\([^)]*\)(?:\s*->.*?)?\s*:'),
-        # JavaScript/TypeScript风格函数
-        re.compile(r'(?:function|const|let|var)\s+([a-zA-Z0-9_]+)\s*(?:=\s*(?:async\s*)?\([^)]*\)|=>\s*{|\([^)]*\)\s*{)')
-    ]
-    
-    # 编译函数调用的正则表达式
-    call_pattern = re.compile(r'[^a-zA-Z0-9_]([a-zA-Z0-9_]+)\s*\(')
-    
     # 存储所有函数的字典
     all_functions = {}
     
     # 第一遍遍历：找到所有函数定义
     print("第一步: 提取所有函数定义...")
+    ext_set = normalize_extensions(extensions)
     for root, _, files in os.walk(directory):
         for file in files:
-            if not any(file.endswith(ext) for ext in extensions):
+            if os.path.splitext(file)[1].lower() not in ext_set:
                 continue
                 
             file_path = os.path.join(root, file)
@@ -909,26 +930,42 @@ def build_graph_database(directory: str, extensions: List[str], graph_uri: str,
                     content = f.read()
                 
                 # 提取文件中的所有函数
-                for pattern in func_patterns:
-                    for match in pattern.finditer(content):
+                for pattern in DECLARATION_AND_DEFINITION_PATTERNS:
+                    pos = 0
+                    # 行号按上一个匹配的位置增量计算，不必每次从文件开头切片计数
+                    line_no, line_pos = 1, 0
+                    while True:
+                        match = pattern.search(content, pos)
+                        if not match:
+                            break
+                        pos = match.end()
+                        text = match.group(0)
+                        
                         # 找到函数的起始位置
                         start_pos = match.start()
-                        line_no = content[:start_pos].count('\n') + 1
+                        line_no += content.count('\n', line_pos, start_pos)
+                        line_pos = start_pos
                         
                         # 提取函数名
-                        if 'def ' in match.group(0):  # Python风格
+                        is_c_style = False
+                        if 'def ' in text:  # Python风格
                             func_name = match.group(1)
-                        elif 'function ' in match.group(0) or '=' in match.group(0):  # JavaScript风格
+                        elif 'function ' in text or '=' in text:  # JavaScript风格
                             func_name = match.group(1)
                         else:  # C/C++风格
                             func_name = match.group(2)
+                            is_c_style = True
                         
-                        # 提取函数体(只有函数定义才有函数体，声明没有)
+                        # 提取函数体(只有函数定义才有函数体，以分号结尾的声明没有)
                         body = ""
-                        if '{' in match.group(0) or ':' in match.group(0):
+                        if not text.endswith(';') and ('{' in text or ':' in text):
                             body = extract_function_body(content, start_pos, '{', '}')
                             if not body:
-                                body = extract_python_function_body(content.split('\n'), line_no)
+                                line_start = content.rfind('\n', 0, start_pos) + 1
+                                body = extract_python_function_body(content, line_start)
+                            elif is_c_style and text.endswith('{'):
+                                # C/C++函数不能嵌套定义，直接从函数体之后继续查找
+                                pos = max(pos, content.rfind('\n', 0, start_pos) + 1 + len(body))
                         
                         # 构建函数的唯一ID
                         func_id = f"{func_name}_{file_path}_{line_no}"
@@ -943,79 +980,199 @@ def build_graph_database(directory: str, extensions: List[str], graph_uri: str,
             except Exception as e:
                 print(f"错误处理文件 {file_path}: {e}", file=sys.stderr)
     
-    # 创建函数节点
-    print(f"第二步: 在图数据库中创建 {len(all_functions)} 个函数节点...")
-    func_nodes = {}
-    tx = graph.begin()
-    batch_size = 100
-    count = 0
+    return all_functions
+
+# 写入图数据库时每条语句（事务）包含的节点或关系数
+GRAPH_WRITE_BATCH_SIZE = 1000
+
+CREATE_FUNCTIONS_QUERY = """
+UNWIND $rows AS row
+CREATE (f:Function)
+SET f = row
+"""
+
+CREATE_CALLS_QUERY = """
+UNWIND $rows AS row
+MATCH (caller:Function {id: row.caller})
+UNWIND row.callees AS callee_id
+MATCH (callee:Function {id: callee_id})
+CREATE (caller)-[:CALLS]->(callee)
+"""
+
+def _iter_batches(items, batch_size: int):
+    """把可迭代对象按batch_size切分为列表"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def build_graph_database(directory: str, extensions: List[str], graph_uri: str, 
+                        graph_user: str, graph_password: str, clear_existing: bool = False) -> 'Graph':
+    """
+    分析代码库并构建函数调用关系图数据库
     
-    for func_id, func_info in all_functions.items():
-        # 创建函数节点
-        node = Node("Function", 
-                   id=func_id,
-                   name=func_info["name"], 
-                   file_path=func_info["file_path"],
-                   line_number=func_info["line_number"])
-        func_nodes[func_id] = node
-        tx.create(node)
+    Args:
+        directory: 要分析的目录
+        extensions: 文件扩展名列表
+        graph_uri: 图数据库连接URI
+        graph_user: 图数据库用户名
+        graph_password: 图数据库密码
+        clear_existing: 是否清除现有数据
         
-        count += 1
-        if count % batch_size == 0:
-            tx.commit()
-            tx = graph.begin()
-            print(f"  已处理 {count}/{len(all_functions)} 个函数节点")
+    Returns:
+        图数据库连接
+    """
+    if not HAS_NEO4J:
+        raise ImportError("请先安装py2neo库: pip install py2neo")
     
-    tx.commit()
+    # 连接到图数据库
+    graph = connect_to_graph_db(graph_uri, graph_user, graph_password)
+    
+    # 清除现有数据
+    if clear_existing:
+        graph.run("MATCH (n) DETACH DELETE n")
+    
+    # 第一遍遍历：找到所有函数定义
+    all_functions = collect_all_functions(directory, extensions)
+    
+    # 先建索引，后面按id匹配节点创建调用关系时才能走索引
+    print("创建索引...")
+    graph.run("CREATE INDEX function_name IF NOT EXISTS FOR (f:Function) ON (f.name)")
+    graph.run("CREATE INDEX function_id IF NOT EXISTS FOR (f:Function) ON (f.id)")
+    
+    # 创建函数节点：每批一条UNWIND语句、一个事务，内存和事务大小都与批大小成正比
+    print(f"第二步: 在图数据库中创建 {len(all_functions)} 个函数节点...")
+    count = 0
+    for batch in _iter_batches(all_functions.items(), GRAPH_WRITE_BATCH_SIZE):
+        rows = [{"id": func_id, "name": info["name"], "file_path": info["file_path"],
+                 "line_number": info["line_number"]} for func_id, info in batch]
+        graph.run(CREATE_FUNCTIONS_QUERY, rows=rows)
+        count += len(rows)
+        print(f"  已处理 {count}/{len(all_functions)} 个函数节点")
     
     # 第二遍遍历：分析函数调用关系
     print("第三步: 分析函数调用关系...")
-    tx = graph.begin()
-    count = 0
+    relations = collect_call_relations(all_functions)
+    
+    # 同一批内按调用者分组，每个调用者只匹配一次
     relationship_count = 0
+    for batch in _iter_batches(relations, GRAPH_WRITE_BATCH_SIZE):
+        callees_by_caller: Dict[str, List[str]] = {}
+        for caller_id, callee_id in batch:
+            callees_by_caller.setdefault(caller_id, []).append(callee_id)
+        rows = [{"caller": caller_id, "callees": callees} for caller_id, callees in callees_by_caller.items()]
+        graph.run(CREATE_CALLS_QUERY, rows=rows)
+        relationship_count += len(batch)
+        print(f"  已创建 {relationship_count} 个调用关系")
     
+    print(f"完成! 总共创建了 {relationship_count} 个函数调用关系")
+    
+    return graph
+
+def collect_call_relations(all_functions: Dict[str, Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    根据函数体分析函数调用关系
+    
+    Args:
+        all_functions: 函数ID到函数信息的映射
+        
+    Returns:
+        (调用者ID, 被调用者ID) 列表
+    """
+    skip_names = {"if", "for", "while", "switch", "print", "len",
+                  "int", "str", "float", "list", "dict", "set", "tuple"}
+    
+    # 按函数名建立索引，避免对每次调用都遍历所有函数
+    ids_by_name: Dict[str, List[str]] = {}
+    for func_id, func_info in all_functions.items():
+        ids_by_name.setdefault(func_info["name"], []).append(func_id)
+    
+    relations = []
     for func_id, func_info in all_functions.items():
         body = func_info.get("body", "")
         if not body:
             continue
         
-        # 查找函数调用
-        for match in call_pattern.finditer(body):
+        for match in CALL_SITE_PATTERN.finditer(body):
             callee_name = match.group(1)
-            
-            # 跳过内置函数和关键字
-            if callee_name in ["if", "for", "while", "switch", "print", "len", 
-                              "int", "str", "float", "list", "dict", "set", "tuple"]:
+            if callee_name in skip_names:
                 continue
-            
-            # 查找被调用的函数
-            for callee_id, callee_info in all_functions.items():
-                if callee_info["name"] == callee_name:
-                    # 创建调用关系
-                    caller_node = func_nodes[func_id]
-                    callee_node = func_nodes[callee_id]
-                    relationship = Relationship(caller_node, "CALLS", callee_node)
-                    tx.create(relationship)
-                    relationship_count += 1
-                    
-                    if relationship_count % batch_size == 0:
-                        tx.commit()
-                        tx = graph.begin()
-                        print(f"  已创建 {relationship_count} 个调用关系")
-        
-        count += 1
-        if count % batch_size == 0:
-            print(f"  已分析 {count}/{len(all_functions)} 个函数的调用关系")
+            for callee_id in ids_by_name.get(callee_name, ()):
+                relations.append((func_id, callee_id))
     
-    tx.commit()
-    print(f"完成! 总共创建了 {relationship_count} 个函数调用关系")
+    return relations
+
+def bulk_import_graph_database(directory: str, extensions: List[str], import_dir: str = ".",
+                               database: str = "neo4j", neo4j_admin: str = "neo4j-admin",
+                               overwrite: bool = False) -> bool:
+    """
+    使用 neo4j-admin 离线批量导入构建函数调用关系图数据库
     
-    # 创建索引以加快查询速度
-    print("创建索引...")
-    graph.run("CREATE INDEX ON :Function(name)")
-    graph.run("CREATE INDEX ON :Function(id)")
+    先生成 functions.csv 和 calls.csv，再调用
+    `neo4j-admin database import full` 导入。导入绕过事务日志，
+    速度远快于通过 Bolt 逐条写入，但要求目标数据库已停止，
+    只适用于首次全量建库，不适用于增量更新。目标数据库已存在时，
+    只有指定overwrite才会覆盖，否则 neo4j-admin 拒绝导入。
     
-    return graph
+    Args:
+        directory: 要分析的目录
+        extensions: 文件扩展名列表
+        import_dir: CSV文件的输出目录
+        database: 目标数据库名
+        neo4j_admin: neo4j-admin 可执行文件路径
+        overwrite: 是否覆盖已存在的目标数据库
+        
+    Returns:
+        导入是否成功
+    """
+    all_functions = collect_all_functions(directory, extensions)
+    
+    print("第二步: 分析函数调用关系...")
+    relations = collect_call_relations(all_functions)
+    
+    os.makedirs(import_dir, exist_ok=True)
+    functions_csv = os.path.join(import_dir, "functions.csv")
+    calls_csv = os.path.join(import_dir, "calls.csv")
+    
+    print(f"第三步: 写入 {len(all_functions)} 个函数节点和 {len(relations)} 个调用关系到CSV...")
+    with open(functions_csv, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["id:ID", "name", "file_path", "line_number:int", ":LABEL"])
+        writer.writerows(
+            (func_id, info["name"], info["file_path"], info["line_number"], "Function")
+            for func_id, info in all_functions.items()
+        )
+    
+    with open(calls_csv, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([":START_ID", ":END_ID", ":TYPE"])
+        writer.writerows((caller_id, callee_id, "CALLS") for caller_id, callee_id in relations)
+    
+    print("第四步: 调用 neo4j-admin 导入(数据库必须处于停止状态)...")
+    command = [
+        neo4j_admin, "database", "import", "full",
+        f"--nodes={functions_csv}",
+        f"--relationships={calls_csv}",
+    ]
+    if overwrite:
+        command.append("--overwrite-destination=true")
+    command.append(database)
+    try:
+        result = subprocess.run(command)
+    except FileNotFoundError:
+        print(f"错误: 未找到 {neo4j_admin}，CSV文件已保存在 {import_dir}", file=sys.stderr)
+        return False
+    
+    if result.returncode != 0:
+        print(f"neo4j-admin 导入失败(退出码 {result.returncode})，CSV文件已保存在 {import_dir}", file=sys.stderr)
+        return False
+    
+    print("批量导入完成! 启动数据库后请创建 :Function(name) 和 :Function(id) 索引")
+    return True
 
 def get_complete_function_call_chain(graph: 'Graph', function_name: str) -> Dict[str, Any]:
     """
@@ -1109,6 +1266,78 @@ def get_advanced_call_chain(graph: 'Graph', function_names: List[str], max_depth
     
     return result
 
+# 函数体缓存（SQLite），可通过环境变量修改路径
+FUNCTION_BODY_CACHE_PATH = os.getenv(
+    "FUNCTION_BODY_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output", "function_body_cache.db")
+)
+
+class FunctionBodyCache:
+    """
+    已提取函数体的持久缓存
+    
+    以(文件路径, 修改时间, 文件大小, 函数名, 行号)为键，文件修改后旧条目自然失效，
+    并在第一次写入该文件的新版本时删除，命中时无需读取文件和扫描大括号。
+    """
+    
+    def __init__(self, db_path: str = FUNCTION_BODY_CACHE_PATH):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS body_cache ("
+            "path TEXT NOT NULL, stamp TEXT NOT NULL, name TEXT NOT NULL, line INTEGER NOT NULL, "
+            "body TEXT NOT NULL, PRIMARY KEY (path, stamp, name, line))"
+        )
+        # 路径 -> 文件版本标识，每个文件只stat一次
+        self._stamps: Dict[str, str] = {}
+        # 本次已删除过旧版本条目的文件
+        self._pruned: Set[str] = set()
+    
+    def close(self):
+        self.conn.close()
+    
+    def _stamp(self, path: str) -> str:
+        stamp = self._stamps.get(path)
+        if stamp is None:
+            stat = os.stat(path)
+            stamp = self._stamps[path] = f"{stat.st_mtime_ns}:{stat.st_size}"
+        return stamp
+    
+    def get(self, path: str, name: str, line: int) -> Optional[str]:
+        """查找缓存的函数体，未命中返回None"""
+        row = self.conn.execute(
+            "SELECT body FROM body_cache WHERE path = ? AND stamp = ? AND name = ? AND line = ?",
+            (path, self._stamp(path), name, line)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def put(self, path: str, name: str, line: int, body: str):
+        """写入缓存，写入失败（如数据库被锁或只读）时只打印警告"""
+        stamp = self._stamp(path)
+        try:
+            if path not in self._pruned:
+                # 删除该文件旧版本的条目，避免文件每次修改都留下一批无用的行
+                self.conn.execute("DELETE FROM body_cache WHERE path = ? AND stamp != ?", (path, stamp))
+                self._pruned.add(path)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO body_cache (path, stamp, name, line, body) VALUES (?, ?, ?, ?, ?)",
+                (path, stamp, name, line, body)
+            )
+        except sqlite3.Error as e:
+            print(f"无法写入函数体缓存: {e}", file=sys.stderr)
+
+def open_function_body_cache() -> Optional[FunctionBodyCache]:
+    """打开函数体缓存，失败时返回None（不影响提取）"""
+    try:
+        return FunctionBodyCache()
+    except (sqlite3.Error, OSError) as e:
+        print(f"无法打开函数体缓存: {e}", file=sys.stderr)
+        return None
+
 def retrieve_function_source(graph: 'Graph', function_ids: List[str], directory: str) -> Dict[str, str]:
     """
     获取函数的源代码
@@ -1122,91 +1351,154 @@ def retrieve_function_source(graph: 'Graph', function_ids: List[str], directory:
         函数ID到源代码的映射
     """
     result = {}
-    
-    for func_id in function_ids:
-        # 从图数据库获取函数信息
-        query = """
-        MATCH (func:Function {id: $func_id})
-        RETURN func.name as name, func.file_path as file_path, func.line_number as line_number
-        """
-        func_info = graph.run(query, func_id=func_id).data()
+    # 缓存未命中的函数按文件分组：文件路径 -> [(函数ID, 函数名, 行号)]
+    pending: Dict[str, List[Tuple[str, str, int]]] = {}
+    body_cache = open_function_body_cache()
+    try:
+        # 同一函数可能出现在多条调用链中，每个ID只查询和提取一次
+        for func_id in dict.fromkeys(function_ids):
+            # 从图数据库获取函数信息
+            query = """
+            MATCH (func:Function {id: $func_id})
+            RETURN func.name as name, func.file_path as file_path, func.line_number as line_number
+            """
+            func_info = graph.run(query, func_id=func_id).data()
         
-        if not func_info:
-            continue
+            if not func_info:
+                continue
             
-        func_info = func_info[0]
-        file_path = func_info["file_path"]
-        line_number = func_info["line_number"]
+            func_info = func_info[0]
+            file_path = func_info["file_path"]
+            line_number = func_info["line_number"]
+            name = func_info["name"] or ""
+            # 索引中通常是绝对路径，只有相对路径才需要拼接代码目录
+            if file_path and not os.path.isabs(file_path):
+                file_path = os.path.join(directory, file_path)
         
-        # 读取文件并提取函数体
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                
-            # 定位到函数定义
-            lines = content.split('\n')
-            line_index = line_number - 1
-            
-            # 获取函数体
-            func_body = extract_function_at_line(lines, line_index)
-            if func_body:
+            try:
+                func_body = body_cache.get(file_path, name, line_number) if body_cache else None
+            except Exception as e:
+                print(f"错误获取函数源码 {func_id}: {e}", file=sys.stderr)
+                continue
+            if func_body is None:
+                pending.setdefault(file_path, []).append((func_id, name, line_number))
+            elif func_body:
                 result[func_id] = func_body
-        except Exception as e:
-            print(f"错误获取函数源码 {func_id}: {e}", file=sys.stderr)
     
+        def extract_file(file_path: str) -> List[Tuple[str, str, int, Optional[str]]]:
+            # 每个文件只读取一次，提取其中所有待取的函数体
+            funcs = pending[file_path]
+            try:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    content = f.read()
+            except Exception as e:
+                for func_id, _, _ in funcs:
+                    print(f"错误获取函数源码 {func_id}: {e}", file=sys.stderr)
+                return [(func_id, name, line_number, None) for func_id, name, line_number in funcs]
+            # 行偏移索引每个文件只建立一次，各函数按行号直接定位
+            line_starts = build_line_starts(content)
+            # 不同ID可能指向同一位置（如重复导入的节点），按行号复用已提取的函数体
+            bodies: Dict[int, str] = {}
+            extracted = []
+            for func_id, name, line_number in funcs:
+                func_body = bodies.get(line_number)
+                if func_body is None:
+                    try:
+                        func_body = bodies[line_number] = extract_function_at_line(content, line_number - 1, line_starts)
+                    except Exception as e:
+                        # 单个函数出错（如节点缺少行号）不影响同一文件中的其他函数
+                        print(f"错误获取函数源码 {func_id}: {e}", file=sys.stderr)
+                extracted.append((func_id, name, line_number, func_body))
+            return extracted
+    
+        # 文件读取互不依赖且以I/O为主，用线程池并发执行；缓存只在主线程写入
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4, len(pending))) as executor:
+                for file_path, bodies in zip(pending, executor.map(extract_file, pending)):
+                    for func_id, name, line_number, func_body in bodies:
+                        if func_body is None:
+                            continue
+                        if body_cache:
+                            body_cache.put(file_path, name, line_number, func_body)
+                        if func_body:
+                            result[func_id] = func_body
+    finally:
+        if body_cache:
+            body_cache.close()
     return result
 
-def extract_function_at_line(lines: List[str], line_index: int) -> str:
+def build_line_starts(content: str) -> List[int]:
+    """计算每一行起始位置的偏移，下标为行索引"""
+    return [0] + [match.end() for match in re.finditer('\n', content)]
+
+def extract_function_at_line(content: str, line_index: int, line_starts: Optional[List[int]] = None) -> str:
     """
     从给定行提取函数体
     
     Args:
-        lines: 文件的所有行
+        content: 文件内容
         line_index: 函数定义所在的行索引
+        line_starts: build_line_starts得到的行偏移索引；从同一文件提取多个函数时传入，避免重复查找换行
         
     Returns:
         函数体字符串
     """
-    if line_index >= len(lines):
-        return ""
+    # 定位到函数定义行的起始偏移
+    if line_starts is not None:
+        if line_index >= len(line_starts):
+            return ""
+        line_start = line_starts[max(line_index, 0)]
+    else:
+        line_start = 0
+        for _ in range(line_index):
+            line_start = content.find('\n', line_start) + 1
+            if line_start == 0:
+                return ""
+    
+    line_end = content.find('\n', line_start)
+    if line_end == -1:
+        line_end = len(content)
         
     # 检查是否为函数定义行
-    line = lines[line_index]
+    line = content[line_start:line_end]
     is_c_style = '{' in line
     is_python_style = 'def ' in line and ':' in line
     
     if is_c_style:
         # C/C++风格函数
-        return extract_c_function_body(lines, line_index)
+        return extract_c_function_body(content, line_start)
     elif is_python_style:
         # Python风格函数
-        return extract_python_function_body(lines, line_index + 1)
+        return extract_python_function_body(content, line_start)
     
     return ""
 
-def extract_c_function_body(lines: List[str], start_line: int) -> str:
-    """提取C/C++风格函数体"""
-    body_lines = []
+# 函数体扫描只关心大括号和换行（跳过注释和字面量），其余字符交给正则引擎在C层跳过
+_C_BODY_SCAN_RE = re.compile(_SKIPPED_TOKENS + r'|[{}\n]', re.DOTALL)
+
+def extract_c_function_body(content: str, start_pos: int) -> str:
+    """提取C/C++风格函数体(从start_pos所在行开始，直接对content切片)"""
     open_braces = 0
     found_opening = False
-    
-    for i in range(start_line, len(lines)):
-        line = lines[i]
-        body_lines.append(line)
-        
-        # 计算大括号数量
-        for char in line:
-            if char == '{':
-                open_braces += 1
-                found_opening = True
-            elif char == '}':
-                open_braces -= 1
-        
-        # 如果已经找到了开始的大括号，且大括号数量平衡，说明函数结束
-        if found_opening and open_braces == 0:
-            break
-    
-    return '\n'.join(body_lines)
+    lines = 0
+    
+    for match in _C_BODY_SCAN_RE.finditer(content, start_pos):
+        char = match.group()
+        if char == '{':
+            open_braces += 1
+            found_opening = True
+        elif char == '}':
+            open_braces -= 1
+        elif char == '\n':
+            # 行尾：如果已经找到了开始的大括号，且大括号数量平衡，说明函数结束
+            if found_opening and open_braces == 0:
+                return content[start_pos:match.start()]
+            lines += 1
+            if lines >= MAX_FUNCTION_LINES:
+                # 函数过长或大括号不平衡，放弃提取
+                return ""
+    
+    return content[start_pos:]
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
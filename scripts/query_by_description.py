@@ -7,20 +7,52 @@
 import os
 import sys
 import argparse
+import atexit
+import contextlib
+import functools
+import hashlib
+import hmac
+import io
+import itertools
 import json
+import mmap
 import re
+import socket
+import sqlite3
+import tempfile
 import requests
-import jieba
-import jieba.analyse
-from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    # C加速版本，接口与jieba一致
+    import jieba_fast as jieba
+    import jieba_fast.analyse
+except ImportError:
+    import jieba
+    import jieba.analyse
+from typing import List, Dict, Any, Optional, Tuple
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
+try:
+    # 更快的JSON解析，未安装时使用标准库
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 # 修复导入路径问题
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
 
+try:
+    from src.services.semantic_cache import SemanticCache
+except ImportError:
+    # 无法导入服务包时不使用Cypher缓存
+    SemanticCache = None
+
 try:
     from src.services.neo4j_service import Neo4jService
 except ImportError:
@@ -31,7 +63,9 @@ except ImportError:
             self.uri = uri
             self.username = username
             self.password = password
-            self.driver = GraphDatabase.driver(uri, auth=(username, password))
+            self.driver = GraphDatabase.driver(uri, auth=(username, password),
+                                               max_connection_pool_size=8,
+                                               connection_acquisition_timeout=5)
         
         def close(self):
             if self.driver:
@@ -40,12 +74,13 @@ except ImportError:
         def find_function(self, function_name, project_name):
             with self.driver.session() as session:
                 result = session.run(
-                    "MATCH (f:Function {name: $name, project: $project}) RETURN f",
+                    "MATCH (f:Function {name: $name, project: $project}) "
+                    "RETURN f, coalesce(f.body, [(f)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body",
                     name=function_name, project=project_name
                 )
                 record = result.single()
                 if record:
-                    return dict(record["f"])
+                    return dict(record["f"], body=record["body"])
                 return None
         
         def find_callers(self, function_name, project_name, depth=1):
@@ -70,6 +105,96 @@ load_dotenv()
 # 使用固定的API密钥，或从环境变量加载
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "sk-96c022f633244358b6cf17f4e5c76a9f")
 
+# 导入时加载分词词典，避免首次查询时的加载延迟
+jieba.initialize()
+
+@functools.lru_cache(maxsize=1024)
+def extract_keywords(text: str, top_k: int = 5) -> Tuple[str, ...]:
+    """
+    提取关键词（带缓存），结果按权重排序，取前top_k个
+    
+    Args:
+        text: 输入文本
+        top_k: 关键词数量
+        
+    Returns:
+        关键词元组
+    """
+    return tuple(jieba.analyse.extract_tags(text, topK=top_k))
+
+def _default_socket_path():
+    """
+    守护进程套接字的默认路径：优先放在用户私有的$XDG_RUNTIME_DIR中，
+    否则放在临时目录并在文件名中带上uid，避免不同用户共用同一个套接字
+    """
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "qbd.sock")
+    uid = os.getuid() if hasattr(os, "getuid") else os.getenv("USERNAME", "user")
+    return os.path.join(tempfile.gettempdir(), f"qbd-{uid}.sock")
+
+# 守护进程模式的Unix套接字路径
+DAEMON_SOCKET_PATH = os.getenv("QUERY_DAEMON_SOCKET") or _default_socket_path()
+
+# 模块级HTTP会话，复用到DeepSeek的TCP/TLS连接
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+    "Content-Type": "application/json"
+})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=frozenset(["POST"]))
+))
+
+# Cypher生成缓存（SQLite），可通过环境变量修改路径
+CYPHER_CACHE_PATH = os.getenv("CYPHER_CACHE_PATH", os.path.join(project_root, "output", "cypher_cache.db"))
+# 语义缓存使用的本地嵌入模型及命中阈值（余弦相似度）
+CYPHER_CACHE_MODEL = os.getenv("CYPHER_CACHE_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+CYPHER_CACHE_THRESHOLD = 0.92
+
+# 生成Cypher查询的系统提示。内容保持静态（不含时间戳等动态信息），
+# 使每次请求的前缀完全相同，从而命中DeepSeek的上下文硬盘缓存
+CYPHER_SYSTEM_PROMPT = """你是一个专业的代码分析助手，精通Neo4j Cypher查询语言。
+我需要为图数据库Neo4j生成一个Cypher查询，在代码分析中查找特定函数。
+
+数据库结构:
+- 节点标签: Function
+- 节点属性: name, project, file_path, line_number, signature, namespace, is_defined, return_type, is_virtual, is_template
+- 关系: 
+  - (Function)-[:CALLS]->(Function) 表示函数调用关系
+  - (Function)-[:SPECIALIZES]->(Function) 表示模板特化关系
+  - (Function)-[:OVERRIDES]->(Function) 表示方法覆盖关系
+  - (Function)-[:HAS_CONTENT]->(TextContent) 连接到函数内容
+
+用户会给出"用户描述"和"项目名称"。
+请生成一个Cypher查询，找到与这个描述最相关的函数。考虑函数名称、签名以及其他属性中可能包含的关键词。
+必须返回完整的函数节点，而不仅仅是节点的属性。确保查询最后是RETURN f 而不是返回f的属性。
+
+你的回答应该只包含Cypher查询语句本身，不要有任何解释或其他文本。查询应该以`MATCH`开头并以`;`或不带分号结尾。
+
+示例1:
+用户描述: 解析配置文件 parse config file
+项目名称: demo
+MATCH (f:Function) WHERE f.project = 'demo' AND (toLower(f.name) CONTAINS 'parse' AND toLower(f.name) CONTAINS 'config') RETURN f LIMIT 10
+
+示例2:
+用户描述: 内存分配 memory allocation OR heap
+项目名称: demo
+MATCH (f:Function) WHERE f.project = 'demo' AND (toLower(f.name) CONTAINS 'alloc' OR toLower(f.signature) CONTAINS 'malloc') RETURN f LIMIT 10
+
+示例3:
+用户描述: 虚函数 重写 draw virtual method override
+项目名称: demo
+MATCH (f:Function)-[:OVERRIDES]->(base:Function) WHERE f.project = 'demo' AND toLower(f.name) CONTAINS 'draw' RETURN f LIMIT 10
+
+示例4:
+用户描述: 模板特化 template specialization swap
+项目名称: demo
+MATCH (f:Function)-[:SPECIALIZES]->(t:Function) WHERE f.project = 'demo' AND f.is_template = true AND toLower(f.name) CONTAINS 'swap' RETURN f LIMIT 10"""
+
 # 编程领域术语映射表（中英文映射）
 programming_term_mapping = {
     "函数": ["function", "method", "procedure", "routine"],
@@ -94,6 +219,39 @@ programming_term_mapping = {
     "缓存": ["cache", "buffer", "temporary"]
 }
 
+# 同义词（小写）到其所在同义词组的反向索引，保持映射表中的顺序
+SYNONYM_INDEX = {
+    synonym.lower(): synonyms
+    for synonyms in programming_term_mapping.values()
+    for synonym in synonyms
+}
+# 所有英文同义词（小写）
+_ALL_SYNONYMS = set(SYNONYM_INDEX)
+# 一次扫描找出描述中出现的全部同义词：零宽前瞻允许匹配相互重叠，长词优先
+SYNONYM_PATTERN = re.compile(
+    '(?=(' + '|'.join(re.escape(synonym) for synonym in sorted(_ALL_SYNONYMS, key=len, reverse=True)) + '))'
+)
+# 同一位置只能命中最长的同义词，这里记录被它包含的其他同义词（如asynchronous包含async）
+SYNONYM_CONTAINS = {
+    synonym: {other for other in _ALL_SYNONYMS if other != synonym and other in synonym}
+    for synonym in _ALL_SYNONYMS
+}
+
+def find_synonyms(description: str) -> set:
+    """
+    找出描述中出现的所有编程术语同义词
+    
+    Args:
+        description: 查询描述
+        
+    Returns:
+        出现的同义词集合（小写）
+    """
+    found = set(SYNONYM_PATTERN.findall(description.lower()))
+    for synonym in list(found):
+        found |= SYNONYM_CONTAINS[synonym]
+    return found
+
 def enhance_query_with_context(description: str, language: str = "zh") -> str:
     """
     增强查询，添加代码语境和同义词扩展
@@ -110,7 +268,7 @@ def enhance_query_with_context(description: str, language: str = "zh") -> str:
     # 中文查询处理
     if language == "zh":
         # 使用结巴分词提取关键词
-        keywords = jieba.analyse.extract_tags(description, topK=5)
+        keywords = extract_keywords(description, 5)
         
         # 查找每个关键词的编程术语映射
         for keyword in keywords:
@@ -120,13 +278,12 @@ def enhance_query_with_context(description: str, language: str = "zh") -> str:
     # 英文查询处理
     else:
         # 查找查询中可能出现的编程术语
-        for term, synonyms in programming_term_mapping.items():
-            for synonym in synonyms:
-                if synonym.lower() in description.lower():
-                    # 添加同义词，但避免重复
-                    for syn in synonyms:
-                        if syn.lower() != synonym.lower() and syn not in enhanced_terms:
-                            enhanced_terms.append(syn)
+        found_synonyms = find_synonyms(description)
+        for synonym, synonyms in SYNONYM_INDEX.items():
+            if synonym in found_synonyms:
+                enhanced_terms.extend(syn for syn in synonyms if syn.lower() != synonym)
+        # 添加同义词，但避免重复
+        enhanced_terms = list(dict.fromkeys(enhanced_terms))
     
     # 提取代码标识符
     code_terms = extract_code_terms(description)
@@ -144,6 +301,15 @@ def enhance_query_with_context(description: str, language: str = "zh") -> str:
         
     return enhanced_query
 
+# 代码标识符的正则表达式
+CAMEL_CASE_PATTERN = re.compile(r'[a-z][a-zA-Z0-9]*[A-Z][a-zA-Z0-9]*')
+SNAKE_CASE_PATTERN = re.compile(r'[a-z][a-z0-9]*_[a-z0-9]+(?:_[a-z0-9]+)*')
+FUNC_CALL_PATTERN = re.compile(r'([a-zA-Z][a-zA-Z0-9]*)\(\)')
+
+# 从LLM响应中提取Cypher查询的正则表达式
+CYPHER_CODE_BLOCK_PATTERN = re.compile(r'```(?:cypher)?\s*((?:MATCH|match)[\s\S]*?)```')
+CYPHER_MATCH_PATTERN = re.compile(r'((?:MATCH|match)[^\n;]*(?:\n[^;]*)*)', re.MULTILINE)
+
 def extract_code_terms(text: str) -> List[str]:
     """
     从文本中提取可能的代码标识符
@@ -155,21 +321,173 @@ def extract_code_terms(text: str) -> List[str]:
         代码标识符列表
     """
     # 匹配驼峰命名法
-    camel_case = re.findall(r'[a-z][a-zA-Z0-9]*[A-Z][a-zA-Z0-9]*', text)
+    camel_case = CAMEL_CASE_PATTERN.findall(text)
     
     # 匹配下划线命名法
-    snake_case = re.findall(r'[a-z][a-z0-9]*_[a-z0-9]+(_[a-z0-9]+)*', text)
+    snake_case = SNAKE_CASE_PATTERN.findall(text)
     
     # 匹配可能的函数调用
-    func_calls = re.findall(r'[a-zA-Z][a-zA-Z0-9]*\(\)', text)
+    func_calls = FUNC_CALL_PATTERN.findall(text)
     
     # 合并结果并去除重复
-    result = list(set(camel_case + snake_case + [f.rstrip('()') for f in func_calls]))
+    result = list(set(camel_case + snake_case + func_calls))
     return result
 
-def generate_query_from_description(description, project_name, language="zh"):
+def normalize_description(description: str, language: str = "zh") -> str:
     """
-    使用LLM生成基于描述的Neo4j查询
+    规范化查询描述，作为缓存键
+    
+    Args:
+        description: 自然语言描述
+        language: 查询语言
+        
+    Returns:
+        规范化后的描述
+    """
+    text = " ".join(description.strip().lower().split())
+    if language == "zh":
+        # 中文按分词结果重新拼接，消除空白差异
+        text = " ".join(token for token in jieba.lcut(text) if token.strip())
+    return text
+
+# 系统提示的摘要，作为Cypher缓存键的一部分
+CYPHER_PROMPT_HASH = hashlib.sha1(CYPHER_SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+
+class CypherCache:
+    """
+    LLM生成的Cypher查询缓存，存储和检索由SemanticCache完成，条目按其TTL过期
+    
+    先按规范化描述精确匹配，未命中时（安装了sentence-transformers的情况下）
+    对同一项目和语言下已缓存描述的嵌入做余弦相似度检索。
+    """
+    
+    def __init__(self, db_path: str = CYPHER_CACHE_PATH, model_name: str = CYPHER_CACHE_MODEL,
+                 threshold: float = CYPHER_CACHE_THRESHOLD):
+        self._cache = SemanticCache(path=db_path, threshold=threshold, model_name=model_name)
+    
+    def close(self):
+        self._cache.close()
+    
+    @staticmethod
+    def _namespace(project_name: str, language: str) -> str:
+        # 系统提示修改后，之前生成的查询不再复用
+        return f"cypher:{CYPHER_PROMPT_HASH}:{project_name}:{language}"
+    
+    def get(self, description: str, project_name: str, language: str = "zh") -> Optional[str]:
+        """查找缓存的Cypher查询，未命中返回None"""
+        return self._cache.get(self._namespace(project_name, language),
+                               normalize_description(description, language))
+    
+    def put(self, description: str, project_name: str, language: str, cypher_query: str):
+        """写入缓存"""
+        self._cache.put(self._namespace(project_name, language),
+                        normalize_description(description, language), cypher_query)
+
+_cypher_cache = None
+
+def get_cypher_cache() -> Optional[CypherCache]:
+    """获取全局Cypher缓存，打开失败时返回None（不影响查询）"""
+    global _cypher_cache
+    if SemanticCache is None:
+        return None
+    if _cypher_cache is None:
+        try:
+            _cypher_cache = CypherCache()
+        except sqlite3.Error as e:
+            print(f"无法打开Cypher缓存: {e}")
+            return None
+    return _cypher_cache
+
+def call_deepseek(prompt: str, max_tokens: int = 500) -> str:
+    """
+    调用DeepSeek生成Cypher查询
+    
+    Args:
+        prompt: 用户消息（系统提示固定为CYPHER_SYSTEM_PROMPT）
+        max_tokens: 最大生成token数
+    
+    Returns:
+        LLM响应文本
+    """
+    payload = {
+        "model": "deepseek-chat",
+        "messages": [
+            {"role": "system", "content": CYPHER_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3,
+        "max_tokens": max_tokens
+    }
+    
+    # 固定键顺序序列化，保证请求前缀逐字节一致以命中服务端前缀缓存
+    response = _SESSION.post(
+        "https://api.deepseek.com/v1/chat/completions",
+        data=json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8"),
+        timeout=(3.05, 30)
+    )
+    
+    # 检查请求是否成功
+    response.raise_for_status()
+    
+    # 解析响应（直接解析原始字节，不经过requests的文本解码）
+    result = json_loads(response.content)
+    try:
+        content = result["choices"][0]["message"]["content"].strip()
+    except (KeyError, IndexError, TypeError, AttributeError):
+        raise ValueError(f"无法识别的DeepSeek响应: {str(result)[:200]}")
+    
+    # 记录前缀缓存命中情况
+    usage = result.get("usage", {})
+    if "prompt_cache_hit_tokens" in usage:
+        print(f"提示缓存命中: {usage['prompt_cache_hit_tokens']} tokens, "
+              f"未命中: {usage.get('prompt_cache_miss_tokens', 0)} tokens")
+    
+    return content
+
+# 描述本身就是函数名（可带空括号）或带命名空间限定的函数名时，无需调用LLM
+IDENTIFIER_PATTERN = re.compile(r'^(?:([A-Za-z_][A-Za-z0-9_]*(?:::[A-Za-z_][A-Za-z0-9_]*)*)::)?([A-Za-z_~][A-Za-z0-9_]*)(?:\(\))?$')
+
+NAME_TEMPLATE_QUERY = """
+        MATCH (f:Function {name: $name, project: $project})
+        RETURN f, coalesce(f.body, [(f)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body
+        """
+QUALIFIED_NAME_TEMPLATE_QUERY = """
+        MATCH (f:Function {name: $name, project: $project})
+        RETURN f, coalesce(f.body, [(f)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body
+        ORDER BY CASE WHEN f.namespace = $namespace THEN 0 ELSE 1 END
+        """
+
+def parse_identifier(description: str) -> Optional[Tuple[str, str]]:
+    """
+    将形如foo、foo()、ns::Class::foo的描述解析为(命名空间, 函数名)
+    
+    Returns:
+        (命名空间, 函数名)，不是标识符时返回None
+    """
+    match = IDENTIFIER_PATTERN.match(description.strip())
+    if not match:
+        return None
+    return match.group(1) or "", match.group(2)
+
+def try_template_query(description: str) -> Optional[str]:
+    """
+    已知形式的描述直接使用预定义的参数化查询（参数见build_query_parameters）
+    
+    Returns:
+        模板查询，描述不匹配任何模板时返回None
+    """
+    identifier = parse_identifier(description)
+    if identifier is None:
+        return None
+    namespace, _ = identifier
+    return QUALIFIED_NAME_TEMPLATE_QUERY if namespace else NAME_TEMPLATE_QUERY
+
+def build_query_parameters(description, project_name, language="zh") -> Dict[str, Any]:
+    """
+    构建执行查询时传入的参数
+    
+    备选查询只通过$project、$description、$keywords引用用户输入，
+    查询文本本身保持不变，便于Neo4j复用执行计划，也避免引号注入。
     
     Args:
         description: 自然语言描述
@@ -177,103 +495,208 @@ def generate_query_from_description(description, project_name, language="zh"):
         language: 查询语言
     
     Returns:
-        生成的Neo4j Cypher查询
+        查询参数字典
     """
-    # 增强查询
-    enhanced_description = enhance_query_with_context(description, language)
+    if language == "zh":
+        # 关键词按权重排序，取前5个的前3个与增强查询时的结果共用缓存
+        keywords = list(extract_keywords(description, 5)[:3])
+    else:
+        keywords = [description]
+    namespace, name = parse_identifier(description) or ("", "")
+    return {"project": project_name, "description": description, "keywords": keywords,
+            "name": name, "namespace": namespace}
+
+def build_fallback_query(language="zh"):
+    """
+    LLM生成的查询不可用时，基于关键词构建备选查询（参数见build_query_parameters）
     
-    prompt = f"""
-    我需要为图数据库Neo4j生成一个Cypher查询，在代码分析中查找特定函数。
+    Args:
+        language: 查询语言
+    
+    Returns:
+        备选Cypher查询
+    """
+    # 基于语言选择不同的备选查询
+    if language == "zh":
+        # 中文查询：使用分词和OR条件
+        return """
+        MATCH (f:Function)
+        WHERE f.project = $project 
+          AND ANY(kw IN $keywords WHERE f.name CONTAINS kw)
+        RETURN f, coalesce(f.body, [(f)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body
+        ORDER BY size((f)--()) DESC
+        LIMIT 10
+        """
+    else:
+        # 英文查询：忽略大小写匹配整个描述
+        return """
+        MATCH (f:Function)
+        WHERE f.project = $project 
+          AND toLower(f.name) CONTAINS toLower($description)
+        RETURN f, coalesce(f.body, [(f)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body
+        ORDER BY size((f)--()) DESC
+        LIMIT 10
+        """
+
+def build_error_query():
+    """API调用失败时使用的基本查询模板（参数见build_query_parameters）"""
+    return """
+        MATCH (f:Function)
+        WHERE f.project = $project AND f.name CONTAINS $description
+        RETURN f, coalesce(f.body, [(f)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body
+        LIMIT 10
+        """
+
+# 查询末尾的LIMIT子句（可带分号）
+TRAILING_LIMIT_PATTERN = re.compile(r'\bLIMIT\s+(?:\d+|\$\w+)\s*;?\s*$', re.IGNORECASE)
+
+def ensure_limit(cypher_query, limit=10):
+    """
+    确保查询以LIMIT结尾，避免LLM生成的查询返回大量结果
     
-    数据库结构:
-    - 节点标签: Function
-    - 节点属性: name, project, file_path, line_number, signature, namespace, is_defined, return_type, is_virtual, is_template
-    - 关系: 
-      - (Function)-[:CALLS]->(Function) 表示函数调用关系
-      - (Function)-[:SPECIALIZES]->(Function) 表示模板特化关系
-      - (Function)-[:OVERRIDES]->(Function) 表示方法覆盖关系
-      - (Function)-[:HAS_CONTENT]->(TextContent) 连接到函数内容
+    Args:
+        cypher_query: Cypher查询
+        limit: 缺少LIMIT时追加的结果数量
     
-    用户描述: {enhanced_description}
-    项目名称: {project_name}
+    Returns:
+        带LIMIT的查询
+    """
+    if TRAILING_LIMIT_PATTERN.search(cypher_query):
+        return cypher_query
+    return f"{cypher_query.rstrip().rstrip(';').rstrip()}\nLIMIT {limit}"
+
+def returns_function_node(cypher_query):
+    """检查查询是否返回完整的函数节点而不是属性"""
+    return bool(cypher_query) and ("RETURN f" in cypher_query or "return f" in cypher_query.lower())
+
+def generate_query_from_description(description, project_name, language="zh", use_cache=True):
+    """
+    使用LLM生成基于描述的Neo4j查询
     
-    请生成一个Cypher查询，找到与这个描述最相关的函数。考虑函数名称、签名以及其他属性中可能包含的关键词。
-    必须返回完整的函数节点，而不仅仅是节点的属性。确保查询最后是RETURN f 而不是返回f的属性。
+    Args:
+        description: 自然语言描述
+        project_name: 项目名称
+        language: 查询语言
+        use_cache: 是否使用Cypher缓存，命中时不调用LLM
     
-    你的回答应该只包含Cypher查询语句本身，不要有任何解释或其他文本。查询应该以`MATCH`开头并以`;`或不带分号结尾。
+    Returns:
+        生成的Neo4j Cypher查询
     """
+    template_query = try_template_query(description)
+    if template_query:
+        return template_query
+    
+    cache = get_cypher_cache() if use_cache else None
+    if cache:
+        cached_query = cache.get(description, project_name, language)
+        if cached_query:
+            print("使用缓存的查询。")
+            return cached_query
+    
+    # 增强查询
+    enhanced_description = enhance_query_with_context(description, language)
+    
+    # 只把动态内容放在用户消息里，静态的系统提示保持前缀不变
+    prompt = f"""用户描述: {enhanced_description}
+项目名称: {project_name}"""
     
     try:
         # 调用Deepseek API
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": "你是一个专业的代码分析助手，精通Neo4j Cypher查询语言。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.3,
-            "max_tokens": 500
-        }
-        
-        response = requests.post(
-            "https://api.deepseek.com/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        
-        # 检查请求是否成功
-        response.raise_for_status()
-        
-        # 解析响应
-        result = response.json()
-        content = result["choices"][0]["message"]["content"].strip()
+        content = call_deepseek(prompt)
         
         # 尝试提取Cypher查询
         cypher_query = extract_cypher_query(content)
         
-        # 确保查询是有效的并且返回节点而不是属性
-        if not cypher_query or ("RETURN f" not in cypher_query and "return f" not in cypher_query.lower()):
+        # 确保查询是有效的并且返回节点而不是属性；备选查询不写入缓存，下次重新生成
+        if not returns_function_node(cypher_query):
             print("LLM生成的查询可能不返回完整节点，使用备选查询。")
-            # 基于语言选择不同的备选查询
-            if language == "zh":
-                # 中文查询：使用分词和OR条件
-                keywords = jieba.analyse.extract_tags(description, topK=3)
-                keyword_conditions = " OR ".join([f"f.name CONTAINS '{kw}'" for kw in keywords])
-                cypher_query = f"""
-                MATCH (f:Function)
-                WHERE f.project = '{project_name}' 
-                  AND ({keyword_conditions})
-                RETURN f
-                ORDER BY size((f)--()) DESC
-                LIMIT 10
-                """
-            else:
-                # 英文查询：直接使用关键词匹配
-                cypher_query = f"""
-                MATCH (f:Function)
-                WHERE f.project = '{project_name}' 
-                  AND (f.name CONTAINS '{description}' OR f.name =~ '(?i).*{description}.*')
-                RETURN f
-                ORDER BY size((f)--()) DESC
-                LIMIT 10
-                """
+            return build_fallback_query(language)
+        
+        if cache:
+            cache.put(description, project_name, language, cypher_query)
         
         return cypher_query
         
     except Exception as e:
         print(f"生成查询时出错: {e}")
         # 如果API调用失败，使用基本查询模板
-        return f"""
-        MATCH (f:Function)
-        WHERE f.project = '{project_name}' AND f.name CONTAINS '{description}'
-        RETURN f
-        LIMIT 10
-        """
+        return build_error_query()
+
+# 批量响应中每个查询的编号前缀，如 "[1]:"
+BATCH_ANCHOR_PATTERN = re.compile(r'^\s*\[(\d+)\]:', re.MULTILINE)
+
+def generate_queries_batch(descriptions: List[str], project_name: str, language: str = "zh",
+                           use_cache: bool = True) -> List[str]:
+    """
+    在一次LLM调用中为多个描述生成Neo4j查询
+    
+    多个描述拼接到同一个请求中，分摊系统提示的开销。响应解析失败时
+    退回到逐条调用generate_query_from_description。
+    
+    Args:
+        descriptions: 自然语言描述列表
+        project_name: 项目名称
+        language: 查询语言
+        use_cache: 是否使用Cypher缓存
+    
+    Returns:
+        与descriptions一一对应的Cypher查询列表
+    """
+    queries: List[Optional[str]] = [None] * len(descriptions)
+    cache = get_cypher_cache() if use_cache else None
+    
+    # 先匹配模板、再从缓存取，剩下的才需要调用LLM
+    pending = []
+    for i, description in enumerate(descriptions):
+        cached_query = try_template_query(description)
+        if not cached_query and cache:
+            cached_query = cache.get(description, project_name, language)
+        if cached_query:
+            queries[i] = cached_query
+        else:
+            pending.append(i)
+    
+    if len(pending) == 1:
+        i = pending[0]
+        queries[i] = generate_query_from_description(descriptions[i], project_name, language, use_cache)
+        pending = []
+    
+    if pending:
+        items = "\n".join(
+            f"[{n}]: 用户描述: {enhance_query_with_context(descriptions[i], language)}"
+            for n, i in enumerate(pending, 1)
+        )
+        prompt = f"""项目名称: {project_name}
+下面有{len(pending)}个用户描述，请为每个描述分别生成一个Cypher查询。
+每个查询以对应的编号前缀（如[1]:）开头，按编号顺序输出，除此之外不要输出其他内容。
+{items}"""
+        
+        segments = {}
+        try:
+            content = call_deepseek(prompt, max_tokens=min(500 * len(pending), 8000))
+            anchors = list(BATCH_ANCHOR_PATTERN.finditer(content))
+            for k, anchor in enumerate(anchors):
+                end = anchors[k + 1].start() if k + 1 < len(anchors) else len(content)
+                segments[int(anchor.group(1))] = extract_cypher_query(content[anchor.end():end])
+        except Exception as e:
+            print(f"批量生成查询时出错: {e}")
+        
+        if set(segments) != set(range(1, len(pending) + 1)):
+            print("批量响应解析失败，改为逐条生成查询。")
+            for i in pending:
+                queries[i] = generate_query_from_description(descriptions[i], project_name, language, use_cache)
+        else:
+            for n, i in enumerate(pending, 1):
+                cypher_query = segments[n]
+                if not returns_function_node(cypher_query):
+                    print(f"描述[{n}]生成的查询可能不返回完整节点，使用备选查询。")
+                    queries[i] = build_fallback_query(language)
+                    continue
+                if cache:
+                    cache.put(descriptions[i], project_name, language, cypher_query)
+                queries[i] = cypher_query
+    
+    return queries
 
 def extract_cypher_query(text):
     """
@@ -286,15 +709,12 @@ def extract_cypher_query(text):
         提取的Cypher查询或None
     """
     # 方法1：尝试找到代码块
-    import re
-    code_pattern = re.compile(r'```(?:cypher)?\s*((?:MATCH|match)[\s\S]*?)```')
-    code_match = code_pattern.search(text)
+    code_match = CYPHER_CODE_BLOCK_PATTERN.search(text)
     if code_match:
         return code_match.group(1).strip()
     
     # 方法2：尝试找到以MATCH开头的行
-    match_pattern = re.compile(r'((?:MATCH|match)[^\n;]*(?:\n[^;]*)*)', re.MULTILINE)
-    match_match = match_pattern.search(text)
+    match_match = CYPHER_MATCH_PATTERN.search(text)
     if match_match:
         return match_match.group(1).strip()
     
@@ -304,10 +724,48 @@ def extract_cypher_query(text):
     
     return None
 
+# 不超过此大小的源文件按行缓存，更大的文件逐行流式读取
+CACHED_FILE_MAX_SIZE = 1024 * 1024
+
+@functools.lru_cache(maxsize=128)
+def _load_lines(file_path: str, mtime: float) -> Tuple[bytes, ...]:
+    """以二进制读取文件的所有行，mtime作为缓存键的一部分，文件修改后自动失效"""
+    with open(file_path, 'rb') as file:
+        return tuple(file)
+
+def _decode_source(data: bytes) -> str:
+    """把读取的字节解码为文本，换行与文本模式读取的结果一致"""
+    text = data.decode('utf-8', errors='ignore')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+def _collect_function_lines(lines) -> str:
+    """从函数定义行开始收集各行（字节），直到花括号平衡，只解码收集到的部分"""
+    result = []
+    brace_count = 0
+    found_opening_brace = False
+    
+    for line in lines:
+        result.append(line)
+        
+        # 计算花括号数量，确定函数体的范围（花括号是ASCII字符，可直接在字节上计数）
+        opens = line.count(b'{')
+        brace_count += opens - line.count(b'}')
+        found_opening_brace |= opens > 0
+        
+        # 如果找到了函数的结束花括号，就返回结果
+        if found_opening_brace and brace_count == 0:
+            break
+    
+    return _decode_source(b"".join(result))
+
 def get_function_body(file_path, line_number):
     """
     从文件中提取函数体
     
+    文件以二进制读取，只有最终返回的函数体才解码为文本。
+    
     Args:
         file_path: 文件路径
         line_number: 函数开始的行号
@@ -319,41 +777,97 @@ def get_function_body(file_path, line_number):
         return f"文件未找到: {file_path}"
     
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            lines = file.readlines()
-            
-        if line_number <= 0:
-            # 如果没有准确的行号，尝试搜索整个文件
-            return "".join(lines)
-            
-        # 从行号开始，找到函数的完整定义
-        result = []
-        brace_count = 0
-        found_opening_brace = False
+        stat = os.stat(file_path)
+        if stat.st_size <= CACHED_FILE_MAX_SIZE:
+            lines = _load_lines(file_path, stat.st_mtime)
+            if line_number <= 0:
+                # 如果没有准确的行号，尝试搜索整个文件
+                return _decode_source(b"".join(lines))
+            return _collect_function_lines(lines[line_number - 1:line_number + 100])
         
-        for i in range(line_number - 1, min(line_number + 100, len(lines))):
-            if i < 0 or i >= len(lines):
-                continue
-                
-            line = lines[i]
-            result.append(line)
+        with open(file_path, 'rb') as file:
+            if line_number <= 0:
+                # 如果没有准确的行号，尝试搜索整个文件
+                return _decode_source(file.read())
             
-            # 计算花括号数量，确定函数体的范围
-            for char in line:
-                if char == '{':
-                    found_opening_brace = True
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-            
-            # 如果找到了函数的结束花括号，就返回结果
-            if found_opening_brace and brace_count == 0:
-                break
-                
-        return "".join(result)
+            # 大文件做内存映射，只有函数前的换行查找和函数所在的窗口会被读入
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start = 0
+                for _ in range(line_number - 1):
+                    start = mapped.find(b'\n', start) + 1
+                    if start == 0:
+                        return ""
+                mapped.seek(start)
+                # 从行号开始，找到函数的完整定义
+                return _collect_function_lines(itertools.islice(iter(mapped.readline, b''), 101))
     except Exception as e:
         return f"提取函数体时出错: {e}"
 
+# 相关函数只需要名称和文件路径
+RelatedFn = namedtuple("RelatedFn", "name file_path")
+
+# 函数关系的显示顺序：(关系类型, 标题, 没有相关函数时的提示；None表示不显示该节)
+RELATED_SECTIONS = (
+    ("callers", "调用此函数的函数", "无调用此函数的函数"),
+    ("callees", "此函数调用的函数", "此函数未调用其他函数"),
+    ("specializes", "此函数特化自", None),
+    ("specialized_by", "此模板函数的特化版本", None),
+    ("overrides", "此函数覆盖的基类方法", None),
+    ("overridden_by", "覆盖此函数的派生类方法", None),
+)
+
+# 调用链分支：安装了APOC时深度作为$depth参数传入，查询文本固定；
+# 否则深度只能写在可变长度模式中（Neo4j按查询文本缓存执行计划）
+_CALL_CHAIN_APOC_BRANCHES = {
+    "callers": "WITH f CALL apoc.path.subgraphNodes(f, {relationshipFilter: '<CALLS', labelFilter: '+Function', "
+               "minLevel: 1, maxLevel: $depth}) YIELD node RETURN 'callers' AS kind, node AS n",
+    "callees": "WITH f CALL apoc.path.subgraphNodes(f, {relationshipFilter: 'CALLS>', labelFilter: '+Function', "
+               "minLevel: 1, maxLevel: $depth}) YIELD node RETURN 'callees' AS kind, node AS n",
+}
+_CALL_CHAIN_PATTERN_BRANCHES = {
+    "callers": "WITH f MATCH (n:Function)-[:CALLS*1..{depth}]->(f) RETURN 'callers' AS kind, n",
+    "callees": "WITH f MATCH (f)-[:CALLS*1..{depth}]->(n:Function) RETURN 'callees' AS kind, n",
+}
+_TEMPLATE_AND_OVERRIDE_BRANCHES = [
+    # 此函数特化的模板
+    "WITH f MATCH (f)-[:SPECIALIZES]->(n:Function) RETURN 'specializes' AS kind, n",
+    # 特化此模板的函数
+    "WITH f MATCH (n:Function)-[:SPECIALIZES]->(f) RETURN 'specialized_by' AS kind, n",
+    # 此函数覆盖的基类方法
+    "WITH f MATCH (f)-[:OVERRIDES]->(n:Function) RETURN 'overrides' AS kind, n",
+    # 覆盖此函数的派生类方法
+    "WITH f MATCH (n:Function)-[:OVERRIDES]->(f) RETURN 'overridden_by' AS kind, n",
+]
+
+def has_apoc(neo4j_service) -> bool:
+    """检查数据库是否安装了APOC插件，每个Neo4jService实例只检查一次"""
+    if getattr(neo4j_service, "apoc_available", None) is None:
+        try:
+            with neo4j_service.driver.session() as session:
+                session.run("RETURN apoc.version()").consume()
+            neo4j_service.apoc_available = True
+        except Exception:
+            neo4j_service.apoc_available = False
+    return neo4j_service.apoc_available
+
+@functools.lru_cache(maxsize=32)
+def _related_functions_query(direction: str, use_apoc: bool, depth: int) -> str:
+    """生成相关函数查询；使用APOC时与深度无关，否则每个深度生成一次"""
+    branches = []
+    for kind in ("callers", "callees"):
+        if direction in [kind, "both"]:
+            if use_apoc:
+                branches.append(_CALL_CHAIN_APOC_BRANCHES[kind])
+            else:
+                branches.append(_CALL_CHAIN_PATTERN_BRANCHES[kind].format(depth=depth))
+    branches.extend(_TEMPLATE_AND_OVERRIDE_BRANCHES)
+    return (
+        "MATCH (f:Function {name: $name, project: $project}) "
+        "CALL { " + " UNION ALL ".join(branches) + " } "
+        "WITH kind, collect(DISTINCT n) AS nodes "
+        "RETURN kind, [n IN nodes | [n.name, n.file_path]] AS nodes"
+    )
+
 def find_related_functions(neo4j_service, function_name, project_name, direction="both", depth=1):
     """
     寻找与指定函数相关的函数（调用者和被调用者）
@@ -366,59 +880,85 @@ def find_related_functions(neo4j_service, function_name, project_name, direction
         depth: 遍历深度
         
     Returns:
-        相关函数的字典，按关系类型分组
+        相关函数（RelatedFn）列表的字典，按关系类型分组
     """
     related = {"callers": [], "callees": [], "specializes": [], "specialized_by": [], "overrides": [], "overridden_by": []}
     
-    if direction in ["callers", "both"]:
-        callers = neo4j_service.find_callers(function_name, project_name, depth)
-        related["callers"] = [{"name": f.get("name", ""), "file_path": f.get("file_path", "")} for f in callers]
-    
-    if direction in ["callees", "both"]:
-        callees = neo4j_service.find_callees(function_name, project_name, depth)
-        related["callees"] = [{"name": f.get("name", ""), "file_path": f.get("file_path", "")} for f in callees]
+    # 所有关系在一次查询中取回，用kind列区分
+    cypher = _related_functions_query(direction, has_apoc(neo4j_service), int(depth))
     
-    # 查找模板特化关系
     with neo4j_service.driver.session() as session:
-        # 找出此函数特化的模板
-        specializes = session.run("""
-        MATCH (f:Function {name: $name, project: $project})-[:SPECIALIZES]->(template:Function)
-        RETURN template
-        """, name=function_name, project=project_name)
-        related["specializes"] = [dict(record["template"]) for record in specializes]
-        
-        # 找出特化此模板的函数
-        if related["specializes"]:
-            # 如果这个函数特化了某个模板，它自身就不是模板
-            pass
-        else:
-            # 检查是否有特化此函数的其他函数
-            specialized_by = session.run("""
-            MATCH (spec:Function)-[:SPECIALIZES]->(f:Function {name: $name, project: $project})
-            RETURN spec
-            """, name=function_name, project=project_name)
-            related["specialized_by"] = [dict(record["spec"]) for record in specialized_by]
+        for record in session.run(cypher, name=function_name, project=project_name, depth=int(depth)):
+            related[record["kind"]] = [RelatedFn(name or "", file_path or "") for name, file_path in record["nodes"]]
+    
+    # 如果这个函数特化了某个模板，它自身就不是模板
+    if related["specializes"]:
+        related["specialized_by"] = []
+    
+    return related
+
+# 函数全文索引名称
+FULLTEXT_INDEX_NAME = "funcSearchIdx"
+# Lucene查询语法中需要转义的字符
+LUCENE_SPECIAL_PATTERN = re.compile(r'([+\-!(){}\[\]^"~*?:\\/&|])')
+
+# Function节点上的索引：project+name复合索引用于精确查找和调用链遍历的起点，
+# 全文索引用于semantic_search
+FUNCTION_INDEX_STATEMENTS = [
+    "CREATE INDEX func_proj_name IF NOT EXISTS FOR (f:Function) ON (f.project, f.name)",
+    "CREATE INDEX func_file IF NOT EXISTS FOR (f:Function) ON (f.file_path)",
+    "CREATE INDEX func_namespace IF NOT EXISTS FOR (f:Function) ON (f.namespace)",
+]
+FULLTEXT_INDEX_STATEMENT = (
+    f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} IF NOT EXISTS "
+    "FOR (f:Function) ON EACH [f.name, f.signature, f.namespace]"
+)
+
+def ensure_indexes(neo4j_service) -> bool:
+    """
+    确保Function节点上的索引存在，每个Neo4jService实例只执行一次
+    
+    Args:
+        neo4j_service: Neo4j服务实例
         
-        # 找出此函数覆盖的基类方法
-        overrides = session.run("""
-        MATCH (f:Function {name: $name, project: $project})-[:OVERRIDES]->(base:Function)
-        RETURN base
-        """, name=function_name, project=project_name)
-        related["overrides"] = [dict(record["base"]) for record in overrides]
+    Returns:
+        全文索引是否可用
+    """
+    if getattr(neo4j_service, "indexes_checked", False):
+        return neo4j_service.fulltext_index_ready
+    
+    neo4j_service.indexes_checked = True
+    neo4j_service.fulltext_index_ready = False
+    with neo4j_service.driver.session() as session:
+        for statement in FUNCTION_INDEX_STATEMENTS:
+            try:
+                session.run(statement).consume()
+            except Exception as e:
+                print(f"无法创建索引: {e}")
         
-        # 找出覆盖此函数的派生类方法
-        overridden_by = session.run("""
-        MATCH (derived:Function)-[:OVERRIDES]->(f:Function {name: $name, project: $project})
-        RETURN derived
-        """, name=function_name, project=project_name)
-        related["overridden_by"] = [dict(record["derived"]) for record in overridden_by]
+        try:
+            session.run(FULLTEXT_INDEX_STATEMENT).consume()
+            neo4j_service.fulltext_index_ready = True
+        except Exception as e:
+            print(f"无法创建全文索引: {e}")
     
-    return related
+    return neo4j_service.fulltext_index_ready
+
+def build_fulltext_query(keywords: List[str]) -> str:
+    """将关键词构建为Lucene查询（词项或前缀匹配，默认OR连接）"""
+    terms = []
+    for kw in keywords:
+        kw = LUCENE_SPECIAL_PATTERN.sub(r'\\\1', kw.strip())
+        if kw:
+            terms.append(f"{kw} {kw}*")
+    return " ".join(terms)
 
 def semantic_search(neo4j_service, description, project_name, language="zh", limit=10):
     """
     语义搜索函数
     
+    优先使用全文索引检索并按得分排序；索引不可用时退回到CONTAINS匹配。
+    
     Args:
         neo4j_service: Neo4j服务实例
         description: 查询描述
@@ -434,34 +974,64 @@ def semantic_search(neo4j_service, description, project_name, language="zh", lim
     
     # 提取关键词
     if language == "zh":
-        keywords = jieba.analyse.extract_tags(enhanced_query, topK=5)
+        keywords = list(extract_keywords(enhanced_query, 5))
     else:
         # 简单英文分词
         keywords = [w.strip().lower() for w in enhanced_query.split() if len(w.strip()) > 2]
     
-    # 构建查询条件
-    keyword_conditions = []
-    for kw in keywords:
-        keyword_conditions.append(f"f.name CONTAINS '{kw}'")
-        keyword_conditions.append(f"f.signature CONTAINS '{kw}'")
-    
-    keyword_query = " OR ".join(keyword_conditions)
+    fulltext_query = build_fulltext_query(keywords)
+    if fulltext_query and ensure_indexes(neo4j_service):
+        try:
+            with neo4j_service.driver.session() as session:
+                results = session.run(
+                    """
+                    CALL db.index.fulltext.queryNodes($index, $query) YIELD node, score
+                    WHERE node.project = $project
+                    RETURN node AS f, score,
+                           coalesce(node.body, [(node)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body
+                    ORDER BY score DESC
+                    LIMIT $limit
+                    """,
+                    index=FULLTEXT_INDEX_NAME, query=fulltext_query, project=project_name, limit=limit
+                )
+                return [dict(record["f"], relevance=record["score"], body=record["body"]) for record in results]
+        except Exception as e:
+            print(f"全文索引查询失败，使用CONTAINS匹配: {e}")
     
     # 执行查询
     with neo4j_service.driver.session() as session:
-        cypher = f"""
+        cypher = """
         MATCH (f:Function)
-        WHERE f.project = $project AND ({keyword_query})
+        WHERE f.project = $project
+          AND ANY(kw IN $keywords WHERE f.name CONTAINS kw OR f.signature CONTAINS kw)
         WITH f, size((f)--()) as connections
-        RETURN f, connections
+        RETURN f, connections, coalesce(f.body, [(f)-[:HAS_CONTENT]->(tc:TextContent) | tc.content][0]) AS body
         ORDER BY connections DESC
-        LIMIT {limit}
+        LIMIT $limit
         """
         
-        results = session.run(cypher, project=project_name)
-        return [dict(record["f"], relevance=record["connections"]) for record in results]
+        results = session.run(cypher, project=project_name, keywords=keywords, limit=limit)
+        return [dict(record["f"], relevance=record["connections"], body=record["body"]) for record in results]
+
+# 进程内共享的Neo4jService，按(uri, 用户名)区分，进程退出时关闭
+_neo4j_services = {}
 
-def analyze_call_chain(description, project_name, neo4j_uri, neo4j_user, neo4j_password, language="zh"):
+def get_neo4j_service(neo4j_uri, neo4j_user, neo4j_password):
+    """获取进程内共享的Neo4jService，避免每次查询都重新建立连接"""
+    key = (neo4j_uri, neo4j_user)
+    if key not in _neo4j_services:
+        _neo4j_services[key] = Neo4jService(neo4j_uri, neo4j_user, neo4j_password)
+    return _neo4j_services[key]
+
+@atexit.register
+def close_neo4j_services():
+    """关闭所有共享的Neo4j连接"""
+    while _neo4j_services:
+        _, service = _neo4j_services.popitem()
+        service.close()
+
+def analyze_call_chain(description, project_name, neo4j_uri, neo4j_user, neo4j_password, language="zh",
+                       use_cache=True, cypher_query=None, interactive=True):
     """
     基于描述分析函数调用链
     
@@ -472,20 +1042,27 @@ def analyze_call_chain(description, project_name, neo4j_uri, neo4j_user, neo4j_p
         neo4j_user: Neo4j用户名
         neo4j_password: Neo4j密码
         language: 查询语言，'zh'为中文，'en'为英文
+        use_cache: 是否使用Cypher缓存
+        cypher_query: 预先生成的查询（如批量生成的结果），为None时根据描述生成
+        interactive: 语义搜索有多个结果时是否询问用户选择，否则选择第一个
     """
-    # 连接到Neo4j
-    neo4j_service = Neo4jService(neo4j_uri, neo4j_user, neo4j_password)
+    # 连接到Neo4j（复用进程内的连接）
+    neo4j_service = get_neo4j_service(neo4j_uri, neo4j_user, neo4j_password)
+    ensure_indexes(neo4j_service)
     
     # 1. 生成并执行查询
-    cypher_query = generate_query_from_description(description, project_name, language)
+    if cypher_query is None:
+        cypher_query = generate_query_from_description(description, project_name, language, use_cache)
+    cypher_query = ensure_limit(cypher_query)
     print(f"执行查询: {cypher_query}")
     
     # 2. 先尝试LLM生成的查询
     with neo4j_service.driver.session() as session:
-        result = session.run(cypher_query)
-        records = list(result)
+        result = session.run(cypher_query, build_query_parameters(description, project_name, language))
+        # 只使用第一条记录，不把整个结果集读入内存
+        record = next(iter(result), None)
         
-        if not records:
+        if record is None:
             print("未找到匹配函数，尝试语义搜索...")
             # 3. 如果未找到结果，尝试语义搜索
             semantic_results = semantic_search(neo4j_service, description, project_name, language)
@@ -499,7 +1076,7 @@ def analyze_call_chain(description, project_name, neo4j_uri, neo4j_user, neo4j_p
                     if func.get('signature'):
                         print(f"   签名: {func['signature']}")
                 
-                if len(semantic_results) > 1:
+                if len(semantic_results) > 1 and interactive:
                     selected = input("请选择要分析的函数编号 (直接回车选择第一个): ")
                     if selected.strip() and selected.isdigit() and 1 <= int(selected) <= len(semantic_results):
                         func = semantic_results[int(selected) - 1]
@@ -510,8 +1087,10 @@ def analyze_call_chain(description, project_name, neo4j_uri, neo4j_user, neo4j_p
             else:
                 print("语义搜索也未找到结果。")
                 return
+            stored_body = func.get("body")
         else:
-            func = records[0]["f"]
+            func = record["f"]
+            stored_body = record.get("body") or func.get("body")
             print(f"找到函数: {func['name']}")
             if func.get('file_path'):
                 print(f"文件: {func['file_path']}, 行号: {func.get('line_number', 0)}")
@@ -525,89 +1104,217 @@ def analyze_call_chain(description, project_name, neo4j_uri, neo4j_user, neo4j_p
         print("特性: 模板函数")
     
     # 4. 分析函数关系
+    # 关系查询和读取源文件互不依赖，并发执行
     function_name = func["name"]
-    print("\n函数关系分析:")
-    related = find_related_functions(neo4j_service, function_name, project_name, "both", 1)
-    
-    # 显示调用关系
-    if related["callers"]:
-        print("\n调用此函数的函数:")
-        for caller in related["callers"]:
-            print(f"  - {caller['name']} ({caller.get('file_path', '')})")
-    else:
-        print("\n无调用此函数的函数")
-        
-    if related["callees"]:
-        print("\n此函数调用的函数:")
-        for callee in related["callees"]:
-            print(f"  - {callee['name']} ({callee.get('file_path', '')})")
-    else:
-        print("\n此函数未调用其他函数")
+    has_location = bool(func.get("file_path") and func.get("line_number"))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        related_future = executor.submit(find_related_functions, neo4j_service, function_name, project_name, "both", 1)
+        if has_location:
+            body_future = executor.submit(get_function_body, func["file_path"], func["line_number"])
+        related = related_future.result()
     
-    # 显示模板和继承关系
-    if related["specializes"]:
-        print("\n此函数特化自:")
-        for template in related["specializes"]:
-            print(f"  - {template['name']} ({template.get('file_path', '')})")
-    
-    if related["specialized_by"]:
-        print("\n此模板函数的特化版本:")
-        for spec in related["specialized_by"]:
-            print(f"  - {spec['name']} ({spec.get('file_path', '')})")
-    
-    if related["overrides"]:
-        print("\n此函数覆盖的基类方法:")
-        for base in related["overrides"]:
-            print(f"  - {base['name']} ({base.get('file_path', '')})")
+    print("\n函数关系分析:")
     
-    if related["overridden_by"]:
-        print("\n覆盖此函数的派生类方法:")
-        for derived in related["overridden_by"]:
-            print(f"  - {derived['name']} ({derived.get('file_path', '')})")
+    for kind, title, empty_message in RELATED_SECTIONS:
+        if related[kind]:
+            print(f"\n{title}:")
+            for related_fn in related[kind]:
+                print(f"  - {related_fn.name} ({related_fn.file_path})")
+        elif empty_message:
+            print(f"\n{empty_message}")
     
     # 5. 获取并显示函数体
     print("\n函数体:")
-    if func.get("file_path") and func.get("line_number"):
-        body = get_function_body(func["file_path"], func["line_number"])
-        # 查看是否有存储在数据库中的函数体
-        func_details = neo4j_service.find_function(function_name, project_name)
-        if func_details and "body" in func_details and func_details["body"]:
-            db_body = func_details["body"]
-            if len(db_body) > len(body):
-                body = db_body
+    if has_location:
+        body = body_future.result()
+        # 查看是否有存储在数据库中的函数体（已随匹配查询一起返回）
+        if stored_body and len(stored_body) > len(body):
+            body = stored_body
                 
         print(body)
     else:
         print("无法获取函数体 - 缺少文件路径或行号信息")
+
+
+def serve(socket_path, neo4j_uri, neo4j_user, neo4j_password):
+    """
+    守护进程模式：保持Neo4j连接，通过Unix套接字接收查询
+    
+    每个连接发送一行JSON请求 {"description", "project", "language", "use_cache",
+    "neo4j_uri", "neo4j_user", "neo4j_password_sha256"}，返回一行JSON {"output": 分析输出}。
+    请求按顺序处理。请求的数据库或凭据与守护进程的不同时返回 {"mismatch": true}，
+    由客户端自己查询。语义搜索有多个结果时不询问用户，直接使用第一个。
+    套接字只允许当前用户访问；已有守护进程在同一路径上运行时拒绝启动。
+    
+    Args:
+        socket_path: Unix套接字路径
+        neo4j_uri: Neo4j数据库URI
+        neo4j_user: Neo4j用户名
+        neo4j_password: Neo4j密码
+    """
+    # 预先建立连接并创建索引
+    ensure_indexes(get_neo4j_service(neo4j_uri, neo4j_user, neo4j_password))
+    
+    if os.path.exists(socket_path):
+        # 只清理没有进程监听的残留套接字，不抢占正在运行的守护进程
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)
+            else:
+                print(f"守护进程已在 {socket_path} 上运行，拒绝启动")
+                return
     
-    # 关闭Neo4j连接
-    neo4j_service.close()
+    password_digest = _password_digest(neo4j_password)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # 创建时即为0600，避免bind与chmod之间被其他用户连接
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    os.chmod(socket_path, 0o600)
+    server.listen()
+    print(f"守护进程已启动，监听 {socket_path}")
+    
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile('rwb') as stream:
+                try:
+                    request = json.loads(stream.readline())
+                    if ((request.get("neo4j_uri"), request.get("neo4j_user")) != (neo4j_uri, neo4j_user)
+                            or not hmac.compare_digest(str(request.get("neo4j_password_sha256", "")),
+                                                       password_digest)):
+                        response = {"mismatch": True}
+                    else:
+                        output = io.StringIO()
+                        with contextlib.redirect_stdout(output):
+                            analyze_call_chain(
+                                request["description"],
+                                request.get("project", "default"),
+                                neo4j_uri,
+                                neo4j_user,
+                                neo4j_password,
+                                request.get("language", "zh"),
+                                request.get("use_cache", True),
+                                interactive=False
+                            )
+                        response = {"output": output.getvalue()}
+                except Exception as e:
+                    response = {"error": str(e)}
+                stream.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                stream.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
 
+def _password_digest(password) -> str:
+    """守护进程请求中代替明文密码比较凭据的SHA-256摘要"""
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+def query_daemon(socket_path, request) -> Optional[str]:
+    """
+    将查询发送给守护进程
+    
+    Returns:
+        分析输出，守护进程未运行或连接的是其他数据库时返回None
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            with client.makefile('rwb') as stream:
+                stream.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+                stream.flush()
+                response = json.loads(stream.readline())
+    except (OSError, ValueError):
+        return None
+    
+    if response.get("mismatch"):
+        return None
+    if "error" in response:
+        return f"守护进程查询出错: {response['error']}"
+    return response["output"]
 
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="使用自然语言描述查询代码")
-    parser.add_argument("description", help="函数功能描述")
+    parser.add_argument("description", nargs="?", help="函数功能描述")
+    parser.add_argument("--descriptions-file", help="批量查询：每行一个函数功能描述，合并为一次LLM调用生成查询")
     parser.add_argument("--project", default="default", help="项目名称")
     parser.add_argument("--neo4j-uri", default="bolt://localhost:7688", help="Neo4j URI")
     parser.add_argument("--neo4j-user", default="neo4j", help="Neo4j用户名")
     parser.add_argument("--neo4j-password", default="password", help="Neo4j密码")
     parser.add_argument("--language", choices=["zh", "en"], default="zh", help="查询语言 (zh: 中文, en: 英文)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用Cypher缓存，总是调用LLM生成查询")
+    parser.add_argument("--serve", action="store_true", help="以守护进程模式运行，保持数据库连接并通过Unix套接字接收查询")
+    parser.add_argument("--socket", default=DAEMON_SOCKET_PATH,
+                        help="守护进程的Unix套接字路径（默认$XDG_RUNTIME_DIR/qbd.sock或临时目录下的qbd-<uid>.sock）")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="不尝试连接守护进程，直接在当前进程中查询。守护进程处理查询时，"
+                             "语义搜索有多个结果不会询问选择而是使用第一个；需要交互选择时使用此选项")
     
     args = parser.parse_args()
     
+    if not args.serve and not args.description and not args.descriptions_file:
+        parser.error("需要提供函数功能描述或--descriptions-file")
+    
     # 使用环境变量覆盖默认值
     neo4j_uri = os.getenv("NEO4J_URI", args.neo4j_uri)
     neo4j_user = os.getenv("NEO4J_USER", args.neo4j_user)
     neo4j_password = os.getenv("NEO4J_PASSWORD", args.neo4j_password)
     
+    if args.serve:
+        serve(args.socket, neo4j_uri, neo4j_user, neo4j_password)
+        return
+    
+    if args.descriptions_file:
+        with open(args.descriptions_file, 'r', encoding='utf-8') as f:
+            descriptions = [line.strip() for line in f if line.strip()]
+        
+        queries = generate_queries_batch(descriptions, args.project, args.language, not args.no_cache)
+        for description, cypher_query in zip(descriptions, queries):
+            print(f"\n===== {description} =====")
+            analyze_call_chain(
+                description,
+                args.project,
+                neo4j_uri,
+                neo4j_user,
+                neo4j_password,
+                args.language,
+                not args.no_cache,
+                cypher_query
+            )
+        return
+    
+    # 优先交给已运行的守护进程处理
+    if not args.no_daemon:
+        output = query_daemon(args.socket, {
+            "description": args.description,
+            "project": args.project,
+            "language": args.language,
+            "use_cache": not args.no_cache,
+            "neo4j_uri": neo4j_uri,
+            "neo4j_user": neo4j_user,
+            "neo4j_password_sha256": _password_digest(neo4j_password)
+        })
+        if output is not None:
+            print(output, end="")
+            return
+    
     analyze_call_chain(
         args.description,
         args.project,
         neo4j_uri,
         neo4j_user,
         neo4j_password,
-        args.language
+        args.language,
+        not args.no_cache
     )
 
 
@@ -6,10 +6,7 @@ import sys
 import argparse
 from typing import List, Optional
 
-from src.services.clang_analyzer_service import ClangAnalyzerService
-from src.services.search_service import SearchService
-from src.services.neo4j_service import Neo4jService
-from src.config.settings import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+from src.config.settings import SEMANTIC_CACHE_THRESHOLD
 
 
 def parse_args():
@@ -25,10 +22,18 @@ def parse_args():
     index_parser.add_argument("--use-clang", action="store_true", help="Use Clang analyzer instead of cflow")
     index_parser.add_argument("--include-dirs", nargs="+", help="Include directories for Clang analysis")
     index_parser.add_argument("--compiler-args", nargs="+", help="Additional compiler arguments for Clang")
-    index_parser.add_argument("--parallel", action="store_true", help="Use parallel processing for directory analysis")
-    index_parser.add_argument("--workers", type=int, default=4, help="Number of worker processes for parallel analysis")
+    index_parser.add_argument("--parallel", action="store_true",
+                              help="Deprecated: directory analysis is always parallel, use --workers 1 to disable")
+    index_parser.add_argument("--workers", type=int, default=4,
+                              help="Number of worker processes for directory analysis (1 analyzes serially)")
     index_parser.add_argument("--incremental", action="store_true", help="Use incremental indexing for changed files only")
     index_parser.add_argument("--changed-files", nargs="+", help="List of changed files for incremental indexing")
+    index_parser.add_argument("--batch-size", type=int, default=1000,
+                              help="Number of nodes or relationships written per Neo4j transaction "
+                                   "(with --streaming)")
+    index_parser.add_argument("--streaming", action="store_true",
+                              help="Stream a directory's call graph through an on-disk shard to bound memory "
+                                   "(stores names, locations and calls only)")
     
     # Search command
     search_parser = subparsers.add_parser("search", help="Search for functions in Neo4j")
@@ -51,6 +56,9 @@ def parse_args():
                               help="Query language (auto, zh: Chinese, en: English)")
     nl_query_parser.add_argument("--limit", type=int, default=10, help="Maximum number of results to return")
     nl_query_parser.add_argument("--verbose", "-v", action="store_true", help="Show detailed match information")
+    nl_query_parser.add_argument("--no-cache", action="store_true", help="Do not use the semantic query cache")
+    nl_query_parser.add_argument("--cache-threshold", type=float, default=SEMANTIC_CACHE_THRESHOLD,
+                              help="Minimum similarity for reusing cached results of a similar query")
     
     # Embedding index command
     embedding_index_parser = subparsers.add_parser("embedding-index", help="Build embedding-based code index")
@@ -59,10 +67,27 @@ def parse_args():
     embedding_search_parser = subparsers.add_parser("embedding-search", help="Semantic search in code index")
     embedding_search_parser.add_argument("--project-dir", required=True, help="Project directory to search")
     embedding_search_parser.add_argument("--query", required=True, help="Query text")
+    embedding_search_parser.add_argument("--ef-search", type=int, default=64,
+                                         help="HNSW search breadth; higher improves recall at the cost of latency")
+    embedding_search_parser.add_argument("--no-cache", action="store_true", help="Do not use the semantic query cache")
+    embedding_search_parser.add_argument("--cache-threshold", type=float, default=SEMANTIC_CACHE_THRESHOLD,
+                                         help="Minimum similarity for reusing cached results of a similar query")
     
     return parser.parse_args()
 
 
+def _connect_neo4j():
+    """
+    Get the shared Neo4j service.
+    
+    The Neo4j driver is only imported here, so commands that do not use the
+    database (and --help) start without loading it.
+    """
+    from src.services.neo4j_pool import get_neo4j_service
+    from src.config.settings import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+    return get_neo4j_service(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+
+
 def main():
     """Main entry point."""
     args = parse_args()
@@ -71,37 +96,57 @@ def main():
         print("Error: No command specified. Use --help for usage information.")
         sys.exit(1)
     
-    neo4j_service = Neo4jService(
-        uri=NEO4J_URI,
-        username=NEO4J_USER,
-        password=NEO4J_PASSWORD
-    )
-    
     if args.command == "index":
         if args.use_clang:
             # Use Clang analyzer
+            from src.services.clang_analyzer_service import ClangAnalyzerService
+            from src.services.neo4j_pool import ensure_function_indexes
+            from src.services.semantic_cache import invalidate_project_queries
+            neo4j_service = _connect_neo4j()
             analyzer = ClangAnalyzerService()
             include_dirs = args.include_dirs if args.include_dirs else []
             compiler_args = args.compiler_args if args.compiler_args else []
             
+            if os.path.isdir(args.path) and args.streaming and not args.incremental:
+                import tempfile
+                from src.services.call_graph_shard import index_call_graph_shard
+                with tempfile.TemporaryDirectory() as shard_dir:
+                    counts = analyzer.analyze_directory_to_shard(
+                        args.path,
+                        shard_dir,
+                        include_dirs=include_dirs,
+                        compiler_args=compiler_args,
+                        max_workers=args.workers
+                    )
+                    print(f"Wrote {counts['nodes']} functions and {counts['edges']} calls to shard")
+                    ensure_function_indexes(neo4j_service)
+                    index_call_graph_shard(neo4j_service, shard_dir, args.project, args.clear,
+                                           batch_size=args.batch_size)
+                invalidate_project_queries(args.project)
+                return
+            
             if os.path.isdir(args.path):
                 call_graph = analyzer.analyze_directory(
                     args.path, 
                     include_dirs=include_dirs, 
                     compiler_args=compiler_args,
-                    use_parallel=args.parallel,
                     max_workers=args.workers
                 )
             else:
                 call_graph = analyzer.analyze_file(args.path, include_dirs=include_dirs, compiler_args=compiler_args)
                 
+            # Make MERGE on Function nodes use index seeks before writing
+            ensure_function_indexes(neo4j_service)
             if args.incremental and args.changed_files:
                 neo4j_service.incremental_index(call_graph, args.project, args.changed_files)
             else:
                 neo4j_service.index_clang_callgraph(call_graph, args.project, args.clear)
+            # Cached query results describe the previous index of the project
+            invalidate_project_queries(args.project)
     
     elif args.command == "search":
-        search_service = SearchService(neo4j_service)
+        from src.services.search_service import SearchService
+        search_service = SearchService(_connect_neo4j())
         results = search_service.search_functions(args.query, args.project)
         
         if not results:
@@ -112,7 +157,8 @@ def main():
                 print(f"  - {func}")
     
     elif args.command == "neighbors":
-        search_service = SearchService(neo4j_service)
+        from src.services.search_service import SearchService
+        search_service = SearchService(_connect_neo4j())
         
         if args.direction == "callers" or args.direction == "both":
             callers = search_service.find_callers(args.function, args.project, args.depth)
@@ -133,10 +179,9 @@ def main():
                     print(f"  - {callee}")
     
     elif args.command == "nlquery":
+        from src.cmd._nlquery_core import detect_language, print_results
+        
         try:
-            # Use our new natural language query implementation
-            from src.cmd.nlquery import detect_language, main as nlquery_main
-            
             # Detect language if set to auto
             language = args.language
             if language == "auto":
@@ -146,51 +191,29 @@ def main():
                 else:
                     print("Detected English query")
                 
-            # Run the natural language query
-            search_service = SearchService(neo4j_service=neo4j_service)
-            results = search_service.search_by_description(
-                description=args.description,
-                project_name=args.project,
-                limit=args.limit,
-                lang=language
-            )
+            # Run the natural language query, reusing cached results of similar queries
+            from src.services.semantic_cache import SemanticCache, nlquery_namespace
+            cache = None if args.no_cache else SemanticCache(threshold=args.cache_threshold)
+            try:
+                cache_namespace = nlquery_namespace(args.project, language, args.limit, False)
+                results = cache.get(cache_namespace, args.description) if cache else None
+                if results is None:
+                    from src.services.search_service import SearchService
+                    search_service = SearchService(neo4j_service=_connect_neo4j())
+                    results = search_service.search_by_description(
+                        description=args.description,
+                        project_name=args.project,
+                        limit=args.limit,
+                        lang=language
+                    )
+                    if cache:
+                        cache.put(cache_namespace, args.description, results)
+            finally:
+                if cache:
+                    cache.close()
             
             # Display results
-            if not results:
-                print(f"No functions found matching '{args.description}'")
-            else:
-                print(f"Found {len(results)} matching functions:")
-                for i, result in enumerate(results, 1):
-                    print(f"\n{i}. {result['name']}")
-                    if 'file_path' in result and result['file_path']:
-                        print(f"   File: {result['file_path']}")
-                    if 'line_number' in result and result['line_number']:
-                        print(f"   Line: {result['line_number']}")
-                    
-                    # Show additional details if verbose
-                    if args.verbose:
-                        if 'signature' in result and result['signature']:
-                            print(f"   Signature: {result['signature']}")
-                        if 'is_template' in result and result['is_template']:
-                            print(f"   Template: Yes")
-                        if 'is_virtual' in result and result['is_virtual']:
-                            print(f"   Virtual: Yes")
-                        if 'class_name' in result and result['class_name']:
-                            print(f"   Class: {result['class_name']}")
-                        if 'namespace' in result and result['namespace']:
-                            print(f"   Namespace: {result['namespace']}")
-                            
-                        # Show relevance details
-                        if 'relevance' in result:
-                            print(f"   Relevance score: {result['relevance']:.2f}")
-                            
-                        # Show matched tokens
-                        if 'matched_tokens' in result:
-                            print(f"   Matched terms: {', '.join(result['matched_tokens'])}")
-        except ImportError as e:
-            print(f"Error: {e}")
-            print("Make sure the required packages are installed.")
-            sys.exit(1)
+            print_results(results, args.description, verbose=args.verbose, metaprogramming=False)
         except Exception as e:
             print(f"Error during natural language query: {e}")
             sys.exit(1)
@@ -199,13 +222,29 @@ def main():
         from src.services.embedding_index_service import EmbeddingIndexService
         service = EmbeddingIndexService(args.project_dir)
         service.build_index()
+        service.save()
         print("Embedding index built.")
 
     elif args.command == "embedding-search":
         from src.services.embedding_index_service import EmbeddingIndexService
         service = EmbeddingIndexService(args.project_dir)
-        service.build_index()
-        results = service.search(args.query)
+        service.load_or_build()
+        # Cached results are only valid for the same indexed file versions
+        from src.services.semantic_cache import SemanticCache
+        cache = None if args.no_cache else SemanticCache(threshold=args.cache_threshold)
+        cache_namespace = (f"embedding-search:{os.path.abspath(args.project_dir)}:"
+                           f"{service.fingerprint()}:{args.ef_search}")
+        try:
+            cached = cache.get(cache_namespace, args.query) if cache else None
+            if cached is not None:
+                results = [(meta, score) for meta, score in cached]
+            else:
+                results = service.search(args.query, ef_search=args.ef_search)
+                if cache:
+                    cache.put(cache_namespace, args.query, results)
+        finally:
+            if cache:
+                cache.close()
         for meta, score in results:
             print(f"{meta['file']}:{meta['start_line']}-{meta['end_line']} | {meta['name']} | Score: {score}")
             print(meta['code'])
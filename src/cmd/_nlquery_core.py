@@ -0,0 +1,235 @@
+"""
+Query analysis and result formatting for the natural language query command.
+
+Kept free of database and model dependencies so that callers which only
+need language detection or result printing (and a future compiled build)
+do not import the search stack.
+"""
+import re
+import sys
+from types import MappingProxyType
+from typing import List, Dict, Any
+
+
+# Matches any CJK unified ideograph
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+# Metaprogramming keywords that set a boolean feature property
+METAPROGRAMMING_FLAG_TERMS = MappingProxyType({
+    # Variadic templates
+    "variadic template": "has_variadic_templates",
+    "parameter pack": "has_variadic_templates",
+    "template parameter pack": "has_variadic_templates",
+    "variadic": "has_variadic_templates",
+    
+    # SFINAE
+    "sfinae": "has_sfinae", 
+    "substitution failure": "has_sfinae",
+    
+    # Template metafunctions
+    "metafunction": "is_metafunction",
+    "trait": "is_metafunction",
+    "meta function": "is_metafunction",
+    
+    # C++20 Concepts
+    "concept": "is_concept",
+    "requires": "is_concept",
+    "constraint": "is_concept",
+    
+    # Template templates
+    "template template": "has_template_template_params",
+    
+    # Specialization
+    "partial specialization": "partial_specialization",
+    "template specialization": "is_template"
+})
+
+# SFINAE keywords mapped to the technique they name; the last match wins
+SFINAE_TECHNIQUE_TERMS = MappingProxyType({
+    "enable_if": "enable_if",
+    "enable if": "enable_if",  # Match with space
+    "void_t": "void_t", 
+    "decltype": "decltype",
+    "detection idiom": "detection idiom",
+    "tag dispatch": "tag dispatch",
+})
+
+# Metafunction kind keywords, in priority order; the first match wins
+METAFUNCTION_KIND_TERMS = MappingProxyType({
+    "value trait": "value_trait",
+    "type trait": "type_trait",
+    "transform trait": "transform",
+})
+
+# Single-pass matcher for all terms. The lookahead makes matches overlap, and
+# longer terms come first so each position reports its longest matching term;
+# shorter terms matching at the same position are its prefixes, looked up below.
+_ALL_METAPROGRAMMING_TERMS = (
+    list(METAPROGRAMMING_FLAG_TERMS) + list(SFINAE_TECHNIQUE_TERMS) + list(METAFUNCTION_KIND_TERMS)
+)
+METAPROGRAMMING_PATTERN = re.compile(
+    '(?=(' + '|'.join(re.escape(term) for term in sorted(_ALL_METAPROGRAMMING_TERMS, key=len, reverse=True)) + '))'
+)
+# Characters that start some term; a query containing none of them cannot match
+METAPROGRAMMING_FIRST_CHARS = frozenset(term[0] for term in _ALL_METAPROGRAMMING_TERMS)
+METAPROGRAMMING_PREFIXES = {
+    term: [other for other in _ALL_METAPROGRAMMING_TERMS if term.startswith(other)]
+    for term in _ALL_METAPROGRAMMING_TERMS
+}
+
+
+def detect_language(query: str) -> str:
+    """
+    Detect the language of the query.
+    
+    Args:
+        query: The natural language query
+        
+    Returns:
+        Language code: 'zh' for Chinese, 'en' for English or others
+    """
+    # Check for Chinese characters
+    if CJK_PATTERN.search(query):
+        return 'zh'
+    return 'en'
+
+
+def detect_metaprogramming_features(query: str) -> Dict[str, Any]:
+    """
+    Detect template metaprogramming features from natural language query.
+    
+    Args:
+        query: The natural language query
+        
+    Returns:
+        Dictionary of detected metaprogramming features
+    """
+    features = {}
+    
+    # Find every term contained in the query in one scan
+    query_lower = query.lower()
+    if METAPROGRAMMING_FIRST_CHARS.isdisjoint(query_lower):
+        return features
+    matched = set()
+    for match in METAPROGRAMMING_PATTERN.finditer(query_lower):
+        matched.update(METAPROGRAMMING_PREFIXES[match.group(1)])
+    if not matched:
+        return features
+    
+    for term, feature in METAPROGRAMMING_FLAG_TERMS.items():
+        if term in matched:
+            features[feature] = True
+    
+    for term, technique in SFINAE_TECHNIQUE_TERMS.items():
+        if term in matched:
+            features["has_sfinae"] = True
+            features["sfinae_technique"] = technique
+    
+    for term, kind in METAFUNCTION_KIND_TERMS.items():
+        if term in matched:
+            features["is_metafunction"] = True
+            features["metafunction_kind"] = kind
+            break
+    
+    return features
+
+
+# Result fields shown for every match, as (key, label)
+RESULT_FIELDS = [
+    ('file_path', 'File'),
+    ('line_number', 'Line'),
+]
+
+# Template metaprogramming flags, as (flag key, label, detail key, detail label)
+METAPROGRAMMING_FIELDS = [
+    ('is_template', 'Template', 'template_params', 'Template Parameters'),
+    ('has_variadic_templates', 'Variadic Template', 'variadic_template_param', 'Parameter Pack'),
+    ('is_metafunction', 'Metafunction', 'metafunction_kind', 'Metafunction Kind'),
+    ('has_sfinae', 'SFINAE', 'sfinae_techniques', 'SFINAE Techniques'),
+    ('is_concept', 'Concept', 'concept_requirements', 'Concept Requirements'),
+]
+
+# Result fields shown in verbose mode, as (key, label)
+VERBOSE_FIELDS = [
+    ('signature', 'Signature'),
+    ('is_template', 'Template'),
+    ('is_virtual', 'Virtual'),
+    ('class_name', 'Class'),
+    ('namespace', 'Namespace'),
+]
+
+# Verbose fields when metaprogramming details are shown, which already include Template
+_VERBOSE_FIELDS_AFTER_METAPROGRAMMING = [field for field in VERBOSE_FIELDS if field[0] != 'is_template']
+
+# Number of formatted results written to stdout at once
+RESULTS_PER_WRITE = 64
+
+
+def _display_value(value: Any) -> str:
+    """Format a result property for display."""
+    if value is True:
+        return "Yes"
+    if isinstance(value, (list, tuple)):
+        return ', '.join(value)
+    return str(value)
+
+
+def format_result(index: int, result: Dict[str, Any], verbose: bool = False,
+                  metaprogramming: bool = True) -> str:
+    """
+    Format one search result for display.
+    
+    Args:
+        index: 1-based position of the result
+        result: Function data returned by the search
+        verbose: Whether to include signature, scope and relevance details
+        metaprogramming: Whether to include template metaprogramming details
+        
+    Returns:
+        The formatted result, one property per line
+    """
+    lines = [f"\n{index}. {result['name']}"]
+    lines.extend(f"   {label}: {_display_value(result[key])}"
+                 for key, label in RESULT_FIELDS if result.get(key))
+    
+    if metaprogramming:
+        for flag, label, detail_key, detail_label in METAPROGRAMMING_FIELDS:
+            if result.get(flag):
+                lines.append(f"   {label}: Yes")
+                if result.get(detail_key):
+                    lines.append(f"   {detail_label}: {_display_value(result[detail_key])}")
+    
+    if verbose:
+        verbose_fields = _VERBOSE_FIELDS_AFTER_METAPROGRAMMING if metaprogramming else VERBOSE_FIELDS
+        lines.extend(f"   {label}: {_display_value(result[key])}"
+                     for key, label in verbose_fields if result.get(key))
+        if 'relevance' in result:
+            lines.append(f"   Relevance score: {result['relevance']:.2f}")
+        if 'matched_tokens' in result:
+            lines.append(f"   Matched terms: {', '.join(result['matched_tokens'])}")
+    
+    return "\n".join(lines)
+
+
+def print_results(results: List[Dict[str, Any]], query: str, verbose: bool = False,
+                  metaprogramming: bool = True) -> None:
+    """
+    Print search results.
+    
+    Args:
+        results: Function data returned by the search
+        query: The query the results match
+        verbose: Whether to include signature, scope and relevance details
+        metaprogramming: Whether to include template metaprogramming details
+    """
+    if not results:
+        print(f"No functions found matching '{query}'")
+        return
+    
+    print(f"Found {len(results)} matching functions:")
+    for start in range(0, len(results), RESULTS_PER_WRITE):
+        chunk = results[start:start + RESULTS_PER_WRITE]
+        sys.stdout.write("".join(
+            format_result(i, result, verbose, metaprogramming) + "\n"
+            for i, result in enumerate(chunk, start + 1)
+        ))
@@ -1,23 +1,26 @@
 import argparse
-from src.services.embedding_index_service import EmbeddingIndexService
+from src.services.embedding_index_service import EmbeddingIndexService, HNSW_EF_SEARCH
 
 def main():
     parser = argparse.ArgumentParser(description="Embedding-based code index/search")
     parser.add_argument("command", choices=["index", "search"])
     parser.add_argument("--project-dir", required=True)
     parser.add_argument("--query", help="Query text for search")
+    parser.add_argument("--ef-search", type=int, default=HNSW_EF_SEARCH,
+                        help="HNSW search breadth; higher improves recall at the cost of latency")
     args = parser.parse_args()
 
     service = EmbeddingIndexService(args.project_dir)
     if args.command == "index":
         service.build_index()
+        service.save()
         print("Index built.")
     elif args.command == "search":
         if not args.query:
             print("Please provide --query for search.")
             return
-        service.build_index()  # 简单起见，每次都重建，可优化为持久化
-        results = service.search(args.query)
+        service.load_or_build()
+        results = service.search(args.query, ef_search=args.ef_search)
         for meta, score in results:
             print(f"{meta['file']}:{meta['start_line']}-{meta['end_line']} | {meta['name']} | Score: {score}")
             print(meta['code'])
@@ -4,8 +4,18 @@ Configure libclang path for clang-based code analysis.
 import os
 import glob
 import platform
+from typing import List, Optional
 from clang.cindex import Config
 
+# Library file chosen by the first successful configure_libclang call
+_configured_path: Optional[str] = None
+
+def _glob_in(directory: str, pattern: str) -> List[str]:
+    """Glob pattern inside directory, without touching directories that don't exist."""
+    if not os.path.isdir(directory):
+        return []
+    return glob.glob(os.path.join(directory, pattern))
+
 def configure_libclang():
     """
     Configure libclang path.
@@ -14,7 +24,15 @@ def configure_libclang():
     1. User-specified paths in E:\\Program Files\\LLVM
     2. Common installation locations
     3. System PATH
+    
+    The chosen path is remembered, so later calls don't probe the file system again.
     """
+    global _configured_path
+    if _configured_path is not None:
+        if not Config.loaded:
+            Config.set_library_file(_configured_path)
+        return True
+    
     # Get system info
     is_windows = platform.system() == "Windows"
     lib_ext = ".dll" if is_windows else ".so"
@@ -37,11 +55,11 @@ def configure_libclang():
         potential_paths.append(os.path.join(llvm_path, "bin", f"libclang{lib_ext}"))
         
         # Try to find version-specific DLLs in bin directory
-        potential_paths.extend(glob.glob(os.path.join(llvm_path, "bin", f"libclang*{lib_ext}")))
+        potential_paths.extend(_glob_in(os.path.join(llvm_path, "bin"), f"libclang*{lib_ext}"))
         
         # Also check the lib directory
         potential_paths.append(os.path.join(llvm_path, "lib", f"libclang{lib_ext}"))
-        potential_paths.extend(glob.glob(os.path.join(llvm_path, "lib", f"libclang*{lib_ext}")))
+        potential_paths.extend(_glob_in(os.path.join(llvm_path, "lib"), f"libclang*{lib_ext}"))
     
     # Additional Windows-specific paths
     if is_windows:
@@ -51,12 +69,12 @@ def configure_libclang():
         
         for pf in [program_files, program_files_x86]:
             potential_paths.append(os.path.join(pf, "LLVM", "bin", "libclang.dll"))
-            potential_paths.extend(glob.glob(os.path.join(pf, "LLVM", "bin", "libclang*.dll")))
+            potential_paths.extend(_glob_in(os.path.join(pf, "LLVM", "bin"), "libclang*.dll"))
     else:
         # Unix-like paths
         for prefix in ["/usr/lib", "/usr/local/lib", "/usr/lib/llvm/lib"]:
             potential_paths.append(os.path.join(prefix, "libclang.so"))
-            potential_paths.extend(glob.glob(os.path.join(prefix, "libclang-*.so")))
+            potential_paths.extend(_glob_in(prefix, "libclang-*.so"))
     
     # Try each path in order
     for path in potential_paths:
@@ -64,6 +82,7 @@ def configure_libclang():
             try:
                 Config.set_library_file(path)
                 print(f"Configured libclang to use {path}")
+                _configured_path = path
                 return True
             except Exception as e:
                 print(f"Could not use {path}: {e}")
@@ -78,6 +97,7 @@ def configure_libclang():
             
         Config.set_library_file(lib_name)
         print(f"Configured libclang to use {lib_name} from PATH")
+        _configured_path = lib_name
         return True
     except Exception as e:
         print(f"Warning: Could not find libclang: {e}")
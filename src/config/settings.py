@@ -25,3 +25,12 @@ NEO4J_URI: str = "bolt://localhost:7688"
 NEO4J_USER: str = "neo4j" 
 NEO4J_PASSWORD: str = "password"
 NEO4J_DEFAULT_PROJECT: str = "default"
+
+# Semantic query cache
+SEMANTIC_CACHE_PATH: str = os.path.join(OUTPUT_DIR, "query_cache.db")
+SEMANTIC_CACHE_MODEL: str = "paraphrase-multilingual-MiniLM-L12-v2"
+SEMANTIC_CACHE_THRESHOLD: float = 0.92
+SEMANTIC_CACHE_TTL: float = 7 * 24 * 3600
+
+# Parsed translation unit cache; set to None to always reparse
+CLANG_AST_CACHE_DIR: Optional[str] = os.path.join(OUTPUT_DIR, "clang_ast")
@@ -4,12 +4,14 @@ Controller for coordinating analysis operations
 import os
 import sys
 import argparse
+import functools
 from typing import List, Dict, Set, Optional, Tuple
 
 from src.models.function_model import CallGraph
 from src.services.analyzer_service import AnalyzerService
 from src.services.search_service import SearchService
 from src.services.neo4j_service import Neo4jService
+from src.services.neo4j_pool import find_call_chain
 from src.utils.file_utils import ensure_dir
 from src.config.settings import (
     DEFAULT_FILE_PATTERNS, 
@@ -22,6 +24,9 @@ from src.config.settings import (
     NEO4J_DEFAULT_PROJECT
 )
 
+# Write buffer for the analysis results file
+RESULTS_WRITE_BUFFER_SIZE = 1024 * 1024
+
 
 class AnalysisController:
     """Controller for analysis operations"""
@@ -38,8 +43,7 @@ class AnalysisController:
         
     def run(self, args: List[str] = None) -> None:
         """Run the analysis controller with command line arguments"""
-        parser = self._create_argument_parser()
-        parsed_args = parser.parse_args(args if args is not None else sys.argv[1:])
+        parsed_args = self._parser.parse_args(args if args is not None else sys.argv[1:])
         
         if parsed_args.command == "analyze":
             self._handle_analyze_command(parsed_args)
@@ -52,8 +56,13 @@ class AnalysisController:
         elif parsed_args.command == "query":
             self._handle_query_command(parsed_args)
         else:
-            parser.print_help()
+            self._parser.print_help()
     
+    @functools.cached_property
+    def _parser(self) -> argparse.ArgumentParser:
+        """Argument parser, built on first use and reused by later runs"""
+        return self._create_argument_parser()
+
     def _create_argument_parser(self) -> argparse.ArgumentParser:
         """Create the argument parser for the controller"""
         parser = argparse.ArgumentParser(description="Code analysis and function search tool")
@@ -215,6 +224,9 @@ class AnalysisController:
         # Index the call graph in Neo4j
         print(f"Indexing {len(call_graph.functions)} functions in Neo4j...")
         self.neo4j_service.index_call_graph(call_graph, args.project)
+        # Cached query results describe the previous index
+        from src.services.semantic_cache import invalidate_project_queries
+        invalidate_project_queries(None if args.clear else args.project)
         
         print(f"Indexing complete. Indexed {len(call_graph.functions)} functions in project '{args.project}'.")
     
@@ -239,7 +251,7 @@ class AnalysisController:
         
         elif args.query_type == "callers":
             # Query function callers
-            callers = self.neo4j_service.find_callers(args.name, args.project, args.depth)
+            callers = find_call_chain(self.neo4j_service, "callers", args.name, args.project, args.depth)
             if callers:
                 print(f"Functions that call '{args.name}' (depth {args.depth}):")
                 for i, caller in enumerate(callers, 1):
@@ -249,7 +261,7 @@ class AnalysisController:
         
         elif args.query_type == "callees":
             # Query function callees
-            callees = self.neo4j_service.find_callees(args.name, args.project, args.depth)
+            callees = find_call_chain(self.neo4j_service, "callees", args.name, args.project, args.depth)
             if callees:
                 print(f"Functions called by '{args.name}' (depth {args.depth}):")
                 for i, callee in enumerate(callees, 1):
@@ -274,7 +286,7 @@ class AnalysisController:
         """Save analysis results to a file"""
         ensure_dir(os.path.dirname(output_file))
         
-        with open(output_file, 'w') as f:
+        with open(output_file, 'w', buffering=RESULTS_WRITE_BUFFER_SIZE) as f:
             f.write("Analysis Results\n")
             f.write("===============\n\n")
             
@@ -283,18 +295,17 @@ class AnalysisController:
             
             f.write("Function Call Graph:\n")
             for func_name, func in call_graph.functions.items():
-                f.write(f"\n{func_name} [{func.file_path}:{func.line_number}]\n")
+                # One write per function instead of one per line
+                parts = [f"\n{func_name} [{func.file_path}:{func.line_number}]\n"]
                 if func.calls:
-                    f.write("  Calls:\n")
-                    for call in func.calls:
-                        f.write(f"    - {call}\n")
+                    parts.append("  Calls:\n")
+                    parts.extend(f"    - {call}\n" for call in func.calls)
                 if func.called_by:
-                    f.write("  Called by:\n")
-                    for caller in func.called_by:
-                        f.write(f"    - {caller}\n")
+                    parts.append("  Called by:\n")
+                    parts.extend(f"    - {caller}\n" for caller in func.called_by)
+                f.write("".join(parts))
             
             f.write("\nMissing Functions:\n")
-            for missing in sorted(missing_functions):
-                f.write(f"  - {missing}\n")
+            f.writelines(f"  - {missing}\n" for missing in sorted(missing_functions))
         
         print(f"Results saved to {output_file}") 
\ No newline at end of file
@@ -4,11 +4,16 @@ Function model for representing function data and relationships.
 This module defines the data models for representing functions and their
 relationships in a call graph structure.
 """
+import sys
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Set, Any
 
+# Projects produce tens of thousands of functions; slots make each one smaller
+# and faster to create where dataclasses support them (Python 3.10+)
+_DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**_DATACLASS_OPTIONS)
 class Function:
     """
     Represents a function in source code.
@@ -29,6 +34,7 @@ class Function:
         parameters: List of parameter names for this function.
         return_type: The function's return type.
         is_virtual: Whether the function is virtual.
+        is_pure_virtual: Whether the function is pure virtual.
         overrides: List of base class methods this function overrides.
         is_template: Whether the function is a template.
         template_params: List of template parameters.
@@ -59,6 +65,7 @@ class Function:
         dependent_names: List of dependent names used in the template.
         template_template_params: List of template template parameters.
         constraint_expressions: List of constraint expressions for concepts or requires.
+        usr: libclang Unified Symbol Resolution string of the declaration.
     """
     name: str
     signature: str = ""
@@ -73,6 +80,7 @@ class Function:
     return_type: str = ""
     # Advanced C++ features
     is_virtual: bool = False
+    is_pure_virtual: bool = False
     overrides: List[str] = field(default_factory=list)
     is_template: bool = False
     template_params: List[str] = field(default_factory=list)
@@ -105,6 +113,12 @@ class Function:
     dependent_names: List[str] = field(default_factory=list)
     template_template_params: List[str] = field(default_factory=list)
     constraint_expressions: List[str] = field(default_factory=list)
+    usr: str = ""
+    
+    def __post_init__(self) -> None:
+        # Every function of a file shares one path string
+        if self.file_path:
+            self.file_path = sys.intern(self.file_path)
     
     def add_call(self, function_name: str) -> None:
         """
@@ -178,7 +192,7 @@ class Function:
             self.constraint_expressions.append(constraint)
 
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class CallGraph:
     """
     Represents a call graph of functions.
@@ -4,7 +4,20 @@ Service modules for the application.
 This package contains service modules that implement the core functionality
 of the application.
 """
-from src.services.search_service import SearchService
-from .helixdb_service import HelixDBService
+import importlib
 
-# __init__.py for services package 
\ No newline at end of file
+# Services re-exported from the package, imported on first access so that
+# importing one service module does not pull in the dependencies of all others
+_LAZY_EXPORTS = {
+    "SearchService": "src.services.search_service",
+    "HelixDBService": "src.services.helixdb_service",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module_name), name)
+
+# __init__.py for services package
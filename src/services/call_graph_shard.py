@@ -0,0 +1,203 @@
+"""
+Compact on-disk call graph shards.
+
+A shard lets a large directory analysis be indexed without holding the merged
+call graph in memory. It is a directory with two files:
+
+- nodes.jsonl: one JSON record per function (id, name, signature, file_path,
+  line_number, namespace, is_defined). A function first seen as a callee gets
+  an undefined record, and a later definition appends a second record with
+  the same id.
+- edges.bin: caller/callee id pairs as native int32 values, 8 bytes per call.
+
+Ids are allocated densely in the order functions are first seen, so per-node
+state is kept in id-indexed arrays rather than dicts or sets. The writer only
+keeps a name -> id map and a defined flag per id; everything else is streamed
+to disk.
+"""
+import json
+import os
+from array import array
+from typing import Any, Dict, Iterator, List, Tuple
+
+from src.models.function_model import CallGraph
+
+NODES_FILE = "nodes.jsonl"
+EDGES_FILE = "edges.bin"
+
+# Bytes per edge: two int32 ids
+EDGE_SIZE = 2 * array('i').itemsize
+
+NODE_BATCH_QUERY = """
+UNWIND $rows AS row
+MERGE (f:Function {project: $project, name: row.name})
+SET f.signature = coalesce(row.signature, f.signature),
+    f.file_path = coalesce(row.file_path, f.file_path),
+    f.line_number = coalesce(row.line_number, f.line_number),
+    f.namespace = coalesce(row.namespace, f.namespace),
+    f.is_defined = row.is_defined OR coalesce(f.is_defined, false)
+RETURN row.id AS id, id(f) AS node_id
+"""
+
+# Edges are [caller, callee] pairs of the database ids returned by NODE_BATCH_QUERY,
+# so both ends are looked up directly instead of by project and name
+EDGE_BATCH_QUERY = """
+UNWIND $pairs AS pair
+MATCH (caller) WHERE id(caller) = pair[0]
+MATCH (callee) WHERE id(callee) = pair[1]
+MERGE (caller)-[:CALLS]->(callee)
+"""
+
+
+class CallGraphShardWriter:
+    """Streams per-file call graphs into a shard directory."""
+
+    def __init__(self, shard_dir: str) -> None:
+        """
+        Create the shard files, replacing any existing shard in the directory.
+
+        Args:
+            shard_dir: Directory to write the shard files to.
+        """
+        os.makedirs(shard_dir, exist_ok=True)
+        self._nodes = open(os.path.join(shard_dir, NODES_FILE), 'w', encoding='utf-8')
+        self._edges = open(os.path.join(shard_dir, EDGES_FILE), 'wb')
+        self._ids: Dict[str, int] = {}
+        # One byte per id, set once a definition record is written
+        self._defined = bytearray()
+        self.node_count = 0
+        self.edge_count = 0
+
+    def __enter__(self) -> "CallGraphShardWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Flush and close the shard files."""
+        self._nodes.close()
+        self._edges.close()
+
+    def _node_id(self, name: str, write_placeholder: bool = True) -> int:
+        node_id = self._ids.get(name)
+        if node_id is None:
+            node_id = self._ids[name] = self.node_count
+            self.node_count += 1
+            self._defined.append(0)
+            if write_placeholder:
+                self._nodes.write(json.dumps({"id": node_id, "name": name, "is_defined": False}) + '\n')
+        return node_id
+
+    def add_call_graph(self, call_graph: CallGraph) -> None:
+        """
+        Append the functions and calls of one file's call graph.
+
+        Args:
+            call_graph: Call graph of a single file.
+        """
+        edges = set()
+        for func in call_graph.functions.values():
+            # A definition written right below needs no placeholder record
+            func_id = self._node_id(func.name, write_placeholder=not func.is_defined)
+            if func.is_defined and not self._defined[func_id]:
+                self._defined[func_id] = 1
+                self._nodes.write(json.dumps({
+                    "id": func_id,
+                    "name": func.name,
+                    "signature": func.signature or None,
+                    "file_path": func.file_path or None,
+                    "line_number": func.line_number or None,
+                    "namespace": func.namespace or None,
+                    "is_defined": True,
+                }, ensure_ascii=False) + '\n')
+            for called in func.calls:
+                edges.add((func_id, self._node_id(called)))
+            for caller in func.called_by:
+                edges.add((self._node_id(caller), func_id))
+
+        for missing in call_graph.missing_functions:
+            self._node_id(missing)
+
+        packed = array('i')
+        for caller_id, callee_id in edges:
+            packed.append(caller_id)
+            packed.append(callee_id)
+        packed.tofile(self._edges)
+        self.edge_count += len(edges)
+
+
+def iter_node_batches(shard_dir: str, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Read node records from a shard in batches.
+
+    Args:
+        shard_dir: Shard directory.
+        batch_size: Number of records per batch.
+
+    Yields:
+        Lists of node records, in the order they were written.
+    """
+    batch = []
+    with open(os.path.join(shard_dir, NODES_FILE), 'r', encoding='utf-8') as f:
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def iter_edge_batches(shard_dir: str, batch_size: int = 1000) -> Iterator[List[Tuple[int, int]]]:
+    """
+    Read caller/callee id pairs from a shard in batches.
+
+    Args:
+        shard_dir: Shard directory.
+        batch_size: Number of edges per batch.
+
+    Yields:
+        Lists of (caller id, callee id) pairs.
+    """
+    with open(os.path.join(shard_dir, EDGES_FILE), 'rb') as f:
+        while True:
+            data = f.read(batch_size * EDGE_SIZE)
+            if not data:
+                break
+            ids = array('i')
+            ids.frombytes(data)
+            yield list(zip(ids[0::2], ids[1::2]))
+
+
+def index_call_graph_shard(neo4j_service, shard_dir: str, project: str, clear: bool = False,
+                           batch_size: int = 1000) -> None:
+    """
+    Write a shard to Neo4j with one UNWIND statement per batch of nodes or edges.
+
+    Only names, locations and calls are stored; template and class details
+    need the full call graph and Neo4jService.index_clang_callgraph.
+
+    Args:
+        neo4j_service: Neo4j service whose driver is used for writing.
+        shard_dir: Shard directory.
+        project: Project name for the indexed functions.
+        clear: Whether to delete the project's existing functions first.
+        batch_size: Number of nodes or edges per statement.
+    """
+    # Database id of each shard node id; shard ids are dense
+    node_ids = array('q')
+    with neo4j_service.driver.session() as session:
+        if clear:
+            session.run("MATCH (f:Function {project: $project}) DETACH DELETE f", project=project).consume()
+
+        for batch in iter_node_batches(shard_dir, batch_size):
+            for record in session.run(NODE_BATCH_QUERY, rows=batch, project=project):
+                shard_id = record["id"]
+                if shard_id >= len(node_ids):
+                    node_ids.extend([-1] * (shard_id + 1 - len(node_ids)))
+                node_ids[shard_id] = record["node_id"]
+
+        for batch in iter_edge_batches(shard_dir, batch_size):
+            pairs = [[node_ids[caller_id], node_ids[callee_id]] for caller_id, callee_id in batch]
+            session.run(EDGE_BATCH_QUERY, pairs=pairs).consume()
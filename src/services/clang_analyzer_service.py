@@ -4,15 +4,30 @@ Clang analyzer service for performing code analysis operations using libclang.
 import os
 import sys
 import re
+import json
+import hashlib
+import pickle
 import platform
+import logging
+from collections import OrderedDict
+from ctypes import c_void_p, cast
 from typing import Dict, List, Set, Tuple, Union, Optional
-from clang.cindex import Index, CursorKind, TranslationUnit, Cursor, Type, TypeKind
+from clang.cindex import Index, CursorKind, TranslationUnit, Cursor, Type, TypeKind, conf
+try:
+    from clang.cindex import cursor_visit_callback
+except ImportError:
+    # Older bindings keep the ctypes callback types in a dict
+    from clang.cindex import callbacks
+    cursor_visit_callback = callbacks['cursor_visit']
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from src.models.function_model import Function, CallGraph
 from src.utils.file_utils import ensure_dir, read_file_content
 from src.utils.compile_commands import detect_project_include_paths
 from src.services.helixdb_service import HelixDBService
+from src.config.settings import CLANG_AST_CACHE_DIR
+
+logger = logging.getLogger(__name__)
 
 # Check libclang capabilities
 HAS_MEMBER_CALL_EXPR = hasattr(CursorKind, 'CXX_MEMBER_CALL_EXPR')
@@ -24,15 +39,90 @@ except AttributeError:
     HAS_INVALID_TYPE = False
     INVALID_TYPE = None
 
+# C/C++ source and header extensions analyzed by default
+DEFAULT_SOURCE_EXTENSIONS = ('.c', '.cpp', '.cxx', '.cc', '.h', '.hpp', '.hxx', '.hh')
+
+# Node kinds _find_function_calls detects calls from
+CALL_DETECTION_KINDS = frozenset(
+    [CursorKind.CALL_EXPR, CursorKind.MEMBER_REF_EXPR]
+    + ([CursorKind.CXX_MEMBER_CALL_EXPR] if HAS_MEMBER_CALL_EXPR else [])
+)
+
+# Node kinds whose subtrees cannot contain calls the AST pass should record:
+# references, literals and parameter declarations (calls in default arguments
+# are made by the caller, and the pattern matching pass still sees them)
+CALL_FREE_KINDS = frozenset([
+    CursorKind.PARM_DECL,
+    CursorKind.TYPE_REF,
+    CursorKind.TEMPLATE_REF,
+    CursorKind.NAMESPACE_REF,
+    CursorKind.INTEGER_LITERAL,
+    CursorKind.FLOATING_LITERAL,
+    CursorKind.STRING_LITERAL,
+    CursorKind.CHARACTER_LITERAL,
+])
+
+# CXChildVisitResult values returned by clang_visitChildren visitors
+CHILD_VISIT_CONTINUE = 1
+CHILD_VISIT_RECURSE = 2
+
+# Number of files each worker process analyzes per task
+FILES_PER_TASK = 16
+
+# Live translation units kept with keep_translation_units; the least recently
+# analyzed ones are disposed first, bounding memory on large projects
+MAX_LIVE_TRANSLATION_UNITS = 64
+
+# Part of the analysis cache key; bump when extraction changes what analyze_file returns
+ANALYSIS_CACHE_VERSION = 1
+
+# libclang parse options for each analyze_file parse mode
+PARSE_OPTIONS = {
+    "full": 0,
+    "decls": TranslationUnit.PARSE_SKIP_FUNCTION_BODIES | TranslationUnit.PARSE_INCOMPLETE,
+}
+
 class ClangAnalyzerService:
     """Service for analyzing code and extracting function call information using libclang."""
     
-    def __init__(self, libclang_path: str = None):
+    def __init__(self, libclang_path: str = None, ast_cache_dir: Optional[str] = CLANG_AST_CACHE_DIR,
+                 keep_translation_units: bool = False,
+                 max_live_units: int = MAX_LIVE_TRANSLATION_UNITS):
         """Initialize the analyzer service.
         
         Args:
             libclang_path: Optional path to libclang
+            ast_cache_dir: Directory for cached translation units; None disables the cache
+            keep_translation_units: Keep each parsed translation unit in memory and
+                reparse it when the same file is analyzed again, for repeatedly
+                analyzing edited files (e.g. a watch loop)
+            max_live_units: Maximum number of translation units kept in memory
         """
+        self.libclang_path = libclang_path
+        self.ast_cache_dir = ast_cache_dir
+        self.keep_translation_units = keep_translation_units
+        self.max_live_units = max_live_units
+        # (file path, arguments, options) -> live translation unit, least recently used first
+        self._live_units: "OrderedDict[Tuple[str, Tuple[str, ...], int], TranslationUnit]" = OrderedDict()
+        # Source bytes of the files of the translation unit being analyzed
+        self._source_bytes: Dict[str, bytes] = {}
+        # Cursor hash -> (qualified name, whether the parent is a class or struct)
+        self._qualified_names: Dict[int, Tuple[str, bool]] = {}
+        # USR -> key of the function registered for that declaration
+        self._usr_names: Dict[str, str] = {}
+        # CXFile handle -> file name, for the translation unit being analyzed
+        self._file_names: Dict[int, str] = {}
+        
+        # Handlers for the node kinds _visit_ast processes instead of descending into
+        self._node_handlers = {
+            CursorKind.FUNCTION_DECL: self._process_function_node,
+            CursorKind.CXX_METHOD: self._process_method_node,
+            CursorKind.FUNCTION_TEMPLATE: self._process_template_function_node,
+            CursorKind.CLASS_TEMPLATE: self._process_template_class_node,
+            CursorKind.STRUCT_DECL: self._process_class_node,
+            CursorKind.CLASS_DECL: self._process_class_node,
+        }
+        
         # First try to use the provided path
         if libclang_path:
             self.setup_libclang(libclang_path)
@@ -41,10 +131,10 @@ class ClangAnalyzerService:
             try:
                 from src.config.libclang_config import configure_libclang
                 configure_libclang()
-                print("Configured libclang from config file")
+                logger.debug("Configured libclang from config file")
             except ImportError:
                 # Fall back to automatic detection or default
-                print("No libclang configuration found, using default")
+                logger.debug("No libclang configuration found, using default")
         
         try:
             # Try to create the index with default settings
@@ -83,16 +173,16 @@ class ClangAnalyzerService:
             from clang.cindex import conf
             version = conf.lib.clang_getClangVersion()
             if version:
-                print(f"Using libclang version: {version}")
+                logger.debug("Using libclang version: %s", version)
             
             # Check for specific capabilities
             if HAS_MEMBER_CALL_EXPR:
-                print("This version of libclang supports CXX_MEMBER_CALL_EXPR")
+                logger.debug("This version of libclang supports CXX_MEMBER_CALL_EXPR")
             else:
-                print("This version of libclang does NOT support CXX_MEMBER_CALL_EXPR")
-                print("Some C++ feature detection may be limited")
+                logger.warning("This version of libclang does NOT support CXX_MEMBER_CALL_EXPR; "
+                               "some C++ feature detection may be limited")
         except:
-            print("Unable to determine libclang version")
+            logger.debug("Unable to determine libclang version")
         
     def setup_libclang(self, libclang_path: str = None):
         """Set up libclang.
@@ -102,11 +192,14 @@ class ClangAnalyzerService:
         """
         if libclang_path:
             from clang.cindex import Config
-            Config.set_library_file(libclang_path)
+            # Forked worker processes inherit the library already loaded by the parent
+            if not Config.loaded:
+                Config.set_library_file(libclang_path)
         
     def analyze_file(self, file_path: str, include_dirs: List[str] = None, 
                     compiler_args: List[str] = None, analyze_templates: bool = True,
-                    track_virtual_methods: bool = True, cross_file_mode: str = "basic") -> CallGraph:
+                    track_virtual_methods: bool = True, cross_file_mode: str = "basic",
+                    parse_mode: str = "full") -> CallGraph:
         """Analyze a file and extract function information.
         
         Args:
@@ -116,10 +209,14 @@ class ClangAnalyzerService:
             analyze_templates: Whether to perform enhanced template analysis
             track_virtual_methods: Whether to track virtual method overrides
             cross_file_mode: Mode for cross-file analysis ('basic', 'enhanced', 'full')
+            parse_mode: 'full' parses function bodies; 'decls' skips them, which is much
+                faster but finds no calls, for passes that only need the function inventory
             
         Returns:
             CallGraph containing functions and their relationships
         """
+        if parse_mode not in PARSE_OPTIONS:
+            raise ValueError(f"Unknown parse mode: {parse_mode}")
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File {file_path} not found")
             
@@ -139,7 +236,15 @@ class ClangAnalyzerService:
             
         # Parse the file with clang
         try:
-            tu = self.index.parse(file_path, args=args)
+            cache_path = self._analysis_cache_path(
+                file_path, args, PARSE_OPTIONS[parse_mode],
+                (analyze_templates, track_virtual_methods, cross_file_mode))
+            if cache_path:
+                cached = self._load_cached_analysis(cache_path)
+                if cached is not None:
+                    return cached
+            
+            tu = self._parse_translation_unit(file_path, args, PARSE_OPTIONS[parse_mode])
             if not tu:
                 print(f"Error parsing file: {file_path}")
                 return CallGraph(functions={})
@@ -153,12 +258,259 @@ class ClangAnalyzerService:
             if cross_file_mode != "basic":
                 self._process_cross_file_references(functions, mode=cross_file_mode)
                 
-            return CallGraph(functions=functions)
+            call_graph = CallGraph(functions=functions)
+            if cache_path:
+                self._save_cached_analysis(cache_path, tu, call_graph)
+            return call_graph
             
         except Exception as e:
             print(f"Error analyzing file {file_path}: {str(e)}")
             return CallGraph(functions={})
+        finally:
+            self._source_bytes.clear()
+            self._qualified_names.clear()
+            self._usr_names.clear()
+            self._file_names.clear()
 
+    def _parse_translation_unit(self, file_path: str, args: List[str], options: int = 0) -> Optional[TranslationUnit]:
+        """Parse a file, reusing a saved translation unit when nothing it depends on changed.
+        
+        Cache entries are keyed by the file content and compiler arguments. Each
+        entry also records the modification times of the included headers, so
+        an edited header invalidates it.
+        
+        With keep_translation_units, translation units stay in memory instead and
+        are brought up to date with reparse(), which reuses the precompiled
+        preamble (the headers included at the top of the file) when it is unchanged.
+        At most max_live_units are kept; the least recently used one is dropped.
+        
+        Args:
+            file_path: Path to the file to parse
+            args: Compiler arguments
+            options: TranslationUnit.PARSE_* flags
+            
+        Returns:
+            The translation unit, or None if parsing failed
+        """
+        if self.keep_translation_units:
+            key = (os.path.abspath(file_path), tuple(args), options)
+            tu = self._live_units.get(key)
+            if tu is not None:
+                self._live_units.move_to_end(key)
+                tu.reparse()
+                return tu
+            tu = self.index.parse(file_path, args=args,
+                                  options=options | TranslationUnit.PARSE_PRECOMPILED_PREAMBLE)
+            if tu:
+                self._live_units[key] = tu
+                if len(self._live_units) > self.max_live_units:
+                    self._live_units.popitem(last=False)
+            return tu
+        
+        if not self.ast_cache_dir:
+            return self.index.parse(file_path, args=args, options=options)
+        
+        key = self._cache_key(file_path, args, options)
+        ast_path = os.path.join(self.ast_cache_dir, key + '.ast')
+        deps_path = os.path.join(self.ast_cache_dir, key + '.deps.json')
+        
+        if os.path.exists(ast_path) and self._dependencies_unchanged(deps_path):
+            try:
+                return TranslationUnit.from_ast_file(ast_path, self.index)
+            except Exception:
+                # Written by another libclang version or truncated; reparse below
+                pass
+        
+        tu = self.index.parse(file_path, args=args, options=options)
+        if tu:
+            try:
+                os.makedirs(self.ast_cache_dir, exist_ok=True)
+                deps = {}
+                for include in tu.get_includes():
+                    name = include.include.name
+                    deps[name] = os.path.getmtime(name)
+                tu.save(ast_path)
+                with open(deps_path, 'w', encoding='utf-8') as f:
+                    json.dump(deps, f)
+                self._prune_cache_entries(key)
+            except Exception as e:
+                print(f"Could not cache translation unit for {file_path}: {e}")
+        return tu
+    
+    def _dependencies_unchanged(self, deps_path: str) -> bool:
+        """Check that every header recorded for a cached translation unit is unmodified."""
+        try:
+            with open(deps_path, 'r', encoding='utf-8') as f:
+                deps = json.load(f)
+            return all(os.path.getmtime(name) == mtime for name, mtime in deps.items())
+        except (OSError, ValueError):
+            return False
+    
+    def _analysis_cache_path(self, file_path: str, args: List[str], options: int,
+                             settings: Tuple) -> Optional[str]:
+        """Return where the analysis result of a file is cached, or None if caching is off.
+        
+        Results share the translation unit cache directory and are keyed the same
+        way, plus the analysis settings and ANALYSIS_CACHE_VERSION. Live translation
+        units are meant for files being edited, so their results are not cached.
+        
+        Args:
+            file_path: Path to the analyzed file
+            args: Compiler arguments
+            options: TranslationUnit.PARSE_* flags
+            settings: analyze_file options that affect the result
+            
+        Returns:
+            Path of the cache entry, or None
+        """
+        if not self.ast_cache_dir or self.keep_translation_units:
+            return None
+        key = self._cache_key(file_path, args, options, settings, ANALYSIS_CACHE_VERSION)
+        return os.path.join(self.ast_cache_dir, key + '.callgraph.pickle')
+    
+    def _cache_key(self, file_path: str, *parts) -> str:
+        """Return the cache key of a file as '<hash of path and parts>-<hash of content>'.
+        
+        The prefix identifies the entry slot of the file, so entries written for
+        earlier contents of the file can be found and pruned.
+        """
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        slot = hashlib.sha1(repr((os.path.abspath(file_path),) + parts).encode('utf-8')).hexdigest()
+        return f"{slot[:20]}-{hashlib.sha1(content).hexdigest()}"
+    
+    def _prune_cache_entries(self, key: str) -> None:
+        """Remove cache files of the same slot as key that were written for other contents."""
+        prefix = key.split('-', 1)[0] + '-'
+        try:
+            names = os.listdir(self.ast_cache_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(prefix) and not name.startswith(key + '.'):
+                try:
+                    os.remove(os.path.join(self.ast_cache_dir, name))
+                except OSError:
+                    # Already removed by another worker
+                    pass
+    
+    def _load_cached_analysis(self, cache_path: str) -> Optional[CallGraph]:
+        """Load a cached analysis result if none of the headers it depends on changed."""
+        try:
+            with open(cache_path, 'rb') as f:
+                deps, call_graph = pickle.load(f)
+        except Exception:
+            # Missing, truncated or written by an incompatible version; analyze again
+            return None
+        try:
+            if all(os.path.getmtime(name) == mtime for name, mtime in deps.items()):
+                return call_graph
+        except OSError:
+            pass
+        return None
+    
+    def _save_cached_analysis(self, cache_path: str, tu: TranslationUnit, call_graph: CallGraph) -> None:
+        """Save an analysis result together with the modification times of the included headers."""
+        try:
+            os.makedirs(self.ast_cache_dir, exist_ok=True)
+            deps = {}
+            for include in tu.get_includes():
+                name = include.include.name
+                deps[name] = os.path.getmtime(name)
+            # Workers may analyze the same file concurrently, so replace the entry atomically
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((deps, call_graph), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+            self._prune_cache_entries(os.path.basename(cache_path).split('.', 1)[0])
+        except Exception as e:
+            print(f"Could not cache analysis of {tu.spelling}: {e}")
+    
+    def _cursor_source(self, cursor: Cursor) -> str:
+        """Return the source text covered by a cursor's extent.
+        
+        Slicing the file is much cheaper than re-lexing the extent with get_tokens;
+        the token join is only used when the extent has no file to slice.
+        
+        Args:
+            cursor: The cursor whose text to return
+            
+        Returns:
+            The cursor's source text
+        """
+        start, end = cursor.extent.start, cursor.extent.end
+        if start.file is None or end.offset <= start.offset:
+            return " ".join(t.spelling for t in cursor.get_tokens())
+        path = start.file.name
+        data = self._source_bytes.get(path)
+        if data is None:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return " ".join(t.spelling for t in cursor.get_tokens())
+            self._source_bytes[path] = data
+        return data[start.offset:end.offset].decode('utf-8', 'replace')
+    
+    def _cursor_file_name(self, cursor: Cursor) -> str:
+        """Return the name of the file containing a cursor.
+        
+        Names are cached by file handle, so the name of each file is only
+        fetched from libclang once per translation unit.
+        
+        Args:
+            cursor: The cursor to locate
+            
+        Returns:
+            The file name, or "" if the cursor is not in a file
+        """
+        cursor_file = cursor.location.file
+        if not cursor_file:
+            return ""
+        handle = cast(cursor_file.obj, c_void_p).value
+        name = self._file_names.get(handle)
+        if name is None:
+            name = self._file_names[handle] = cursor_file.name
+        return name
+    
+    def _qualified_name(self, cursor: Cursor) -> Tuple[str, bool]:
+        """Return a function cursor's name, qualified with its class when it has one.
+        
+        Results are memoized per translation unit, so a function called from many
+        places only has its semantic parent looked up once.
+        
+        Args:
+            cursor: The function or method cursor
+            
+        Returns:
+            Tuple of ("Class::name" or "name", whether the parent is a class or struct)
+        """
+        key = cursor.hash
+        cached = self._qualified_names.get(key)
+        if cached is None:
+            parent = cursor.semantic_parent
+            if parent and parent.kind in (CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL):
+                cached = (f"{parent.spelling}::{cursor.spelling}", True)
+            else:
+                cached = (cursor.spelling, False)
+            self._qualified_names[key] = cached
+        return cached
+    
+    def _register_usr(self, cursor: Cursor, name: str) -> str:
+        """Record which function key a declaration's USR resolves to.
+        
+        Args:
+            cursor: The function cursor
+            name: Key of the function in the functions dictionary
+            
+        Returns:
+            The cursor's USR, empty if it has none
+        """
+        usr = cursor.get_usr()
+        if usr:
+            self._usr_names.setdefault(usr, name)
+        return usr
+    
     def _extract_functions(self, cursor: Cursor, file_path: str, analyze_templates: bool = True,
                           track_virtual: bool = True) -> Dict[str, Function]:
         """Extract function definitions and calls from the AST.
@@ -175,57 +527,100 @@ class ClangAnalyzerService:
         functions = {}
         self._visit_ast(cursor, functions, file_path)
         
+        # The remaining passes share a single walk over the file's nodes
+        if analyze_templates or track_virtual:
+            nodes = self._file_nodes(cursor, file_path)
+        
         # Process template functions after all functions are found
         if analyze_templates:
-            self._extract_template_info(cursor, functions, file_path)
+            self._extract_template_info(nodes, functions)
         
         # Process class hierarchy and virtual methods
         if track_virtual:
-            self._extract_class_hierarchy(cursor, functions, file_path)
+            self._extract_class_hierarchy(nodes, functions)
         
         # Process advanced template metaprogramming features
         if analyze_templates:
-            self._analyze_advanced_templates(cursor, functions, file_path)
+            self._analyze_advanced_templates(nodes, functions)
             
         return functions
     
     def _visit_ast(self, cursor: Cursor, functions: Dict[str, Function], file_path: str):
-        """Recursively visit the AST to find functions and function calls.
+        """Visit the AST in pre-order to find functions and function calls.
+        
+        The walk runs inside libclang: a single clang_visitChildren call recurses
+        through the tree, and the visitor only decides whether to descend. Nodes
+        with a handler in self._node_handlers are collected without descending
+        into them and processed afterwards, in source order. Nodes from other
+        files (included headers) are skipped with their subtrees.
         
         Args:
-            cursor: Current cursor in the AST
+            cursor: Root cursor of the walk
             functions: Dictionary to store found functions
             file_path: Path to the source file
         """
-        # Check if we're in the target file
-        if cursor.location.file and cursor.location.file.name != file_path:
+        handlers = self._node_handlers
+        
+        root_file = self._cursor_file_name(cursor)
+        if root_file and root_file != file_path:
+            return
+        if cursor.kind in handlers:
+            handlers[cursor.kind](cursor, functions)
             return
+        
+        handled = []
+        
+        def visitor(child, parent, data):
+            # Keep the translation unit alive, as Cursor.get_children does
+            child._tu = cursor._tu
             
-        # Handle different node types
-        if cursor.kind == CursorKind.FUNCTION_DECL:
-            # Regular function
-            self._process_function_node(cursor, functions)
-                
-        elif cursor.kind == CursorKind.CXX_METHOD:
-            # C++ method
-            self._process_method_node(cursor, functions)
-                
-        elif cursor.kind == CursorKind.FUNCTION_TEMPLATE:
-            # Function template
-            self._process_template_function_node(cursor, functions)
-                
-        elif cursor.kind == CursorKind.CLASS_TEMPLATE:
-            # Class template
-            self._process_template_class_node(cursor, functions)
+            # Check if we're in the target file
+            child_file = self._cursor_file_name(child)
+            if child_file and child_file != file_path:
+                return CHILD_VISIT_CONTINUE
             
-        elif cursor.kind in [CursorKind.STRUCT_DECL, CursorKind.CLASS_DECL]:
-            # Class or struct that might contain methods
-            self._process_class_node(cursor, functions)
+            if child.kind in handlers:
+                handled.append(child)
+                return CHILD_VISIT_CONTINUE
+            return CHILD_VISIT_RECURSE
         
-        # For other nodes, continue traversing
-        else:
-            for child in cursor.get_children():
-                self._visit_ast(child, functions, file_path)
+        conf.lib.clang_visitChildren(cursor, cursor_visit_callback(visitor), handled)
+        
+        for node in handled:
+            handlers[node.kind](node, functions)
+    
+    def _file_nodes(self, cursor: Cursor, file_path: str) -> List[Cursor]:
+        """Collect a cursor and all its descendants in the source file, in pre-order.
+        
+        Like _visit_ast, the walk runs inside libclang and skips nodes from
+        other files (included headers) with their subtrees.
+        
+        Args:
+            cursor: Root cursor of the walk
+            file_path: Path to the source file
+            
+        Returns:
+            The collected nodes
+        """
+        root_file = self._cursor_file_name(cursor)
+        if root_file and root_file != file_path:
+            return []
+        
+        nodes = [cursor]
+        
+        def visitor(child, parent, data):
+            # Keep the translation unit alive, as Cursor.get_children does
+            child._tu = cursor._tu
+            
+            child_file = self._cursor_file_name(child)
+            if child_file and child_file != file_path:
+                return CHILD_VISIT_CONTINUE
+            
+            nodes.append(child)
+            return CHILD_VISIT_RECURSE
+        
+        conf.lib.clang_visitChildren(cursor, cursor_visit_callback(visitor), nodes)
+        return nodes
     
     def _process_function_node(self, cursor: Cursor, functions: Dict[str, Function]):
         """Process a function declaration node"""
@@ -238,11 +633,12 @@ class ClangAnalyzerService:
         if func_name not in functions:
             functions[func_name] = Function(
                 name=func_name,
-                file_path=cursor.location.file.name if cursor.location.file else "",
+                file_path=self._cursor_file_name(cursor),
                 line_number=cursor.location.line,
                 signature=cursor.displayname,
                 calls=[],
-                called_by=[]
+                called_by=[],
+                usr=self._register_usr(cursor, func_name)
             )
                 
         # Look for function calls within this function
@@ -253,30 +649,26 @@ class ClangAnalyzerService:
         if not cursor.is_definition():
             return
             
-        method_name = cursor.spelling
         # Get qualified name including class
-        qualified_name = ""
-        parent = cursor.semantic_parent
-        if parent and parent.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL]:
-            qualified_name = f"{parent.spelling}::{method_name}"
-        else:
-            qualified_name = method_name
+        qualified_name, _ = self._qualified_name(cursor)
                 
         # Check if it's a virtual method
         is_virtual = cursor.is_virtual_method()
         
         # Create function entry if it doesn't exist
         if qualified_name not in functions:
+            parent = cursor.semantic_parent
             functions[qualified_name] = Function(
                 name=qualified_name,
-                file_path=cursor.location.file.name if cursor.location.file else "",
+                file_path=self._cursor_file_name(cursor),
                 line_number=cursor.location.line,
                 signature=cursor.displayname,
                 calls=[],
                 called_by=[],
                 is_virtual=is_virtual,
                 is_member=True,
-                class_name=parent.spelling if parent else ""
+                class_name=parent.spelling if parent else "",
+                usr=self._register_usr(cursor, qualified_name)
             )
                 
         # Look for function calls within this method
@@ -329,9 +721,8 @@ class ClangAnalyzerService:
                 template_template_params.append(param_name)
                 
                 # Get full template template parameter definition
-                param_tokens = [t.spelling for t in child.get_tokens()]
-                if param_tokens and len(param_tokens) > 2:
-                    full_param = " ".join(param_tokens)
+                full_param = self._cursor_source(child)
+                if full_param and full_param != param_name:
                     template_template_params[-1] = full_param
         
         # 2. Check source code for template template parameter patterns
@@ -387,7 +778,7 @@ class ClangAnalyzerService:
         if func_name not in functions:
             functions[func_name] = Function(
                 name=func_name,
-                file_path=cursor.location.file.name if cursor.location.file else "",
+                file_path=self._cursor_file_name(cursor),
                 line_number=cursor.location.line,
                 signature=cursor.displayname,
                 calls=[],
@@ -398,7 +789,8 @@ class ClangAnalyzerService:
                 variadic_template_param=variadic_param,
                 template_template_params=template_template_params,
                 has_sfinae=has_sfinae,
-                sfinae_techniques=sfinae_techniques
+                sfinae_techniques=sfinae_techniques,
+                usr=self._register_usr(cursor, func_name)
             )
         else:
             # Update existing function
@@ -435,7 +827,7 @@ class ClangAnalyzerService:
         class_text = " ".join(all_tokens)
         
         # Check specifically for template specialization for is_same<T, T>
-        if class_name == "is_same" or class_text.startswith("template") and "is_same" in class_text:
+        if class_name == "is_same" or (class_text.startswith("template") and "is_same" in class_text):
             # Look for pattern of a specialized version
             specialization_pattern = False
             if "template" in all_tokens and "<" in class_text and ">" in class_text:
@@ -452,7 +844,7 @@ class ClangAnalyzerService:
                 if spec_name not in functions:
                     functions[spec_name] = Function(
                         name=spec_name,
-                        file_path=cursor.location.file.name if cursor.location.file else "",
+                        file_path=self._cursor_file_name(cursor),
                         line_number=cursor.location.line,
                         signature="template <typename T> struct is_same<T, T>",
                         calls=[],
@@ -464,7 +856,7 @@ class ClangAnalyzerService:
                     )
         
         # Process the class template itself as a potential metafunction
-        if class_name and "struct" in class_text or "class" in class_text:
+        if class_name and ("struct" in class_text or "class" in class_text):
             # Extract template parameters, including template template params
             template_params = self._extract_template_params(cursor)
             
@@ -480,9 +872,8 @@ class ClangAnalyzerService:
                     template_template_params.append(param_name)
                     
                     # Get full template template parameter definition
-                    param_tokens = [t.spelling for t in child.get_tokens()]
-                    if param_tokens and len(param_tokens) > 2:
-                        full_param = " ".join(param_tokens)
+                    full_param = self._cursor_source(child)
+                    if full_param and full_param != param_name:
                         template_template_params[-1] = full_param
             
             # Check source code for template template parameter patterns
@@ -536,7 +927,7 @@ class ClangAnalyzerService:
                 # Create function entry for the class template (as metafunction)
                 func = Function(
                     name=class_name,
-                    file_path=cursor.location.file.name if cursor.location.file else "",
+                    file_path=self._cursor_file_name(cursor),
                     line_number=cursor.location.line,
                     signature=f"template <{', '.join(template_params)}> struct {class_name}",
                     calls=[],
@@ -579,7 +970,7 @@ class ClangAnalyzerService:
                 # Create a function entry for the class template
                 functions[class_name] = Function(
                     name=class_name,
-                    file_path=cursor.location.file.name if cursor.location.file else "",
+                    file_path=self._cursor_file_name(cursor),
                     line_number=cursor.location.line,
                     signature=f"template <{', '.join(template_params)}> class {class_name}",
                     calls=[],
@@ -601,7 +992,7 @@ class ClangAnalyzerService:
                     
                     functions[qualified_name] = Function(
                         name=qualified_name,
-                        file_path=child.location.file.name if child.location.file else "",
+                        file_path=self._cursor_file_name(child),
                         line_number=child.location.line,
                         signature=child.displayname,
                         calls=[],
@@ -629,7 +1020,7 @@ class ClangAnalyzerService:
                     
                     functions[qualified_name] = Function(
                         name=qualified_name,
-                        file_path=child.location.file.name if child.location.file else "",
+                        file_path=self._cursor_file_name(child),
                         line_number=child.location.line,
                         signature=child.displayname,
                         calls=[],
@@ -653,7 +1044,7 @@ class ClangAnalyzerService:
                     
             # Recursively process nested classes
             elif child.kind in [CursorKind.STRUCT_DECL, CursorKind.CLASS_DECL]:
-                self._visit_ast(child, functions, cursor.location.file.name if cursor.location.file else "")
+                self._visit_ast(child, functions, self._cursor_file_name(cursor))
     
     def _process_class_node(self, cursor: Cursor, functions: Dict[str, Function]):
         """Process a class or struct declaration node"""
@@ -668,7 +1059,7 @@ class ClangAnalyzerService:
                 if child.is_definition() and qualified_name not in functions:
                     functions[qualified_name] = Function(
                         name=qualified_name,
-                        file_path=child.location.file.name if child.location.file else "",
+                        file_path=self._cursor_file_name(child),
                         line_number=child.location.line,
                         signature=child.displayname,
                         calls=[],
@@ -683,7 +1074,7 @@ class ClangAnalyzerService:
             
             # Recursively process nested classes
             elif child.kind in [CursorKind.STRUCT_DECL, CursorKind.CLASS_DECL]:
-                self._visit_ast(child, functions, cursor.location.file.name if cursor.location.file else "")
+                self._visit_ast(child, functions, self._cursor_file_name(cursor))
     
     def _extract_template_params(self, cursor: Cursor) -> List[str]:
         """Extract template parameters from a template function.
@@ -734,19 +1125,14 @@ class ClangAnalyzerService:
         
         return template_params
     
-    def _extract_template_info(self, cursor: Cursor, functions: Dict[str, Function], file_path: str):
+    def _extract_template_info(self, nodes: List[Cursor], functions: Dict[str, Function]):
         """Process template functions and their specializations.
         
         Args:
-            cursor: The root cursor
+            nodes: Nodes of the source file in pre-order, from _file_nodes
             functions: Dictionary of functions
-            file_path: Path to the source file
         """
-        template_functions = {}
-        
-        def visit_for_templates(node):
-            if node.location.file and node.location.file.name != file_path:
-                return
+        for node in nodes:
                 
             # Check if it's a template function
             if node.kind in [CursorKind.FUNCTION_TEMPLATE, CursorKind.CLASS_TEMPLATE]:
@@ -808,25 +1194,17 @@ class ClangAnalyzerService:
                             functions[func_name].has_sfinae = True
                             break
             
-            # Process children recursively
-            for child in node.get_children():
-                visit_for_templates(child)
-        
-        visit_for_templates(cursor)
     
-    def _extract_class_hierarchy(self, cursor: Cursor, functions: Dict[str, Function], file_path: str):
+    def _extract_class_hierarchy(self, nodes: List[Cursor], functions: Dict[str, Function]):
         """Process class hierarchies and extract inheritance information.
         
         Args:
-            cursor: The root cursor
+            nodes: Nodes of the source file in pre-order, from _file_nodes
             functions: Dictionary of functions
-            file_path: Path to the source file
         """
         class_hierarchy = {}
         
-        def visit_classes(node):
-            if node.location.file and node.location.file.name != file_path:
-                return
+        for node in nodes:
                 
             if node.kind in [CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL, CursorKind.CLASS_TEMPLATE]:
                 class_name = node.spelling
@@ -893,11 +1271,6 @@ class ClangAnalyzerService:
                             if qualified_name in functions:
                                 functions[qualified_name].is_static = True
             
-            # Recursively process children
-            for child in node.get_children():
-                visit_classes(child)
-        
-        visit_classes(cursor)
         
         # Update class hierarchy information for all functions
         for func_name, func in functions.items():
@@ -910,68 +1283,88 @@ class ClangAnalyzerService:
     def _find_function_calls(self, cursor: Cursor, caller_name: str, functions: Dict[str, Function]):
         """Find all function calls within a function or method.
         
+        The body is walked once and tokenized once; the pattern matching pass
+        runs over the text of the whole function.
+        
         Args:
             cursor: The cursor representing the function
             caller_name: Name of the calling function
             functions: Dictionary of functions
         """
         # Get source code for this function to help with pattern matching
-        function_tokens = list(cursor.get_tokens())
-        function_text = " ".join(token.spelling for token in function_tokens)
+        function_text = " ".join(token.spelling for token in cursor.get_tokens())
         
         # Track calls found through AST to avoid duplicates when using pattern matching
         calls_found = set()
         
-        # First pass: use AST-based detection
-        for child in cursor.get_children():
-            # Handle standard function calls
-            if child.kind == CursorKind.CALL_EXPR:
-                # Get the called function name
-                called_cursor = child.referenced
-                if called_cursor:
-                    called_name = called_cursor.spelling
-                    
-                    # For methods, get qualified name
-                    if called_cursor.kind == CursorKind.CXX_METHOD:
-                        parent = called_cursor.semantic_parent
-                        if parent and parent.kind == CursorKind.CLASS_DECL:
-                            called_name = f"{parent.spelling}::{called_name}"
+        # The caller's calls, with a set for membership tests and a bound append
+        caller = functions.get(caller_name)
+        recorded_calls = set(caller.calls) if caller is not None else set()
+        append_call = caller.calls.append if caller is not None else None
+        
+        # First pass: use AST-based detection over the whole body. The walk is
+        # iterative and visits nodes in the same order as a recursive one; each
+        # entry carries the node's next sibling for the member call check below.
+        stack = []
+        
+        def push_children(node):
+            # Reversed, so children are popped in source order
+            children = list(node.get_children())
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], children[i + 1] if i + 1 < len(children) else None))
+        
+        push_children(cursor)
+        while stack:
+            child, next_sibling = stack.pop()
+            kind = child.kind
+            
+            # Most nodes in a body are neither calls nor member references
+            if kind in CALL_DETECTION_KINDS:
+                # Handle standard function calls
+                if kind == CursorKind.CALL_EXPR:
+                    # Get the called function name
+                    called_cursor = child.referenced
+                    if called_cursor:
+                        # Prefer the exact function registered for the declaration
+                        called_name = self._usr_names.get(called_cursor.get_usr())
+                        if called_name is None:
+                            # For methods, get qualified name
+                            if called_cursor.kind == CursorKind.CXX_METHOD:
+                                called_name, _ = self._qualified_name(called_cursor)
+                            else:
+                                called_name = called_cursor.spelling
                     
-                    # Add to caller's calls
-                    if caller_name in functions and called_name not in functions[caller_name].calls:
-                        functions[caller_name].calls.append(called_name)
-                        calls_found.add(called_name)
+                        # Add to caller's calls
+                        if caller is not None and called_name not in recorded_calls:
+                            recorded_calls.add(called_name)
+                            append_call(called_name)
+                            calls_found.add(called_name)
                         
-                    # Add to callee's called_by
-                    if called_name in functions and caller_name not in functions[called_name].called_by:
-                        functions[called_name].called_by.append(caller_name)
-            
-            # For virtual method calls or member function calls
-            # Try multiple approaches to capture method calls, regardless of libclang version
-            
-            # Approach 1: Use CXX_MEMBER_CALL_EXPR if available
-            if HAS_MEMBER_CALL_EXPR and child.kind == CursorKind.CXX_MEMBER_CALL_EXPR:
-                # Try to resolve the virtual method call
-                called_cursor = child.referenced
-                if called_cursor and called_cursor.kind == CursorKind.CXX_METHOD:
-                    called_name = called_cursor.spelling
-                    parent = called_cursor.semantic_parent
-                    if parent and parent.kind in (CursorKind.CLASS_DECL, CursorKind.STRUCT_DECL):
-                        qualified_name = f"{parent.spelling}::{called_name}"
-                        
-                        # Add the direct call
-                        if caller_name in functions and qualified_name not in functions[caller_name].calls:
-                            functions[caller_name].calls.append(qualified_name)
-                            calls_found.add(qualified_name)
-            
-            # Approach 2: Alternative method to detect member function calls
-            # Look for member expressions followed by call expressions
-            elif child.kind == CursorKind.MEMBER_REF_EXPR:
-                # Get next sibling to check if it's a call
-                siblings = list(cursor.get_children())
-                try:
-                    idx = siblings.index(child)
-                    if idx < len(siblings) - 1 and siblings[idx + 1].kind == CursorKind.CALL_EXPR:
+                        # Add to callee's called_by
+                        callee = functions.get(called_name)
+                        if callee is not None and caller_name not in callee.called_by:
+                            callee.called_by.append(caller_name)
+            
+                # For virtual method calls or member function calls
+                # Try multiple approaches to capture method calls, regardless of libclang version
+            
+                # Approach 1: Use CXX_MEMBER_CALL_EXPR if available
+                if HAS_MEMBER_CALL_EXPR and kind == CursorKind.CXX_MEMBER_CALL_EXPR:
+                    # Try to resolve the virtual method call
+                    called_cursor = child.referenced
+                    if called_cursor and called_cursor.kind == CursorKind.CXX_METHOD:
+                        qualified_name, is_member = self._qualified_name(called_cursor)
+                        if is_member:
+                            # Add the direct call
+                            if caller is not None and qualified_name not in recorded_calls:
+                                recorded_calls.add(qualified_name)
+                                append_call(qualified_name)
+                                calls_found.add(qualified_name)
+            
+                # Approach 2: Alternative method to detect member function calls
+                # Look for member expressions followed by call expressions
+                elif kind == CursorKind.MEMBER_REF_EXPR:
+                    if next_sibling is not None and next_sibling.kind == CursorKind.CALL_EXPR:
                         # This is likely a member function call
                         member_name = child.spelling
                         if member_name:
@@ -980,19 +1373,19 @@ class ClangAnalyzerService:
                             if type_info and (not HAS_INVALID_TYPE or type_info.kind != INVALID_TYPE):
                                 type_name = type_info.spelling
                                 # Extract class name from type (e.g., "Class::*" -> "Class")
-                                class_name = type_name.split("::")[0] if "::" in type_name else ""
+                                class_name = type_name.partition("::")[0] if "::" in type_name else ""
                                 if class_name:
                                     qualified_name = f"{class_name}::{member_name}"
-                                    
+                                
                                     # Add the call
-                                    if caller_name in functions and qualified_name not in functions[caller_name].calls:
-                                        functions[caller_name].calls.append(qualified_name)
+                                    if caller is not None and qualified_name not in recorded_calls:
+                                        recorded_calls.add(qualified_name)
+                                        append_call(qualified_name)
                                         calls_found.add(qualified_name)
-                except (ValueError, IndexError):
-                    pass
             
-            # Recursively check child nodes
-            self._find_function_calls(child, caller_name, functions)
+            # Check child nodes next, unless none can hold a call
+            if kind not in CALL_FREE_KINDS:
+                push_children(child)
             
         # Second pass: Use pattern matching for detecting function calls
         # This is particularly useful when AST-based detection misses some calls
@@ -1010,12 +1403,14 @@ class ClangAnalyzerService:
                 continue
                 
             # Add to caller's calls
-            if caller_name in functions and qualified_name not in functions[caller_name].calls:
-                functions[caller_name].calls.append(qualified_name)
+            if caller is not None and qualified_name not in recorded_calls:
+                recorded_calls.add(qualified_name)
+                append_call(qualified_name)
                 
             # See if this is a known function and update its called_by
-            if qualified_name in functions and caller_name not in functions[qualified_name].called_by:
-                functions[qualified_name].called_by.append(caller_name)
+            callee = functions.get(qualified_name)
+            if callee is not None and caller_name not in callee.called_by:
+                callee.called_by.append(caller_name)
                 
         # Find all regular function calls (not qualified with ::)
         # Careful with this pattern to avoid false positives
@@ -1032,101 +1427,220 @@ class ClangAnalyzerService:
                 continue
                 
             # Add to caller's calls
-            if caller_name in functions and func_name not in functions[caller_name].calls:
-                functions[caller_name].calls.append(func_name)
+            if caller is not None and func_name not in recorded_calls:
+                recorded_calls.add(func_name)
+                append_call(func_name)
                 
             # See if this is a known function and update its called_by
-            if func_name in functions and caller_name not in functions[func_name].called_by:
-                functions[func_name].called_by.append(caller_name)
+            callee = functions.get(func_name)
+            if callee is not None and caller_name not in callee.called_by:
+                callee.called_by.append(caller_name)
+    
+    def collect_paths(self, root: str, file_extensions: List[str] = None) -> List[str]:
+        """
+        Collect all C/C++ files under a directory in a single iterative walk.
+        
+        Args:
+            root: Directory to search
+            file_extensions: File extensions to include (default: DEFAULT_SOURCE_EXTENSIONS)
+            
+        Returns:
+            Sorted list of matching file paths
+        """
+        extensions = tuple(file_extensions) if file_extensions else DEFAULT_SOURCE_EXTENSIONS
+        paths = []
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.name.endswith(extensions) and entry.is_file():
+                            paths.append(entry.path)
+            except OSError as e:
+                print(f"Error reading directory {directory}: {e}")
+        
+        paths.sort()
+        return paths
+    
+    def _add_file_call_graph(self, call_graph: CallGraph, file_call_graph: CallGraph) -> None:
+        """Merge the call graph of one file into the directory call graph.
+        
+        Args:
+            call_graph: Directory call graph to merge into
+            file_call_graph: Call graph of a single file
+        """
+        for func_name, func in file_call_graph.functions.items():
+            if func_name in call_graph.functions:
+                # Function already exists, merge calls
+                existing_func = call_graph.functions[func_name]
+                
+                # Merge calls
+                for called in func.calls:
+                    existing_func.add_call(called)
+                    
+                # Merge called_by
+                for caller in func.called_by:
+                    existing_func.add_caller(caller)
+                    
+                # Merge specializations
+                if func.is_template and func.specializations:
+                    for spec in func.specializations:
+                        existing_func.add_specialization(spec)
+                        
+                # Merge overrides
+                if func.is_virtual and func.overrides:
+                    for override in func.overrides:
+                        existing_func.add_override(override)
+            else:
+                # New function, add to call graph
+                call_graph.add_function(func)
+        
+        # Merge missing functions
+        for missing in file_call_graph.missing_functions:
+            call_graph.add_missing_function(missing)
     
     def analyze_directory(self, directory_path: str, project_name: str = "default", 
                        clear: bool = False, file_extensions: List[str] = None,
-                       max_workers: int = 4) -> CallGraph:
+                       max_workers: int = 4, include_dirs: List[str] = None,
+                       compiler_args: List[str] = None, use_parallel: bool = None) -> CallGraph:
         """
         Analyze all C/C++ files in a directory recursively.
         
+        All file paths are collected first, then analyzed in batches of
+        FILES_PER_TASK by a pool of worker processes, so large directories
+        are spread evenly across the workers. The merged call graph holds every
+        file's functions at once; iter_analyze_directory yields the per-file
+        call graphs instead, as soon as each file is analyzed.
+        
         Args:
             directory_path: Path to the directory to analyze
             project_name: Project name for indexing
             clear: Whether to clear existing project data
-            file_extensions: List of file extensions to analyze (default: ['.c', '.cpp', '.cxx', '.cc', '.h', '.hpp', '.hxx', '.hh'])
-            max_workers: Maximum number of parallel workers for processing
+            file_extensions: List of file extensions to analyze (default: DEFAULT_SOURCE_EXTENSIONS)
+            max_workers: Maximum number of worker processes; 1 analyzes files in this process
+            include_dirs: List of include directories
+            compiler_args: Additional compiler arguments
+            use_parallel: Deprecated and ignored; analysis is parallel unless max_workers is 1
             
         Returns:
             Call graph for all files in the directory
         """
-        if file_extensions is None:
-            file_extensions = ['.c', '.cpp', '.cxx', '.cc', '.h', '.hpp', '.hxx', '.hh']
-            
         call_graph = CallGraph()
+        for file_call_graph in self.iter_analyze_directory(directory_path, file_extensions, max_workers,
+                                                           include_dirs, compiler_args):
+            self._add_file_call_graph(call_graph, file_call_graph)
+        return call_graph
+    
+    def analyze_directory_to_shard(self, directory_path: str, shard_dir: str,
+                                   file_extensions: List[str] = None, max_workers: int = 4,
+                                   include_dirs: List[str] = None,
+                                   compiler_args: List[str] = None) -> Dict[str, int]:
+        """
+        Analyze all C/C++ files in a directory and stream the call graph to a shard.
         
-        # Find all files to analyze
-        files_to_analyze = []
-        for root, _, files in os.walk(directory_path):
-            for file in files:
-                if any(file.endswith(ext) for ext in file_extensions):
-                    files_to_analyze.append(os.path.join(root, file))
+        Each file's call graph is written out as soon as it is analyzed, so the
+        merged graph is never held in memory. See src.services.call_graph_shard.
         
+        Args:
+            directory_path: Path to the directory to analyze
+            shard_dir: Directory to write the shard files to
+            file_extensions: List of file extensions to analyze (default: DEFAULT_SOURCE_EXTENSIONS)
+            max_workers: Maximum number of worker processes; 1 analyzes files in this process
+            include_dirs: List of include directories
+            compiler_args: Additional compiler arguments
+            
+        Returns:
+            Dictionary with the number of nodes and edges written
+        """
+        from src.services.call_graph_shard import CallGraphShardWriter
+        
+        with CallGraphShardWriter(shard_dir) as writer:
+            for file_call_graph in self.iter_analyze_directory(directory_path, file_extensions, max_workers,
+                                                               include_dirs, compiler_args):
+                writer.add_call_graph(file_call_graph)
+        return {"nodes": writer.node_count, "edges": writer.edge_count}
+    
+    def iter_analyze_directory(self, directory_path: str, file_extensions: List[str] = None,
+                               max_workers: int = 4, include_dirs: List[str] = None,
+                               compiler_args: List[str] = None):
+        """Analyze the files of a directory, yielding each file's call graph as it completes.
+        
+        All file paths are collected first, then analyzed by iter_analyze_files.
+        
+        Args:
+            directory_path: Path to the directory to analyze
+            file_extensions: List of file extensions to analyze
+            max_workers: Maximum number of worker processes; 1 analyzes files in this process
+            include_dirs: List of include directories
+            compiler_args: Additional compiler arguments
+            
+        Returns:
+            Iterator over the call graph of each successfully analyzed file
+        """
+        # Find all files to analyze
+        files_to_analyze = self.collect_paths(directory_path, file_extensions)
         print(f"Found {len(files_to_analyze)} files to analyze")
+        return self.iter_analyze_files(files_to_analyze, max_workers, include_dirs, compiler_args)
+    
+    def iter_analyze_files(self, file_paths: List[str], max_workers: int = 4,
+                           include_dirs: List[str] = None, compiler_args: List[str] = None):
+        """Analyze a list of files, yielding each file's call graph as it completes.
+        
+        Files are analyzed in batches of FILES_PER_TASK by a pool of worker
+        processes, each with its own libclang index. Files that fail to analyze
+        are reported and skipped.
+        
+        Args:
+            file_paths: Files to analyze
+            max_workers: Maximum number of worker processes; 1 analyzes files in this process
+            include_dirs: List of include directories
+            compiler_args: Additional compiler arguments
+            
+        Yields:
+            Call graph of each successfully analyzed file
+        """
+        total_files = len(file_paths)
+        processed_files = 0
         
-        # Use ThreadPoolExecutor for parallel processing
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit file analysis tasks
-            future_to_file = {
-                executor.submit(self.analyze_file, file_path): file_path
-                for file_path in files_to_analyze
-            }
-            
-            # Process completed tasks as they complete
-            total_files = len(files_to_analyze)
-            processed_files = 0
-            
-            for future in concurrent.futures.as_completed(future_to_file):
-                file_path = future_to_file[future]
+        if max_workers <= 1:
+            for file_path in file_paths:
                 processed_files += 1
-                
                 try:
-                    file_call_graph = future.result()
-                    
-                    # Merge file call graph into main call graph
-                    for func_name, func in file_call_graph.functions.items():
-                        if func_name in call_graph.functions:
-                            # Function already exists, merge calls
-                            existing_func = call_graph.functions[func_name]
-                            
-                            # Merge calls
-                            for called in func.calls:
-                                existing_func.add_call(called)
-                                
-                            # Merge called_by
-                            for caller in func.called_by:
-                                existing_func.add_caller(caller)
-                                
-                            # Merge specializations
-                            if func.is_template and func.specializations:
-                                for spec in func.specializations:
-                                    existing_func.add_specialization(spec)
-                                    
-                            # Merge overrides
-                            if func.is_virtual and func.overrides:
-                                for override in func.overrides:
-                                    existing_func.add_override(override)
-                        else:
-                            # New function, add to call graph
-                            call_graph.add_function(func)
-                    
-                    # Merge missing functions
-                    for missing in file_call_graph.missing_functions:
-                        call_graph.add_missing_function(missing)
-                        
-                    # Print progress
-                    print(f"Processed {processed_files}/{total_files} files: {file_path}")
-                        
+                    file_call_graph = self.analyze_file(file_path, include_dirs=include_dirs,
+                                                        compiler_args=compiler_args)
                 except Exception as e:
                     print(f"Error analyzing file {file_path}: {e}")
+                    continue
+                logger.debug("Processed %d/%d files: %s", processed_files, total_files, file_path)
+                yield file_call_graph
+            print(f"Processed {processed_files} files")
+            return
         
-        return call_graph
+        # libclang objects cannot be shared between processes, so each worker
+        # process creates its own analyzer
+        batches = [file_paths[i:i + FILES_PER_TASK]
+                   for i in range(0, total_files, FILES_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_analyze_files_worker, batch, include_dirs, compiler_args, self.libclang_path,
+                                self.ast_cache_dir, self.keep_translation_units, self.max_live_units)
+                for batch in batches
+            ]
+            
+            # Process completed batches as they complete
+            for future in as_completed(futures):
+                for file_path, file_call_graph, error in future.result():
+                    processed_files += 1
+                    if error is not None:
+                        print(f"Error analyzing file {file_path}: {error}")
+                        continue
+                    
+                    logger.debug("Processed %d/%d files: %s", processed_files, total_files, file_path)
+                    yield file_call_graph
+        print(f"Processed {processed_files} files")
     
     def incremental_analyze_directory(self, directory_path: str, project_name: str = "default",
                                    file_extensions: List[str] = None, 
@@ -1138,22 +1652,15 @@ class ClangAnalyzerService:
             directory_path: Path to the directory to analyze
             project_name: Project name for indexing
             file_extensions: List of file extensions to analyze
-            max_workers: Maximum number of parallel workers for processing
+            max_workers: Maximum number of worker processes; 1 analyzes files in this process
             
         Returns:
             Tuple of (call graph for changed files, list of changed file paths)
         """
-        if file_extensions is None:
-            file_extensions = ['.c', '.cpp', '.cxx', '.cc', '.h', '.hpp', '.hxx', '.hh']
-            
         call_graph = CallGraph()
         
         # Find all files to analyze
-        all_files = []
-        for root, _, files in os.walk(directory_path):
-            for file in files:
-                if any(file.endswith(ext) for ext in file_extensions):
-                    all_files.append(os.path.join(root, file))
+        all_files = self.collect_paths(directory_path, file_extensions)
         
         # Use Neo4jService to get indexed files
         from src.services.neo4j_service import Neo4jService
@@ -1210,39 +1717,9 @@ class ClangAnalyzerService:
         
         print(f"Found {len(changed_files)} changed files out of {len(all_files)} total files")
         
-        # Use ThreadPoolExecutor for parallel processing
-        import concurrent.futures
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit file analysis tasks
-            future_to_file = {
-                executor.submit(self.analyze_file, file_path): file_path
-                for file_path in changed_files
-            }
-            
-            # Process completed tasks as they complete
-            total_files = len(changed_files)
-            processed_files = 0
-            
-            for future in concurrent.futures.as_completed(future_to_file):
-                file_path = future_to_file[future]
-                processed_files += 1
-                
-                try:
-                    file_call_graph = future.result()
-                    
-                    # Merge file call graph into main call graph
-                    for func_name, func in file_call_graph.functions.items():
-                        call_graph.add_function(func)
-                    
-                    # Merge missing functions
-                    for missing in file_call_graph.missing_functions:
-                        call_graph.add_missing_function(missing)
-                        
-                    # Print progress
-                    print(f"Processed {processed_files}/{total_files} changed files: {file_path}")
-                        
-                except Exception as e:
-                    print(f"Error analyzing file {file_path}: {e}")
+        # Each worker process parses with its own libclang index
+        for file_call_graph in self.iter_analyze_files(changed_files, max_workers):
+            self._add_file_call_graph(call_graph, file_call_graph)
         
         return call_graph, changed_files
     
@@ -1307,14 +1784,13 @@ class ClangAnalyzerService:
         for missing in source.missing_functions:
             target.add_missing_function(missing)
     
-    def _analyze_advanced_templates(self, cursor: Cursor, functions: Dict[str, Function], file_path: str) -> None:
+    def _analyze_advanced_templates(self, nodes: List[Cursor], functions: Dict[str, Function]) -> None:
         """
         Analyze advanced template metaprogramming features.
         
         Args:
-            cursor: Current cursor in the AST
+            nodes: Nodes of the source file in pre-order, from _file_nodes
             functions: Dictionary of functions
-            file_path: Path to the source file
         """
         # First check for any is_same specializations - make a copy for safe iteration
         functions_to_check = list(functions.items())
@@ -1339,10 +1815,8 @@ class ClangAnalyzerService:
                     # Add to the primary template's specializations
                     func.add_specialization(spec_name)
         
-        def process_template_node(node, function_name=None):
-            """Process a template-related node to extract advanced features."""
-            if node.location.file and node.location.file.name != file_path:
-                return
+        # Process template-related nodes to extract advanced features
+        for node in nodes:
                 
             # Analyze template declarations
             if node.kind in [CursorKind.FUNCTION_TEMPLATE, CursorKind.CLASS_TEMPLATE]:
@@ -1375,8 +1849,7 @@ class ClangAnalyzerService:
                         # Collect dependent names
                         for token in param_tokens:
                             if "::" in token:  # likely a dependent name
-                                parts = token.split("::")
-                                if len(parts) > 1 and parts[0] in template_params:
+                                if token.partition("::")[0] in template_params:
                                     if curr_func_name and curr_func_name in functions:
                                         functions[curr_func_name].dependent_names.append(token)
                     
@@ -1388,9 +1861,8 @@ class ClangAnalyzerService:
                         template_template_params.append(param_name)
                         
                         # Get full template template parameter definition
-                        param_tokens = [t.spelling for t in child.get_tokens()]
-                        if param_tokens and len(param_tokens) > 2:
-                            full_param = " ".join(param_tokens)
+                        full_param = self._cursor_source(child)
+                        if full_param and full_param != param_name:
                             template_template_params[-1] = full_param
                 
                 # Update function details if found
@@ -1450,17 +1922,6 @@ class ClangAnalyzerService:
                                     dependent_name = match
                                 if dependent_name not in func.dependent_names:
                                     func.dependent_names.append(dependent_name)
-                
-            # Process children recursively
-            for child in node.get_children():
-                # Pass function name down if we're in a function template
-                if node.kind == CursorKind.FUNCTION_TEMPLATE:
-                    process_template_node(child, node.spelling)
-                else:
-                    process_template_node(child, function_name)
-        
-        # Start processing from the root
-        process_template_node(cursor)
     
     def _detect_metafunction(self, node: Cursor, func: Function) -> None:
         """
@@ -2102,7 +2563,7 @@ class ClangAnalyzerService:
             # Check dependent names for metafunction usage
             for dep_name in func.dependent_names:
                 # Check if the dependent name is a metafunction
-                base_dep = dep_name.split('::')[0] if '::' in dep_name else dep_name
+                base_dep = dep_name.partition('::')[0]
                 if base_dep in metafunctions:
                     # Add a call relationship
                     func.add_call(base_dep)
@@ -2189,4 +2650,46 @@ class ClangAnalyzerService:
         # Example:
         # helixdb_service.add_node('File', {...})
         # helixdb_service.add_relationship(...)
-        # ... existing code ...
\ No newline at end of file
+        # ... existing code ...
+
+
+# Analyzer of the current worker process, created by its first task
+_worker_analyzer = None
+
+
+def _analyze_files_worker(file_paths: List[str], include_dirs: List[str] = None,
+                          compiler_args: List[str] = None,
+                          libclang_path: str = None, ast_cache_dir: Optional[str] = CLANG_AST_CACHE_DIR,
+                          keep_translation_units: bool = False,
+                          max_live_units: int = MAX_LIVE_TRANSLATION_UNITS
+                          ) -> List[Tuple[str, Optional[CallGraph], Optional[str]]]:
+    """Analyze a batch of files in a worker process of iter_analyze_files.
+    
+    Args:
+        file_paths: Files to analyze
+        include_dirs: List of include directories
+        compiler_args: Additional compiler arguments
+        libclang_path: Optional path to libclang
+        ast_cache_dir: Translation unit cache directory of the parent analyzer
+        keep_translation_units: keep_translation_units of the parent analyzer
+        max_live_units: max_live_units of the parent analyzer
+        
+    Returns:
+        (file path, call graph, error message) for each file; the call graph is
+        None and the error message set when the file could not be analyzed
+    """
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        _worker_analyzer = ClangAnalyzerService(libclang_path, ast_cache_dir=ast_cache_dir,
+                                                keep_translation_units=keep_translation_units,
+                                                max_live_units=max_live_units)
+    
+    results = []
+    for file_path in file_paths:
+        try:
+            file_call_graph = _worker_analyzer.analyze_file(file_path, include_dirs=include_dirs,
+                                                            compiler_args=compiler_args)
+            results.append((file_path, file_call_graph, None))
+        except Exception as e:
+            results.append((file_path, None, str(e)))
+    return results
@@ -312,9 +312,7 @@ class ClassHierarchyService:
         # 对每个类方法，添加类层次结构信息
         for func_name, func in functions.items():
             if "::" in func_name:  # 类方法
-                parts = func_name.split("::")
-                class_name = "::".join(parts[:-1])  # 处理嵌套命名空间
-                method_name = parts[-1]
+                class_name, _, method_name = func_name.rpartition("::")  # 处理嵌套命名空间
                 
                 # 设置类名
                 func.class_name = class_name
@@ -353,9 +351,7 @@ class ClassHierarchyService:
             
             for called_func in func.calls:
                 if "::" in called_func:  # 可能是类方法调用
-                    parts = called_func.split("::")
-                    class_name = "::".join(parts[:-1])
-                    method_name = parts[-1]
+                    class_name, _, method_name = called_func.rpartition("::")
                     
                     # 检查是否是虚函数调用
                     if class_name in self.class_hierarchy.classes:
@@ -8,6 +8,9 @@ import platform
 from typing import List, Dict, Set, Optional, Tuple
 import logging
 
+# C++源文件扩展名（元组形式，可直接传给str.endswith）
+CXX_SOURCE_EXTENSIONS = ('.cpp', '.cc', '.cxx', '.c++')
+
 class CompileCommandsService:
     """用于解析compile_commands.json文件并提取编译选项的服务。"""
     
@@ -218,7 +221,7 @@ class CompileCommandsService:
             filtered_options.append(opt)
         
         # 添加文件类型
-        if file_path.endswith('.cpp') or file_path.endswith('.cc') or file_path.endswith('.cxx'):
+        if file_path.endswith(CXX_SOURCE_EXTENSIONS):
             filtered_options.append('-xc++')
         elif file_path.endswith('.c'):
             filtered_options.append('-xc')
@@ -1,32 +1,196 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
 import faiss
 import numpy as np
 from src.utils.scanner import scan_files
 from src.utils.parser import parse_code_blocks
 from src.utils.embedder import CodeEmbedder
 
+INDEX_DIR_NAME = ".embedding_index"
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+# Corpora with at least this many blocks are PCA-reduced and product-quantized;
+# smaller ones use an HNSW graph over 8-bit scalar-quantized vectors
+IVFPQ_MIN_VECTORS = 10000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+PCA_DIM = 128
+IVF_NLIST = 256
+IVF_NPROBE = 16
+PQ_M = 16
+PQ_NBITS = 8
+
+
 class EmbeddingIndexService:
-    def __init__(self, project_dir, model_name='microsoft/codebert-base'):
+    def __init__(self, project_dir, model_name='microsoft/codebert-base', index_dir=None):
         self.project_dir = project_dir
-        self.embedder = CodeEmbedder(model_name)
+        self.model_name = model_name
+        self.index_dir = index_dir or os.path.join(project_dir, INDEX_DIR_NAME)
+        self._embedder = None
         self.index = None
         self.meta = []
+        self.vectors = None
+        self.file_mtimes: Dict[str, float] = {}
+
+    @property
+    def embedder(self) -> CodeEmbedder:
+        """Load the embedding model on first use, so opening a saved index stays cheap."""
+        if self._embedder is None:
+            self._embedder = CodeEmbedder(self.model_name)
+        return self._embedder
+
+    def _embed_files(self, files: List[str]):
+        vectors = []
+        meta = []
+        for file in files:
+            for block in parse_code_blocks(file):
+                vectors.append(self.embedder.embed_code(block['code']))
+                meta.append(block)
+        return vectors, meta
+
+    def _build_faiss_index(self, vectors: np.ndarray):
+        """
+        Build an approximate nearest-neighbour index over the vectors.
+
+        Vectors are L2-normalized first, so distances rank by cosine similarity.
+        Small corpora get an HNSW graph over 8-bit scalar-quantized vectors, which
+        visits a few hundred vectors per query instead of scanning all of them.
+        Large ones are PCA-reduced to PCA_DIM dimensions and stored as IVF-PQ codes; the
+        PCA matrix is part of the index, so queries are transformed by faiss itself.
+        """
+        vectors = np.array(vectors, dtype='float32')
+        faiss.normalize_L2(vectors)
+        dim = vectors.shape[1]
+        if len(vectors) < IVFPQ_MIN_VECTORS or dim <= PCA_DIM:
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, HNSW_M)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        else:
+            pca = faiss.PCAMatrix(dim, PCA_DIM)
+            ivfpq = faiss.IndexIVFPQ(faiss.IndexFlatL2(PCA_DIM), PCA_DIM, IVF_NLIST, PQ_M, PQ_NBITS)
+            ivfpq.nprobe = IVF_NPROBE
+            index = faiss.IndexPreTransform(pca, ivfpq)
+        index.train(vectors)
+        index.add(vectors)
+        return index
+
+    def _set_vectors(self, vectors: np.ndarray, meta: List[Dict[str, Any]]) -> None:
+        self.vectors = vectors
+        self.meta = meta
+        self.index = self._build_faiss_index(vectors) if len(meta) else None
 
     def build_index(self):
         files = scan_files(self.project_dir)
-        blocks = []
-        for file in files:
-            code_blocks = parse_code_blocks(file)
-            for block in code_blocks:
-                embedding = self.embedder.embed_code(block['code'])
-                blocks.append((embedding, block))
-        if blocks:
-            dim = blocks[0][0].shape[0]
-            self.index = faiss.IndexFlatL2(dim)
-            for emb, meta in blocks:
-                self.index.add(np.array([emb]).astype('float32'))
-                self.meta.append(meta)
-
-    def search(self, query, topk=5):
-        query_vec = self.embedder.embed_code(query)
-        D, I = self.index.search(np.array([query_vec]).astype('float32'), topk)
-        return [(self.meta[i], float(D[0][idx])) for idx, i in enumerate(I[0])] 
\ No newline at end of file
+        vectors, meta = self._embed_files(files)
+        self.file_mtimes = {file: os.path.getmtime(file) for file in files}
+        if vectors:
+            self._set_vectors(np.array(vectors).astype('float32'), meta)
+        else:
+            self._set_vectors(np.zeros((0, 0), dtype='float32'), [])
+
+    def save(self, index_dir: Optional[str] = None) -> None:
+        """Write the index, raw vectors, block metadata and a file→mtime manifest to disk."""
+        index_dir = index_dir or self.index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        if self.index is not None:
+            faiss.write_index(self.index, os.path.join(index_dir, INDEX_FILE))
+        np.save(os.path.join(index_dir, VECTORS_FILE), self.vectors)
+        with open(os.path.join(index_dir, META_FILE), 'w', encoding='utf-8') as f:
+            for block in self.meta:
+                f.write(json.dumps(block, ensure_ascii=False) + '\n')
+        with open(os.path.join(index_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'model_name': self.model_name, 'files': self.file_mtimes}, f)
+
+    def _read_manifest(self, index_dir: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(index_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, index_dir: Optional[str] = None) -> None:
+        """Open a saved index; vectors are memory-mapped rather than read into memory."""
+        index_dir = index_dir or self.index_dir
+        manifest = self._read_manifest(index_dir) or {}
+        self.file_mtimes = manifest.get('files', {})
+        with open(os.path.join(index_dir, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = [json.loads(line) for line in f if line.strip()]
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode='r')
+        index_path = os.path.join(index_dir, INDEX_FILE)
+        if not self.meta or not os.path.exists(index_path):
+            self.index = None
+            return
+        try:
+            self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            # Not every index type can be memory-mapped
+            self.index = faiss.read_index(index_path)
+
+    def load_or_build(self) -> None:
+        """
+        Load the saved index, re-embedding only files added or modified since it was saved.
+
+        Falls back to a full build when no usable index exists, it was built with a
+        different model, or its files are unreadable or inconsistent with each other.
+        The refreshed index is saved back to disk.
+        """
+        files = scan_files(self.project_dir)
+        mtimes = {file: os.path.getmtime(file) for file in files}
+        manifest = self._read_manifest(self.index_dir)
+        usable = bool(manifest) and manifest.get('model_name') == self.model_name
+        if usable:
+            try:
+                self.load()
+                usable = len(self.meta) == self.vectors.shape[0]
+            except (OSError, ValueError, RuntimeError):
+                # Missing or truncated files, e.g. from an interrupted save
+                usable = False
+        if not usable:
+            self.build_index()
+            self.save()
+            return
+
+        old_mtimes = manifest.get('files', {})
+        if old_mtimes == mtimes:
+            return
+
+        changed = [file for file in files if old_mtimes.get(file) != mtimes[file]]
+        keep = [i for i, block in enumerate(self.meta)
+                if block['file'] in mtimes and old_mtimes.get(block['file']) == mtimes[block['file']]]
+        new_vectors, new_meta = self._embed_files(changed)
+
+        parts = []
+        if keep:
+            parts.append(np.asarray(self.vectors[keep], dtype='float32'))
+        if new_vectors:
+            parts.append(np.array(new_vectors).astype('float32'))
+        meta = [self.meta[i] for i in keep] + new_meta
+        self.file_mtimes = mtimes
+        if parts:
+            self._set_vectors(np.vstack(parts), meta)
+        else:
+            self._set_vectors(np.zeros((0, 0), dtype='float32'), [])
+        self.save()
+
+    def fingerprint(self) -> str:
+        """Stable digest of the indexed file versions, changing whenever the index content does."""
+        data = json.dumps([self.model_name, sorted(self.file_mtimes.items())])
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def search(self, query, topk=5, ef_search=None):
+        """Return the topk closest blocks; ef_search trades HNSW recall for latency."""
+        if self.index is None:
+            return []
+        if ef_search and hasattr(self.index, 'hnsw'):
+            self.index.hnsw.efSearch = ef_search
+        query_vec = np.array([self.embedder.embed_code(query)]).astype('float32')
+        faiss.normalize_L2(query_vec)
+        D, I = self.index.search(query_vec, topk)
+        return [(self.meta[i], float(D[0][idx])) for idx, i in enumerate(I[0]) if i >= 0]
@@ -3,8 +3,7 @@ from src.utils.scanner import scan_files
 from src.utils.parser import parse_code_blocks
 from src.utils.embedder import CodeEmbedder
 from src.services.helixdb_service import HelixDBService
-from src.services.clang_analyzer_service import ClangAnalyzerService
-from src.models.function_model import Function, CallGraph
+from src.services.clang_analyzer_service import ClangAnalyzerService, DEFAULT_SOURCE_EXTENSIONS
 import numpy as np
 
 class IntegratedIndexService:
@@ -70,7 +69,8 @@ class IntegratedIndexService:
         helixdb_service: HelixDBService = None,
         file_extensions: List[str] = None,
         include_dirs: List[str] = None,
-        compiler_args: List[str] = None
+        compiler_args: List[str] = None,
+        max_workers: int = 4
     ) -> None:
         """
         Build code embeddings and store AST/call graph metadata in HelixDB for all C/C++ files in the project directory.
@@ -81,21 +81,24 @@ class IntegratedIndexService:
             file_extensions: List of file extensions to analyze.
             include_dirs: List of include directories.
             compiler_args: Additional compiler arguments.
+            max_workers: Number of worker processes parsing files in parallel; 1 parses in this process.
         """
         if helixdb_service is None:
             helixdb_service = HelixDBService()
         if file_extensions is None:
-            file_extensions = [".c", ".cpp", ".cxx", ".cc", ".h", ".hpp", ".hxx", ".hh"]
+            file_extensions = DEFAULT_SOURCE_EXTENSIONS
 
         files = scan_files(self.project_dir, exts=tuple(file_extensions))
         all_functions: List[Dict[str, Any]] = []
 
-        for file in files:
-            call_graph: CallGraph = clang_analyzer.analyze_file(
-                file,
-                include_dirs=include_dirs,
-                compiler_args=compiler_args
-            )
+        # Files are parsed by a process pool; embedding stays in this process
+        clang_analyzer = ClangAnalyzerService()
+        for call_graph in clang_analyzer.iter_analyze_files(
+            files,
+            max_workers=max_workers,
+            include_dirs=include_dirs,
+            compiler_args=compiler_args
+        ):
             for func in call_graph.functions.values():
                 # Only embed if function body is available
                 if func.body:
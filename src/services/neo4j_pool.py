@@ -0,0 +1,108 @@
+"""
+Process-wide Neo4j service pool.
+
+Commands share one Neo4jService (and therefore one driver and connection
+pool) per URI and user instead of opening a new driver each time.
+"""
+import atexit
+import functools
+from typing import Any, Dict, List
+
+from src.services.neo4j_service import Neo4jService
+from src.config.settings import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+
+# Indexes that let MERGE and lookups on Function nodes use index seeks
+FUNCTION_INDEX_STATEMENTS = [
+    "CREATE INDEX function_project_name IF NOT EXISTS FOR (f:Function) ON (f.project, f.name)",
+    "CREATE INDEX function_file_path IF NOT EXISTS FOR (f:Function) ON (f.file_path)",
+    "CREATE INDEX function_name IF NOT EXISTS FOR (f:Function) ON (f.name)",
+]
+
+# Call chain traversals; the depth has to be written into the variable-length
+# pattern because Cypher does not accept a parameter there
+CALL_CHAIN_PATTERNS = {
+    "callers": "MATCH (node:Function)-[:CALLS*1..{depth}]->(f:Function {{name: $name, project: $project}}) "
+               "RETURN DISTINCT node",
+    "callees": "MATCH (f:Function {{name: $name, project: $project}})-[:CALLS*1..{depth}]->(node:Function) "
+               "RETURN DISTINCT node",
+}
+
+
+@functools.lru_cache(maxsize=4)
+def get_neo4j_service(
+    uri: str = NEO4J_URI,
+    user: str = NEO4J_USER,
+    password: str = NEO4J_PASSWORD
+) -> Neo4jService:
+    """
+    Get the shared Neo4jService for a connection, creating it on first use.
+
+    The service is closed automatically when the process exits.
+
+    Args:
+        uri: Neo4j connection URI
+        user: Neo4j username
+        password: Neo4j password
+
+    Returns:
+        The shared Neo4jService instance
+    """
+    service = Neo4jService(uri=uri, username=user, password=password)
+    atexit.register(service.close)
+    return service
+
+
+def ensure_function_indexes(service: Neo4jService) -> None:
+    """
+    Create the Function node indexes if they do not exist yet.
+    
+    Runs at most once per service instance.
+    
+    Args:
+        service: The Neo4j service to create the indexes with
+    """
+    if getattr(service, "function_indexes_ready", False):
+        return
+    with service.driver.session() as session:
+        for statement in FUNCTION_INDEX_STATEMENTS:
+            try:
+                session.run(statement).consume()
+            except Exception as e:
+                print(f"Could not create index: {e}")
+    service.function_indexes_ready = True
+
+
+@functools.lru_cache(maxsize=16)
+def call_chain_query(direction: str, depth: int) -> str:
+    """
+    Build the traversal query for a direction and depth.
+
+    Args:
+        direction: "callers" or "callees"
+        depth: Maximum number of CALLS hops
+
+    Returns:
+        The Cypher query, returning the reached functions as column "node"
+    """
+    return CALL_CHAIN_PATTERNS[direction].format(depth=max(1, int(depth)))
+
+
+def find_call_chain(service: Neo4jService, direction: str, function_name: str,
+                    project_name: str, depth: int = 1) -> List[Dict[str, Any]]:
+    """
+    Find all callers or callees of a function up to a depth in one round trip.
+
+    Args:
+        service: The Neo4j service to query with
+        direction: "callers" or "callees"
+        function_name: Name of the function to start from
+        project_name: Project the function belongs to
+        depth: Maximum number of CALLS hops
+
+    Returns:
+        Property dicts of the reached functions
+    """
+    ensure_function_indexes(service)
+    with service.driver.session() as session:
+        result = session.run(call_chain_query(direction, depth), name=function_name, project=project_name)
+        return [dict(record["node"]) for record in result]
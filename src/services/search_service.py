@@ -1,12 +1,33 @@
 """
 Search service for finding functions in codebase
 """
+import functools
+import heapq
 import os
 import re
+from contextlib import contextmanager
 from typing import List, Dict, Set, Optional, Tuple, Any
 
 from src.services.neo4j_service import Neo4jService
+from src.services.neo4j_pool import find_call_chain
 from src.config.settings import DEFAULT_FILE_PATTERNS
+from src.utils.file_utils import compile_file_patterns
+
+
+# Relevance added when a keyword occurs in a function field, checked in this order
+RELEVANCE_WEIGHTS = (
+    ("name", 10),
+    ("signature", 5),
+    ("namespace", 3),
+    ("body", 2),
+)
+
+# Translation tables mapping query punctuation to spaces, applied in one pass
+CHINESE_PUNCTUATION_TABLE = str.maketrans(dict.fromkeys("，。！？；：''（）【】《》", " "))
+ENGLISH_PUNCTUATION_TABLE = str.maketrans(dict.fromkeys(",.!?;:\"'()[]{}", " "))
+
+# Whether the programming terms have been added to the jieba dictionary
+_jieba_terms_added = False
 
 
 class SearchService:
@@ -49,7 +70,7 @@ class SearchService:
             raise FileNotFoundError(f"Path {search_path} not found")
         
         results = {func: [] for func in function_names}
-        file_patterns = pattern.split(',')
+        file_matcher = compile_file_patterns(pattern)
         
         # Compile regex patterns for each function
         function_patterns = {}
@@ -68,7 +89,7 @@ class SearchService:
         else:
             for root, _, files in os.walk(search_path):
                 for file in files:
-                    if any(self._matches_pattern(file, p) for p in file_patterns):
+                    if file_matcher.match(file):
                         file_path = os.path.join(root, file)
                         self._search_file(file_path, function_patterns, results)
                         
@@ -85,7 +106,7 @@ class SearchService:
         Returns:
             List of caller function names
         """
-        callers = self.neo4j_service.find_callers(function_name, project_name, depth)
+        callers = find_call_chain(self.neo4j_service, "callers", function_name, project_name, depth)
         return [caller.get("name", "") for caller in callers]
     
     def find_callees(self, function_name: str, project_name: str, depth: int = 1) -> List[str]:
@@ -99,7 +120,7 @@ class SearchService:
         Returns:
             List of callee function names
         """
-        callees = self.neo4j_service.find_callees(function_name, project_name, depth)
+        callees = find_call_chain(self.neo4j_service, "callees", function_name, project_name, depth)
         return [callee.get("name", "") for callee in callees]
     
     def generate_function_stubs(self, function_names: List[str]) -> str:
@@ -169,16 +190,40 @@ int {func}(void) {{
         except Exception as e:
             print(f"Error searching file {file_path}: {e}")
     
-    def _matches_pattern(self, filename: str, pattern: str) -> bool:
-        """Check if a filename matches a glob pattern"""
-        pattern = pattern.replace("*", ".*").replace(".", "\\.")
-        pattern = f"^{pattern}$"
-        return bool(re.match(pattern, filename))
+    @classmethod
+    def tokenize(cls, query: str, lang: str = "en") -> List[str]:
+        """
+        Process a natural language query into keywords, reusing earlier results.
+        
+        The cache is shared by all SearchService instances.
+        
+        Args:
+            query: The natural language query
+            lang: Language of the query ('en' for English, 'zh' for Chinese)
+            
+        Returns:
+            List of processed keywords
+        """
+        return list(_tokenize_cached(query, lang))
     
     def _process_query(self, query: str, lang: str = "en") -> List[str]:
         """
         Process a natural language query into keywords.
         
+        Args:
+            query: The natural language query
+            lang: Language of the query ('en' for English, 'zh' for Chinese)
+            
+        Returns:
+            List of processed keywords
+        """
+        return self.tokenize(query, lang)
+    
+    @classmethod
+    def _tokenize(cls, query: str, lang: str = "en") -> List[str]:
+        """
+        Tokenize a query without caching; see tokenize.
+        
         Args:
             query: The natural language query
             lang: Language of the query ('en' for English, 'zh' for Chinese)
@@ -196,46 +241,48 @@ int {func}(void) {{
                 import jieba
                 
                 # Add programming domain terms to jieba dictionary
-                self._add_programming_terms_to_jieba()
+                cls._add_programming_terms_to_jieba()
                 
                 # Perform segmentation
                 words = list(jieba.cut(query))
                 
                 # Filter stopwords
-                stopwords = self._get_chinese_stopwords()
+                stopwords = cls._get_chinese_stopwords()
                 words = [w for w in words if w.strip() and w not in stopwords]
                 
                 # Map common Chinese programming terms to English
-                words = self._map_chinese_to_english_terms(words)
+                words = cls._map_chinese_to_english_terms(words)
                 
                 return words
             except ImportError:
                 print("Warning: jieba package not found. Using basic character splitting for Chinese.")
                 # Basic fallback: split by common punctuation
-                for char in "，。！？；：""''（）【】《》":
-                    query = query.replace(char, " ")
+                query = query.translate(CHINESE_PUNCTUATION_TABLE)
                 words = query.split()
                 return words
         else:
             # English processing
             # Remove punctuation
-            for char in ",.!?;:\"'()[]{}":
-                query = query.replace(char, " ")
+            query = query.translate(ENGLISH_PUNCTUATION_TABLE)
             
             # Split into words
             words = query.split()
             
             # Filter stopwords
-            stopwords = self._get_english_stopwords()
+            stopwords = cls._get_english_stopwords()
             words = [w for w in words if w.strip() and w not in stopwords]
             
             # Map programming domain synonyms
-            words = self._map_programming_synonyms(words)
+            words = cls._map_programming_synonyms(words)
             
             return words
     
-    def _add_programming_terms_to_jieba(self):
-        """Add programming domain terms to jieba dictionary."""
+    @staticmethod
+    def _add_programming_terms_to_jieba():
+        """Add programming domain terms to jieba dictionary (once per process)."""
+        global _jieba_terms_added
+        if _jieba_terms_added:
+            return
         try:
             import jieba
             
@@ -272,11 +319,16 @@ int {func}(void) {{
             
             for term, weight in terms:
                 jieba.add_word(term, weight)
+            
+            # Load the dictionary now rather than inside the first cut
+            jieba.initialize()
+            _jieba_terms_added = True
                 
         except ImportError:
             pass
     
-    def _get_chinese_stopwords(self) -> Set[str]:
+    @staticmethod
+    def _get_chinese_stopwords() -> Set[str]:
         """Get Chinese stopwords."""
         return {
             "的", "了", "和", "是", "就", "都", "而", "及", "与", "这", "那", "有", "在",
@@ -285,7 +337,8 @@ int {func}(void) {{
             "我", "你", "他", "她", "它", "们", "个", "某", "该"
         }
     
-    def _get_english_stopwords(self) -> Set[str]:
+    @staticmethod
+    def _get_english_stopwords() -> Set[str]:
         """Get English stopwords."""
         return {
             "a", "an", "the", "and", "or", "but", "if", "then", "else", "when",
@@ -304,7 +357,8 @@ int {func}(void) {{
             "I'll", "you'll", "he'll", "she'll", "we'll", "they'll"
         }
     
-    def _map_chinese_to_english_terms(self, words: List[str]) -> List[str]:
+    @staticmethod
+    def _map_chinese_to_english_terms(words: List[str]) -> List[str]:
         """Map Chinese programming terms to English equivalents."""
         term_mapping = {
             "函数": "function",
@@ -388,7 +442,8 @@ int {func}(void) {{
         
         return result
     
-    def _map_programming_synonyms(self, words: List[str]) -> List[str]:
+    @staticmethod
+    def _map_programming_synonyms(words: List[str]) -> List[str]:
         """Map programming domain synonyms to canonical terms."""
         # Map common programming synonyms
         synonym_mapping = {
@@ -636,8 +691,75 @@ int {func}(void) {{
         
         return result
     
+    # Matches functions where any keyword pattern matches the name, signature,
+    # namespace or body. The keywords are passed as $patterns, so the query text
+    # is the same for every description and Neo4j reuses its cached plan.
+    DESCRIPTION_MATCH = """
+            MATCH (f:Function {project: $project})
+            OPTIONAL MATCH (f)-[:HAS_CONTENT]->(tc:TextContent)
+            WHERE any(pattern IN $patterns WHERE
+                f.name =~ pattern OR f.signature =~ pattern OR f.namespace =~ pattern
+                OR (tc.content IS NOT NULL AND tc.content =~ pattern))
+            """
+    
+    def _keyword_patterns(self, keywords: List[str]) -> List[str]:
+        """
+        Build the case-insensitive substring patterns for DESCRIPTION_MATCH.
+        
+        Args:
+            keywords: Processed query keywords
+            
+        Returns:
+            One regular expression per keyword
+        """
+        return [f"(?i).*{re.escape(keyword)}.*" for keyword in keywords]
+    
+    @contextmanager
+    def _session(self, session=None):
+        """Yield the given session, or a new one that is closed afterwards."""
+        if session is not None:
+            yield session
+        else:
+            with self.neo4j_service.driver.session() as new_session:
+                yield new_session
+    
+    def _rank_functions(self, functions: List[Dict[str, Any]], keywords: List[str], limit: int) -> List[Dict[str, Any]]:
+        """
+        Score functions against the keywords and return the most relevant ones.
+        
+        Args:
+            functions: Function data returned by the description search
+            keywords: Processed query keywords
+            limit: Maximum number of results to return
+            
+        Returns:
+            Functions with relevance scores, highest first
+        """
+        for function in functions:
+            # Lowercase each field once rather than once per keyword
+            fields = [(field, weight, function[field].lower())
+                      for field, weight in RELEVANCE_WEIGHTS if function.get(field)]
+            
+            # Calculate relevance score
+            score = 0
+            matched_tokens = []
+            
+            for keyword in keywords:
+                for field, weight, text in fields:
+                    if keyword in text:
+                        score += weight
+                        if field == "name" or keyword not in matched_tokens:
+                            matched_tokens.append(keyword)
+            
+            # Add score and matched tokens to function data
+            function["relevance"] = score
+            function["matched_tokens"] = matched_tokens
+        
+        # Top results by relevance score (highest first, ties in query order)
+        return heapq.nlargest(limit, functions, key=lambda x: x["relevance"])
+    
     def search_by_description(self, description: str, project_name: str = "default", 
-                           limit: int = 10, lang: str = "en") -> List[Dict[str, Any]]:
+                           limit: int = 10, lang: str = "en", session=None) -> List[Dict[str, Any]]:
         """
         Search for functions matching a natural language description.
         
@@ -646,6 +768,7 @@ int {func}(void) {{
             project_name: Project to search in
             limit: Maximum number of results to return
             lang: Language of the description ('en' for English, 'zh' for Chinese)
+            session: Neo4j session to reuse (optional)
             
         Returns:
             List of matching function data with relevance scores
@@ -656,31 +779,15 @@ int {func}(void) {{
         if not keywords:
             return []
             
-        with self.neo4j_service.driver.session() as session:
-            # Build a Cypher query to search for functions matching any of the keywords
-            keyword_conditions = []
-            for keyword in keywords:
-                # Escape special characters for regex pattern
-                escaped_keyword = re.escape(keyword)
-                # For each keyword, check several fields
-                keyword_conditions.append(f"f.name =~ '(?i).*{escaped_keyword}.*'")
-                keyword_conditions.append(f"f.signature =~ '(?i).*{escaped_keyword}.*'")
-                keyword_conditions.append(f"f.namespace =~ '(?i).*{escaped_keyword}.*'")
-                keyword_conditions.append(f"exists(tc.content) AND tc.content =~ '(?i).*{escaped_keyword}.*'")
-            
-            # Join conditions with OR
-            combined_condition = " OR ".join(keyword_conditions)
-            
+        with self._session(session) as session:
             # Build and execute the query
-            query = f"""
-            MATCH (f:Function {{project: $project}})
-            OPTIONAL MATCH (f)-[:HAS_CONTENT]->(tc:TextContent)
-            WHERE {combined_condition}
+            query = self.DESCRIPTION_MATCH + """
             RETURN DISTINCT f, tc.content as body
             LIMIT $limit
             """
             
-            result = session.run(query, project=project_name, limit=limit)
+            result = session.run(query, project=project_name, limit=limit,
+                                 patterns=self._keyword_patterns(keywords))
             
             # Process results
             functions = []
@@ -690,70 +797,21 @@ int {func}(void) {{
                     function["body"] = record["body"]
                 functions.append(function)
             
-            # Score and rank results
-            scored_functions = []
-            for function in functions:
-                # Calculate relevance score
-                score = 0
-                matched_tokens = []
-                
-                for keyword in keywords:
-                    # Check name (highest weight)
-                    if keyword in function["name"].lower():
-                        score += 10
-                        matched_tokens.append(keyword)
-                    
-                    # Check signature
-                    if "signature" in function and function["signature"] and keyword in function["signature"].lower():
-                        score += 5
-                        if keyword not in matched_tokens:
-                            matched_tokens.append(keyword)
-                    
-                    # Check namespace
-                    if "namespace" in function and function["namespace"] and keyword in function["namespace"].lower():
-                        score += 3
-                        if keyword not in matched_tokens:
-                            matched_tokens.append(keyword)
-                    
-                    # Check function body (lowest weight but still important)
-                    if "body" in function and function["body"] and keyword in function["body"].lower():
-                        score += 2
-                        if keyword not in matched_tokens:
-                            matched_tokens.append(keyword)
-                
-                # Add score and matched tokens to function data
-                function["relevance"] = score
-                function["matched_tokens"] = matched_tokens
-                scored_functions.append(function)
-            
-            # Sort by relevance score (highest first)
-            scored_functions.sort(key=lambda x: x["relevance"], reverse=True)
-            
-            # Return top results
-            return scored_functions[:limit]
+            return self._rank_functions(functions, keywords, limit)
     
-    def find_by_metaprogramming_features(self, project_name: str, **kwargs) -> List[Dict[str, Any]]:
+    def _build_metaprogramming_match(self, **kwargs) -> Tuple[str, Dict[str, Any]]:
         """
-        Find functions by specific template metaprogramming features.
+        Build the MATCH/WHERE part of the metaprogramming feature search.
         
         Args:
-            project_name: Project name to search in
-            **kwargs: Key-value pairs of features to search for, possible keys include:
-                - has_variadic_templates (bool): Whether the function uses variadic templates
-                - is_metafunction (bool): Whether the function is a metafunction
-                - metafunction_kind (str): Kind of metafunction ('type_trait', 'value_trait', etc)
-                - has_sfinae (bool): Whether SFINAE techniques are used
-                - sfinae_technique (str): Specific SFINAE technique
-                - is_concept (bool): Whether the function uses concepts
-                - has_template_template_params (bool): Whether the function has template template parameters
-                - partial_specialization (bool): Whether the function is a partial specialization
+            **kwargs: Features to search for, see find_by_metaprogramming_features
             
         Returns:
-            List of matching functions
+            Tuple of the Cypher fragment binding f and its parameters (besides $project)
         """
         query_parts = ["MATCH (f:Function {project: $project})"]
         match_clauses = []
-        params = {"project": project_name}
+        params = {}
         
         # Process simple boolean properties
         boolean_props = [
@@ -792,33 +850,126 @@ int {func}(void) {{
         if match_clauses:
             query_parts.append("WHERE " + " AND ".join(match_clauses))
         
-        # Finalize query
-        query_parts.append("RETURN DISTINCT f")
-        query = "\n".join(query_parts)
+        return "\n".join(query_parts), params
+    
+    def _fetch_metaprogramming_arrays(self, session, functions: List[Dict[str, Any]], project_name: str) -> None:
+        """
+        Fetch the array properties relevant to each function's metaprogramming features.
+        
+        Args:
+            session: Neo4j session
+            functions: Function dictionaries to update
+            project_name: Project name
+        """
+        for func in functions:
+            # Fetch template params
+            self._fetch_array_property(session, func, "template_params", project_name)
+            
+            # Fetch other relevant array properties based on function features
+            if func.get("has_variadic_templates", False):
+                self._fetch_array_property(session, func, "template_template_params", project_name)
+            
+            if func.get("is_concept", False):
+                self._fetch_array_property(session, func, "concept_requirements", project_name)
+                self._fetch_array_property(session, func, "constraint_expressions", project_name)
+            
+            if func.get("has_sfinae", False):
+                self._fetch_array_property(session, func, "sfinae_techniques", project_name)
+    
+    def find_by_metaprogramming_features(self, project_name: str, session=None, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Find functions by specific template metaprogramming features.
+        
+        Args:
+            project_name: Project name to search in
+            **kwargs: Key-value pairs of features to search for, possible keys include:
+                - has_variadic_templates (bool): Whether the function uses variadic templates
+                - is_metafunction (bool): Whether the function is a metafunction
+                - metafunction_kind (str): Kind of metafunction ('type_trait', 'value_trait', etc)
+                - has_sfinae (bool): Whether SFINAE techniques are used
+                - sfinae_technique (str): Specific SFINAE technique
+                - is_concept (bool): Whether the function uses concepts
+                - has_template_template_params (bool): Whether the function has template template parameters
+                - partial_specialization (bool): Whether the function is a partial specialization
+            session: Neo4j session to reuse (optional)
+            
+        Returns:
+            List of matching functions
+        """
+        match, params = self._build_metaprogramming_match(**kwargs)
+        query = match + "\nRETURN DISTINCT f"
         
         # Execute query
-        with self.neo4j_service.driver.session() as session:
-            result = session.run(query, **params)
+        with self._session(session) as session:
+            result = session.run(query, project=project_name, **params)
             functions = [dict(record["f"]) for record in result]
             
             # For each function, get the array properties
-            for func in functions:
-                # Fetch template params
-                self._fetch_array_property(session, func, "template_params", project_name)
-                
-                # Fetch other relevant array properties based on function features
-                if func.get("has_variadic_templates", False):
-                    self._fetch_array_property(session, func, "template_template_params", project_name)
-                
-                if func.get("is_concept", False):
-                    self._fetch_array_property(session, func, "concept_requirements", project_name)
-                    self._fetch_array_property(session, func, "constraint_expressions", project_name)
-                
-                if func.get("has_sfinae", False):
-                    self._fetch_array_property(session, func, "sfinae_techniques", project_name)
+            self._fetch_metaprogramming_arrays(session, functions, project_name)
             
             return functions
     
+    def search_combined(self, project_name: str, features: Dict[str, Any], description: str,
+                        limit: int = 10, lang: str = "en", min_feature_results: int = 3,
+                        session=None) -> List[Dict[str, Any]]:
+        """
+        Search by metaprogramming features and by description in a single query.
+        
+        Feature matches come first. When fewer than min_feature_results functions match
+        the features, the best description matches not already included are appended,
+        up to limit results in total.
+        
+        Args:
+            project_name: Project name to search in
+            features: Metaprogramming features, see find_by_metaprogramming_features
+            description: Natural language description of the function
+            limit: Maximum number of description matches to add
+            lang: Language of the description ('en' for English, 'zh' for Chinese)
+            min_feature_results: Feature match count below which description matches are added
+            session: Neo4j session to reuse (optional)
+            
+        Returns:
+            List of matching functions
+        """
+        keywords = self._process_query(description, lang)
+        feature_match, params = self._build_metaprogramming_match(**features)
+        
+        # Both searches run as branches of one UNION subquery, tagged by source
+        query = "CALL {\n" + feature_match + "\nRETURN DISTINCT f, null AS body, 1 AS feature_match"
+        if keywords:
+            query += ("\nUNION\n" + self.DESCRIPTION_MATCH +
+                      "WITH DISTINCT f, tc.content AS body\nRETURN f, body, 0 AS feature_match\nLIMIT $limit")
+        query += "\n}\nRETURN f, body, feature_match"
+        
+        with self._session(session) as session:
+            result = session.run(query, project=project_name, limit=limit,
+                                 patterns=self._keyword_patterns(keywords), **params)
+            feature_functions = []
+            description_functions = []
+            for record in result:
+                function = dict(record["f"])
+                if record["feature_match"]:
+                    feature_functions.append(function)
+                else:
+                    if record["body"]:
+                        function["body"] = record["body"]
+                    description_functions.append(function)
+            
+            # For each feature match, get the array properties
+            self._fetch_metaprogramming_arrays(session, feature_functions, project_name)
+        
+        results = feature_functions
+        if len(results) < min_feature_results:
+            # Merge results, prioritizing metaprogramming matches
+            existing_names = {r["name"] for r in results}
+            for function in self._rank_functions(description_functions, keywords, limit):
+                if function["name"] not in existing_names:
+                    results.append(function)
+                    if len(results) >= limit:
+                        break
+        
+        return results
+    
     def _fetch_array_property(self, session, func: Dict[str, Any], property_name: str, project_name: str) -> None:
         """
         Fetch array property values for a function.
@@ -838,4 +989,10 @@ int {func}(void) {{
         values = [record["value"] for record in result]
         
         if values:
-            func[property_name] = values 
\ No newline at end of file
+            func[property_name] = values 
+
+
+@functools.lru_cache(maxsize=1024)
+def _tokenize_cached(query: str, lang: str) -> Tuple[str, ...]:
+    """Cached SearchService._tokenize; returns a tuple so cached results cannot be mutated."""
+    return tuple(SearchService._tokenize(query, lang))
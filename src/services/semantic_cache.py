@@ -0,0 +1,203 @@
+"""
+Semantic cache for query results.
+
+Results are stored in SQLite, keyed by a namespace (command, project and
+options) plus the query text. A lookup first tries the normalized query text
+exactly; when sentence-transformers is installed it then falls back to the
+most similar cached query in the same namespace, if the cosine similarity
+reaches the configured threshold.
+"""
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    HAS_SENTENCE_TRANSFORMERS = True
+except ImportError:
+    HAS_SENTENCE_TRANSFORMERS = False
+
+from src.config.settings import (
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_MODEL,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase the query and collapse whitespace."""
+    return " ".join(query.lower().split())
+
+
+class SemanticCache:
+    """Persistent cache of query results with optional embedding-based lookup."""
+
+    def __init__(
+        self,
+        path: str = SEMANTIC_CACHE_PATH,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        model_name: str = SEMANTIC_CACHE_MODEL
+    ) -> None:
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: Path of the SQLite database file.
+            threshold: Minimum cosine similarity for a semantic hit.
+            ttl: Entry lifetime in seconds.
+            model_name: Sentence-transformers model used for query embeddings.
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.model_name = model_name
+        self._model = None
+        # namespace -> (row ids, embedding matrix)
+        self._embeddings: Dict[str, Tuple[List[int], Any]] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_cache ("
+            "id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, query TEXT NOT NULL, "
+            "answer_json TEXT NOT NULL, created_at REAL NOT NULL, embedding BLOB, "
+            "UNIQUE (namespace, query))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_query_cache_created_at ON query_cache (created_at)")
+        self.conn.commit()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.conn.close()
+
+    def _embed(self, query: str):
+        if not HAS_SENTENCE_TRANSFORMERS:
+            return None
+        if self._model is None:
+            self._model = SentenceTransformer(self.model_name)
+        return self._model.encode(query, normalize_embeddings=True).astype(np.float32)
+
+    def _load_embeddings(self, namespace: str, min_created_at: float):
+        if namespace not in self._embeddings:
+            rows = self.conn.execute(
+                "SELECT id, embedding FROM query_cache "
+                "WHERE namespace = ? AND created_at >= ? AND embedding IS NOT NULL",
+                (namespace, min_created_at)
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+            self._embeddings[namespace] = (ids, matrix)
+        return self._embeddings[namespace]
+
+    def get(self, namespace: str, query: str) -> Optional[Any]:
+        """
+        Look up cached results for a query.
+
+        Args:
+            namespace: Cache namespace (command and options the results depend on).
+            query: The query text.
+
+        Returns:
+            The cached results, or None on a miss.
+        """
+        query = normalize_query(query)
+        min_created_at = time.time() - self.ttl
+        row = self.conn.execute(
+            "SELECT answer_json FROM query_cache WHERE namespace = ? AND query = ? AND created_at >= ?",
+            (namespace, query, min_created_at)
+        ).fetchone()
+        if row:
+            return json.loads(row[0])
+
+        if not HAS_SENTENCE_TRANSFORMERS:
+            return None
+        ids, matrix = self._load_embeddings(namespace, min_created_at)
+        if matrix is None:
+            return None
+
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        scores = matrix @ self._embed(query)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        row = self.conn.execute(
+            "SELECT answer_json FROM query_cache WHERE id = ? AND created_at >= ?",
+            (ids[best], min_created_at)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace: str, query: str, answer: Any) -> None:
+        """
+        Store results for a query, replacing any previous entry and deleting expired ones.
+
+        Args:
+            namespace: Cache namespace (command and options the results depend on).
+            query: The query text.
+            answer: JSON-serializable results.
+        """
+        query = normalize_query(query)
+        embedding = self._embed(query)
+        now = time.time()
+        expired = self.conn.execute(
+            "DELETE FROM query_cache WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        if expired:
+            self._embeddings.clear()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO query_cache (namespace, query, answer_json, created_at, embedding) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (namespace, query, json.dumps(answer, ensure_ascii=False, default=str), now,
+             embedding.tobytes() if embedding is not None else None)
+        )
+        self.conn.commit()
+        self._embeddings.pop(namespace, None)
+
+    def invalidate(self, namespace_prefix: str) -> int:
+        """
+        Delete all entries whose namespace starts with a prefix.
+
+        Args:
+            namespace_prefix: Namespace prefix, e.g. the command and project.
+
+        Returns:
+            Number of deleted entries.
+        """
+        cursor = self.conn.execute(
+            "DELETE FROM query_cache WHERE substr(namespace, 1, ?) = ?",
+            (len(namespace_prefix), namespace_prefix)
+        )
+        self.conn.commit()
+        for namespace in [n for n in self._embeddings if n.startswith(namespace_prefix)]:
+            del self._embeddings[namespace]
+        return cursor.rowcount
+
+
+def nlquery_namespace(project: str, language: str, limit: int, metaprogramming: bool) -> str:
+    """Cache namespace of natural language query results for a project."""
+    return f"nlquery:{project}:{language}:{limit}:{metaprogramming}"
+
+
+def invalidate_project_queries(project: Optional[str], path: str = SEMANTIC_CACHE_PATH) -> None:
+    """
+    Drop cached natural language query results of a project after it was reindexed.
+
+    Args:
+        project: Project name, or None to drop the results of all projects.
+        path: Path of the cache database.
+    """
+    if not os.path.exists(path):
+        return
+    try:
+        cache = SemanticCache(path=path)
+        try:
+            cache.invalidate("nlquery:" if project is None else f"nlquery:{project}:")
+        finally:
+            cache.close()
+    except sqlite3.Error as e:
+        print(f"Could not invalidate cached queries: {e}")
@@ -10,9 +10,13 @@ import json
 import shlex
 import platform
 import subprocess
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Set, Optional, Tuple
 
+# Extensions of header files, as a tuple for str.endswith
+HEADER_EXTENSIONS = ('.h', '.hpp', '.hxx', '.hh', '.h++')
+
 
 def extract_include_paths(compile_commands_path: str) -> List[str]:
     """
@@ -108,7 +112,7 @@ def extract_compiler_args(compile_commands_path: str, file_path: Optional[str] =
                 arg = args[i]
                 
                 # Skip compiler executable
-                if i == 0 or arg.endswith('gcc') or arg.endswith('g++') or arg.endswith('clang') or arg.endswith('clang++'):
+                if i == 0 or arg.endswith(('gcc', 'g++', 'clang', 'clang++')):
                     i += 1
                     continue
                     
@@ -208,14 +212,7 @@ def detect_project_include_paths(project_root: str) -> List[str]:
     include_paths.extend(system_include_paths)
     
     # Remove duplicates while preserving order
-    seen = set()
-    unique_include_paths = []
-    for path in include_paths:
-        if path not in seen:
-            seen.add(path)
-            unique_include_paths.append(path)
-    
-    return unique_include_paths
+    return list(dict.fromkeys(include_paths))
 
 
 def find_include_directories_by_scanning(project_root: str) -> List[str]:
@@ -229,7 +226,6 @@ def find_include_directories_by_scanning(project_root: str) -> List[str]:
         List of discovered include directories
     """
     include_dirs = set()
-    header_extensions = ['.h', '.hpp', '.hxx', '.hh']
     
     # Keep track of directories with more than N header files
     dir_header_count = {}
@@ -240,7 +236,7 @@ def find_include_directories_by_scanning(project_root: str) -> List[str]:
                   d not in ['build', 'out', 'bin', 'obj', 'node_modules', '.git']]
         
         # Count header files in this directory
-        header_count = sum(1 for f in files if any(f.endswith(ext) for ext in header_extensions))
+        header_count = sum(1 for f in files if f.endswith(HEADER_EXTENSIONS))
         
         if header_count > 0:
             dir_header_count[root] = header_count
@@ -261,9 +257,17 @@ def detect_system_include_paths() -> List[str]:
     """
     Detect system include paths based on the platform and installed compilers.
     
+    The probe runs the compiler and checks the Visual Studio directories, so
+    its result is computed once per process and copied for each caller.
+    
     Returns:
         List of system include paths
     """
+    return list(_probe_system_include_paths())
+
+
+@lru_cache(maxsize=None)
+def _probe_system_include_paths() -> Tuple[str, ...]:
     system_paths = []
     
     system = platform.system()
@@ -326,7 +330,7 @@ def detect_system_include_paths() -> List[str]:
                     if os.path.exists(msvc_include):
                         system_paths.append(msvc_include)
     
-    return system_paths
+    return tuple(system_paths)
 
 
 def parse_compiler_output_for_includes(output: str) -> List[str]:
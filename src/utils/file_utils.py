@@ -1,7 +1,10 @@
 """
 Utility functions for file operations
 """
+import fnmatch
+import functools
 import os
+import re
 import sys
 from typing import List, Dict, Optional
 
@@ -66,6 +69,20 @@ def normalize_path(path: str) -> str:
     return os.path.normpath(path)
 
 
+@functools.lru_cache(maxsize=32)
+def compile_file_patterns(pattern: str) -> "re.Pattern[str]":
+    """
+    Compile comma-separated glob patterns into a single regex
+    
+    Args:
+        pattern: File patterns to match (comma-separated, e.g. "*.c,*.h")
+        
+    Returns:
+        Compiled pattern; its match method tests a file name against all globs at once
+    """
+    return re.compile('|'.join(fnmatch.translate(p.strip()) for p in pattern.split(',') if p.strip()))
+
+
 def find_files(directory: str, pattern: str) -> List[str]:
     """
     Find files in a directory matching a pattern
@@ -81,11 +98,12 @@ def find_files(directory: str, pattern: str) -> List[str]:
         raise NotADirectoryError(f"Directory {directory} not found")
     
     file_patterns = pattern.split(',')
+    suffixes = tuple(p.replace('*', '') for p in file_patterns)
     matching_files = []
     
     for root, _, files in os.walk(directory):
         for file in files:
-            if any(file.endswith(p.replace('*', '')) for p in file_patterns):
+            if file.endswith(suffixes):
                 matching_files.append(os.path.join(root, file))
     
     return matching_files
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+测试调用图分片的写入和读取。
+"""
+import os
+import sys
+import tempfile
+
+# 添加父级目录到Python路径以便导入src模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.function_model import CallGraph, Function
+from src.services.call_graph_shard import CallGraphShardWriter, iter_edge_batches, iter_node_batches
+
+def _call_graph(functions, missing=()):
+    call_graph = CallGraph()
+    for function in functions:
+        call_graph.add_function(function)
+    for name in missing:
+        call_graph.add_missing_function(name)
+    return call_graph
+
+def test_shard_round_trip():
+    """测试节点和调用关系经过分片文件后保持不变。"""
+    first = _call_graph([
+        Function(name="main", file_path="main.cpp", line_number=3, is_defined=True,
+                 calls=["helper", "printf"]),
+        Function(name="helper", is_defined=False, called_by=["main"]),
+    ], missing=["printf"])
+    # 第二个文件给出helper的定义，并再次声明main
+    second = _call_graph([
+        Function(name="helper", signature="int helper()", file_path="helper.cpp", line_number=7,
+                 namespace="util", is_defined=True, calls=["main"]),
+        Function(name="main", is_defined=False),
+    ])
+
+    with tempfile.TemporaryDirectory() as shard_dir:
+        with CallGraphShardWriter(shard_dir) as writer:
+            writer.add_call_graph(first)
+            writer.add_call_graph(second)
+        nodes = [row for batch in iter_node_batches(shard_dir, batch_size=2) for row in batch]
+        edges = [edge for batch in iter_edge_batches(shard_dir, batch_size=2) for edge in batch]
+
+    assert writer.node_count == 3
+    assert writer.edge_count == 3
+
+    # id按首次出现的顺序分配
+    ids = {}
+    for row in nodes:
+        assert ids.setdefault(row["name"], row["id"]) == row["id"]
+    assert sorted(ids.values()) == [0, 1, 2]
+
+    defined = {row["name"]: row for row in nodes if row["is_defined"]}
+    assert sorted(defined) == ["helper", "main"]
+    assert defined["main"]["file_path"] == "main.cpp"
+    assert defined["main"]["line_number"] == 3
+    assert defined["helper"]["signature"] == "int helper()"
+    assert defined["helper"]["namespace"] == "util"
+    assert not any(row["is_defined"] for row in nodes if row["name"] == "printf")
+
+    names = {node_id: name for name, node_id in ids.items()}
+    assert sorted((names[caller], names[callee]) for caller, callee in edges) == [
+        ("helper", "main"),
+        ("main", "helper"),
+        ("main", "printf"),
+    ]
+
+def test_empty_shard():
+    """测试空分片可以正常读取。"""
+    with tempfile.TemporaryDirectory() as shard_dir:
+        with CallGraphShardWriter(shard_dir):
+            pass
+        assert list(iter_node_batches(shard_dir)) == []
+        assert list(iter_edge_batches(shard_dir)) == []
+
+def main():
+    """主函数"""
+    test_shard_round_trip()
+    test_empty_shard()
+    print("全部测试通过")
+
+if __name__ == "__main__":
+    main()
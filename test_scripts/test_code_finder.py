@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+测试code_finder中基于正则的函数体提取。
+"""
+import os
+import sys
+import tempfile
+
+# 添加scripts目录到Python路径以便导入code_finder
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from code_finder import (
+    MAX_FUNCTION_LINES,
+    collect_all_functions,
+    extract_c_function_body,
+    extract_function_body,
+    extract_python_function_body,
+)
+
+def test_braces_in_comments_and_literals():
+    """测试注释、字符串和字符字面量中的大括号不参与计数。"""
+    content = (
+        "int f(int x) {\n"
+        "    // } in a line comment\n"
+        "    /* { and } in a block comment */\n"
+        "    const char *s = \"}{\\\"}\";\n"
+        "    char c = '}';\n"
+        "    char d = '\\'';\n"
+        "    if (x) { return 1; }\n"
+        "    return 0;\n"
+        "}\n"
+        "int g() { return 2; }\n"
+    )
+    expected = content[:content.index("}\nint g") + 1]
+    assert extract_function_body(content, 0, '{', '}') == expected
+    assert extract_c_function_body(content, 0) == expected
+
+def test_unbalanced_body_stops_at_line_cap():
+    """测试大括号不平衡时在MAX_FUNCTION_LINES行内放弃提取。"""
+    content = "void f() {\n" + "    x++;\n" * (MAX_FUNCTION_LINES + 10) + "}\n"
+    assert extract_function_body(content, 0, '{', '}') == ""
+    assert extract_c_function_body(content, 0) == ""
+
+def test_python_body_end_with_comments_and_blank_lines():
+    """测试Python函数体跨过空行和缩进较少的注释，在下一个同级语句前结束。"""
+    content = (
+        "class A:\n"
+        "    def f(self):\n"
+        "        x = 1\n"
+        "\n"
+        "# comment at column 0\n"
+        "        return x\n"
+        "    \n"
+        "    def g(self):\n"
+        "        pass\n"
+    )
+    start = content.index("    def f")
+    body = extract_python_function_body(content, start)
+    assert body == content[start:content.index("\n    def g")]
+
+    start = content.index("    def g")
+    assert extract_python_function_body(content, start) == content[start:]
+    assert extract_python_function_body(content, 0) == ""
+
+def test_declarations_before_definition():
+    """测试带::参数的声明不会吞掉后面的声明（只有定义才跳过函数体）。"""
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "a.cpp"), 'w') as f:
+            f.write(
+                "void foo(std::string s);\n"
+                "int bar(int x);\n"
+                "int baz(int y);\n"
+                "int impl(int z) {\n"
+                "    if (z) { return 1; }\n"
+                "    return 0;\n"
+                "}\n"
+            )
+        functions = collect_all_functions(directory, ['.cpp'])
+
+    bodies = {info["name"]: info["body"] for info in functions.values()}
+    assert sorted(bodies) == ["bar", "baz", "foo", "impl"]
+    assert bodies["foo"] == ""
+    assert bodies["impl"].startswith("int impl(int z) {")
+
+def main():
+    """主函数"""
+    test_braces_in_comments_and_literals()
+    test_unbalanced_body_stops_at_line_cap()
+    test_python_body_end_with_comments_and_blank_lines()
+    test_declarations_before_definition()
+    print("全部测试通过")
+
+if __name__ == "__main__":
+    main()